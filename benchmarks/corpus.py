@@ -0,0 +1,415 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+""" Synthetic wikiHow-shaped pages
+
+Pages reproduce the structure (ids, classes, nesting) the scraper relies on:
+blacklisted blocks, images, step and YouTube videos, related articles,
+breadcrumbs, code blocks, category listings and pagination.
+Those are wrapped in site chrome the scraper discards: header and menus,
+sidebar with ads, footer, configuration and tracking scripts.
+Content is deterministic for a given seed.
+
+Running this module (re)generates the bundled corpus:
+    python -m benchmarks.corpus"""
+
+import pathlib
+import random
+from typing import List, Tuple
+
+CORPUS_DIR = pathlib.Path(__file__).parent.joinpath("corpus")
+DOMAIN = "https://www.wikihow.com"
+
+WORDS = (
+    "make sure the pan is hot before adding your eggs so they cook evenly "
+    "gently fold the edges toward the center with a spatula and let it rest "
+    "wash your hands with soap for at least twenty seconds then rinse them "
+    "choose a quiet place where you will not be disturbed for a few minutes "
+    "write down your goals and review them every morning to stay motivated"
+).split()
+
+
+def sentence(rng: random.Random, nb_words: int = 14) -> str:
+    words = [rng.choice(WORDS) for _ in range(nb_words)]
+    return " ".join(words).capitalize() + "."
+
+
+def paragraph(rng: random.Random, nb_sentences: int = 4) -> str:
+    return " ".join(sentence(rng) for _ in range(nb_sentences))
+
+
+def slug(title: str) -> str:
+    return title.replace(" ", "-")
+
+
+def image(rng: random.Random, name: str) -> str:
+    src = f"/images/thumb/{rng.randint(1, 9)}/{rng.randint(10, 99)}/{name}.jpg"
+    return (
+        f'<div class="content-spacer"><picture>'
+        f'<source media="(max-width: 728px)" srcset="{src}/v4-460px-{name}.jpg.webp">'
+        f'<img alt="{name}" data-src="{src}/aid-v4-728px-{name}.jpg" '
+        f'data-src-nowebp="{src}/v4-728px-{name}.jpg" class="whcdn content-fill" '
+        f'onload="WH.shared.imageLoaded(this)" width="728" height="546"/>'
+        f"</picture></div>"
+    )
+
+
+def step_video(rng: random.Random, name: str) -> str:
+    return (
+        '<div class="video-player"><div class="video-container">'
+        f'<video class="m-video content-fill" muted loop playsinline '
+        f'data-src="/{rng.randint(1, 9)}/{rng.randint(10, 99)}/{name}.mp4" '
+        f'data-poster="/images/thumb/{name}-poster.jpg" width="728" height="410">'
+        "</video></div>"
+        '<div class="m-video-controls"></div><div class="m-video-wm"></div></div>'
+    )
+
+
+def related(rng: random.Random, titles: List[str], with_video: bool) -> str:
+    links = []
+    for index, title in enumerate(titles):
+        thumb = (
+            f'<video class="m-video" muted loop playsinline '
+            f'data-src="/related/{slug(title)}.mp4" '
+            f'data-poster="/images/thumb/{slug(title)}-rel.jpg"></video>'
+            if with_video and index % 3 == 0
+            else f'<img data-src="/images/thumb/{slug(title)}-rel.jpg" alt=""/>'
+        )
+        links.append(
+            f'<a class="related-wh" href="{DOMAIN}/{slug(title)}">'
+            f'<div class="related-image-wrap">{thumb}</div>'
+            f'<div class="related-title"><span>How to</span> {title}</div></a>'
+        )
+    return (
+        '<div class="section relatedwikihows"><h2>Related wikiHows</h2>'
+        f'<div id="relatedwikihows">{"".join(links)}</div></div>'
+    )
+
+
+def crumbs(categories: List[str]) -> str:
+    items = "".join(
+        f'<li><a href="/Category:{slug(category)}" title="Category:{category}">'
+        f"{category}</a></li>"
+        for category in categories
+    )
+    return f'<div id="footer_crumbs"><ul class="breadcrumbs">{items}</ul></div>'
+
+
+def config_script(rng: random.Random, nb_keys: int) -> str:
+    """inline <script/> with a large JS configuration, as MediaWiki's RLCONF"""
+    entries = ",".join(
+        f'"wg{rng.choice(WORDS).capitalize()}{index}":"{sentence(rng, 6)}"'
+        for index in range(nb_keys)
+    )
+    return (
+        f'<script>RLCONF={{"wgIsRestricted":false,{entries}}};'
+        "RLSTATE={};RLPAGEMODULES=[];</script>"
+    )
+
+
+def chrome(rng: random.Random) -> Tuple[str, str, str, str]:
+    """(head, header, sidebar, footer) site chrome around the content"""
+    head = (
+        '<meta name="viewport" content="width=device-width, initial-scale=1"/>'
+        f"{config_script(rng, 400)}"
+        + "".join(
+            f'<script async src="/extensions/wikihow/{rng.choice(WORDS)}{index}.js">'
+            "</script>"
+            for index in range(12)
+        )
+    )
+    menu = "".join(
+        f'<li class="menu_item"><a href="/Category:{rng.choice(WORDS).capitalize()}'
+        f'-{index}" class="menu_link">{sentence(rng, 2)}</a></li>'
+        for index in range(60)
+    )
+    header = (
+        '<div id="header_container"><div id="header" role="navigation">'
+        f'<nav id="actions"><ul id="menu">{menu}</ul></nav>'
+        '<form id="hs_form" action="/wikiHowTo"><input type="text" name="search" '
+        'placeholder="Search"/><button type="submit" class="hs_submit">Go</button>'
+        "</form></div></div>"
+    )
+    ads = "".join(
+        f'<div class="wh_ad_inner" data-adtargetid="rr{index}">'
+        f'<div id="rightrail{index}" class="ad_slot"></div>'
+        f"<script>WH.ads.add({{slot:'rr{index}',sizes:[[300,250],[300,600]]}})"
+        "</script></div>"
+        for index in range(6)
+    )
+    featured = "".join(
+        f'<li><a href="/{slug(sentence(rng, 3)[:-1])}">'
+        f'<img src="/images/thumb/featured-{index}.jpg" width="127" height="120"/>'
+        f"<span>{sentence(rng, 5)}</span></a></li>"
+        for index in range(20)
+    )
+    sidebar = (
+        f'<div id="sidebar"><div class="sidebox">{ads}</div>'
+        f'<div class="sidebox" id="side_featured"><ul>{featured}</ul></div></div>'
+    )
+    site_links = "".join(
+        f'<li><a href="/wikiHow:{rng.choice(WORDS).capitalize()}-{index}">'
+        f"{sentence(rng, 3)}</a></li>"
+        for index in range(80)
+    )
+    footer = (
+        f'<div id="site_footer"><ul class="site_links">{site_links}</ul>'
+        f"<p>{paragraph(rng, 3)}</p></div>"
+        f"{config_script(rng, 80)}"
+        "<script>(function(){var s=document.createElement('script');"
+        "s.src='/analytics.js';document.body.appendChild(s);})();</script>"
+        '<noscript><img src="/beacon.gif" width="1" height="1"/></noscript>'
+    )
+    return head, header, sidebar, footer
+
+
+def page(
+    title: str, body_classes: str, viewport_classes: str, content: str, head: str = ""
+) -> str:
+    chrome_head, header, sidebar, footer = chrome(random.Random(title))
+    return (
+        '<!DOCTYPE html><html class="client-nojs" dir="ltr" lang="en"><head>'
+        f"<title>{title}</title>"
+        '<meta name="description" content="synthetic page"/>'
+        '<link rel="stylesheet" href="/load.php?modules=site.styles&amp;only=styles"/>'
+        "<style>.section { margin: 0 }</style>"
+        f"<script>window.RLQ = [];</script>{chrome_head}{head}</head>"
+        f'<body class="{body_classes}">{header}<div id="mw-mf-viewport" '
+        f'class="{viewport_classes}"><div id="mw-mf-page-center">'
+        f'<div id="content_wrapper" role="main">{content}</div>{sidebar}'
+        f"</div></div>{footer}</body></html>"
+    )
+
+
+def article_page(
+    title: str,
+    nb_steps: int = 12,
+    nb_related: int = 8,
+    with_videos: bool = True,
+    categories: List[str] = None,
+    seed: int = 0,
+    related_titles: List[str] = None,
+    with_youtube: bool = None,
+) -> str:
+    """HTML of a wikiHow-like article
+
+    YouTube video is included with_videos unless with_youtube is False"""
+    rng = random.Random(f"{seed}-{title}")
+    categories = categories or ["Food and Entertaining", "Recipes"]
+    related_titles = related_titles or [
+        f"{title} {index}" for index in range(nb_related)
+    ]
+    with_youtube = with_videos if with_youtube is None else with_youtube
+    name = slug(title)
+
+    steps = []
+    for num in range(1, nb_steps + 1):
+        media = (
+            step_video(rng, f"{name}-Step-{num}")
+            if with_videos and num % 4 == 0
+            else image(rng, f"{name}-Step-{num}")
+        )
+        link = (
+            f'<a href="/{slug(rng.choice(WORDS).title())}-Something">related</a>'
+            if num % 3 == 0
+            else ""
+        )
+        steps.append(
+            f'<li id="step-id-{num}"><div class="mwimg">{media}</div>'
+            f'<div class="step"><b class="whb">{sentence(rng, 8)}</b> '
+            f"{paragraph(rng)} {link}</div></li>"
+        )
+
+    youtube = (
+        '<div class="section video"><div id="video"><div class="embedvideocontainer">'
+        '<iframe class="embedvideo" width="728" height="428" allow="autoplay" '
+        f'data-src="https://www.youtube.com/embed/{name[:11]}?rel=0"></iframe>'
+        "</div></div></div>"
+        if with_youtube
+        else ""
+    )
+    summary = (
+        '<div class="section summary_with_video"><div id="summary_wrapper">'
+        f"{step_video(rng, name + '-Summary')}</div></div>"
+        if with_videos
+        else ""
+    )
+    code = (
+        '<pre><code>&lt;a href="/not-rewritten"&gt;'
+        '<a href="/Inside-Code">x</a><img src="/inside-code.png"/></code></pre>'
+    )
+    # as on wikiHow: each category link in a span, preceded by a separator text
+    about = "Categories: " + " | ".join(
+        f'<span class="sp_text_data"><a href="/Category:{slug(category)}">'
+        f"{category}</a></span>"
+        for category in categories
+    )
+
+    content = (
+        '<div id="content_inner">'
+        f'<div class="pre-content"><h1><a href="/{name}">How to {title}</a></h1>'
+        '<div class="breadcrumbs">'
+        + "".join(
+            f'<a href="/Category:{slug(category)}">{category}</a>'
+            for category in categories
+        )
+        + "</div>"
+        '<div id="coauthor_byline"><div id="byline_info">'
+        '<a href="/User:Someone">Co-authored by Someone</a></div></div></div>'
+        "</div>"
+        '<script>WH.bootstrap();</script><div class="pdf_link">PDF</div>'
+        '<div id="side_follow"></div><div id="sidebar_share"></div>'
+        f'<div id="intro"><p>{paragraph(rng, 3)}</p></div>'
+        '<div class="wh_ad_inner">ad</div><div data-service="adsense">ad</div>'
+        f'<div class="section steps"><h3>Steps</h3><ol class="steps_list_2">'
+        f'{"".join(steps)}</ol></div>'
+        f"{youtube}{summary}"
+        f'<div class="section tips"><ul><li>{sentence(rng)}</li></ul></div>'
+        f'<div class="section_text">{code}</div>'
+        + related(rng, related_titles[:nb_related], with_video=with_videos)
+        + '<div id="qa"><div id="qa_answered_questions_container">'
+        f'<div class="qa_answer">{paragraph(rng, 2)}</div>'
+        '<div class="qa_answer_footer"></div>'
+        '<div id="qa_aq_search_container"></div></div>'
+        '<div id="qa_submit">ask</div></div>'
+        '<div id="userreviews_mobile">reviews</div>'
+        '<div id="article_rating_mobile"></div><div id="end_options"></div>'
+        f'<div class="sp_box sp_fullbox"><p>{about}</p></div>'
+        '<noscript><img src="/tracker.gif"/></noscript><noscript></noscript>'
+        '<div id="aboutthisarticle"><div class="page_stats section_text">x</div>'
+        "</div>"
+        f"{crumbs(categories)}"
+    )
+    return page(
+        title=f"How to {title}: {nb_steps} Steps (with Pictures) - wikiHow",
+        body_classes="mediawiki ltr sitedir-ltr ns-0 ns-subject page-" + name,
+        viewport_classes="feelgood",
+        content=content,
+    )
+
+
+def category_page(
+    category: str,
+    articles: List[str],
+    subcats: List[str],
+    page_num: int = 1,
+    nb_pages: int = 1,
+    seed: int = 0,
+) -> str:
+    """HTML of a wikiHow-like category page (listing articles and subcategories)"""
+    rng = random.Random(f"{seed}-{category}-{page_num}")
+    thumbs = "".join(
+        f'<div class="responsive_thumb"><a href="/{slug(title)}">'
+        f'<div class="responsive_thumb_image">'
+        f'<img data-src="/images/thumb/{slug(title)}-thumb.jpg" alt=""/></div>'
+        f'<div class="responsive_thumb_title"><p>How to {title}</p></div>'
+        f"</a></div>"
+        for title in articles
+    )
+    subcats_list = "".join(
+        f'<li><a href="/Category:{slug(subcat)}">{subcat}</a></li>'
+        for subcat in subcats
+    )
+    pagination = "".join(
+        f'<li><a href="/Category:{slug(category)}?pg={num}">{num}</a></li>'
+        for num in range(1, nb_pages + 1)
+    )
+    content = (
+        f'<div id="cat_description"><p>{paragraph(rng, 2)} '
+        f'<a href="/{slug(rng.choice(articles))}">featured</a></p></div>'
+        '<script>WH.cat();</script><div id="cat_wca">wca</div>'
+        '<div class="cat-promo">promo</div>'
+        f'<div id="subcats"><ul>{subcats_list}</ul></div>'
+        f'<div id="cat_all"><div class="cat_grid">{thumbs}</div></div>'
+        f'<div id="large_pagination"><ul>{pagination}</ul></div>'
+        '<noscript><img src="/tracker.gif"/></noscript>'
+        f"{crumbs(['Food and Entertaining', category])}"
+    )
+    return page(
+        title=f"{category} - wikiHow",
+        body_classes="mediawiki ltr sitedir-ltr ns-14 ns-subject",
+        viewport_classes="",
+        content=content,
+    )
+
+
+def categorylisting_page(categories: List[str]) -> str:
+    """HTML of a wikiHow-like Special:CategoryListing page"""
+    containers = "".join(
+        f'<div class="cat_container"><a href="/Category:{slug(category)}">'
+        f'<img data-src="/images/thumb/{slug(category)}-icon.png" alt=""/>'
+        f"<span>{category}</span></a></div>"
+        for category in categories
+    )
+    catlist = "".join(
+        f'<li><a href="/Category:{slug(category)}">{category}</a></li>'
+        for category in categories
+    )
+    return page(
+        title="Categories - wikiHow",
+        body_classes="mediawiki ltr sitedir-ltr ns-special",
+        viewport_classes="",
+        content=f'<div id="catlist_container">{containers}'
+        f'<ul class="catlist" id="catlist">{catlist}</ul></div>',
+    )
+
+
+def home_page(categories: List[str], footer_links: List[str]) -> str:
+    """HTML of a wikiHow-like homepage, with the site metadata the scraper reads"""
+    head = (
+        '<link rel="apple-touch-icon" href="/skins/apple-touch-icon.png"/>'
+        '<link rel="shortcut icon" href="/favicon.ico"/>'
+    )
+    categories_list = "".join(
+        f'<li><a href="/Category:{slug(category)}">{category}</a></li>'
+        for category in categories
+    )
+    links = "".join(
+        f'<li><a href="/{slug(link)}" title="{link}">{link}</a></li>'
+        for link in footer_links
+    )
+    return page(
+        title="wikiHow: How-to instructions you can trust.",
+        body_classes="mediawiki ltr sitedir-ltr ns-0 ns-subject page-Main-Page",
+        viewport_classes="",
+        content='<a id="header_logo" href="/Main-Page">wikiHow</a>'
+        f'<div id="hp_categories_list"><ul>{categories_list}</ul></div>'
+        '<div id="footer"><a id="footer_logo" href="/Main-Page">'
+        '<img src="/skins/owl/images/wikihow_logo.png" alt="wikiHow"/></a>'
+        f'<div id="footer_links"><ul>{links}'
+        '<li><a href="https://blog.wikihow.com/">Blog</a></li></ul></div></div>',
+        head=head,
+    )
+
+
+def main():
+    CORPUS_DIR.mkdir(exist_ok=True)
+    articles = [f"Cook Something Nice {index}" for index in range(40)]
+    pages = {
+        "article-short.html": article_page(
+            "Boil an Egg", nb_steps=4, nb_related=4, with_videos=False
+        ),
+        "article-long.html": article_page(
+            "Make an Omelette", nb_steps=80, nb_related=16
+        ),
+        "article-videos.html": article_page(
+            "Bake Bread", nb_steps=16, nb_related=12, with_videos=True
+        ),
+        "category.html": category_page(
+            "Recipes",
+            articles=articles,
+            subcats=[f"Recipes Kind {index}" for index in range(12)],
+            nb_pages=4,
+        ),
+        "categorylisting.html": categorylisting_page(
+            [f"Top Category {index}" for index in range(20)]
+        ),
+    }
+    for fname, html in pages.items():
+        CORPUS_DIR.joinpath(fname).write_text(html)
+        print(f"{fname}: {len(html)} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+""" End-to-end throughput benchmark against the local mock website
+
+Starts benchmarks.server in a subprocess (so it doesn't compete for the GIL)
+then runs the complete scraper against it, in this process, until the ZIM
+is created. Reports wall time, throughput, requests and phases durations.
+
+Options after `--` are passed to the scraper:
+
+    python -m benchmarks.e2e --articles 50 --latency 0.05 -- --threads 8
+
+`--language en` is pointed at the mock website: no request reaches wikiHow"""
+
+import argparse
+import json
+import pathlib
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from typing import Dict, List, Tuple
+
+from wikihow2zim import entrypoint
+from wikihow2zim.constants import URLS
+
+from .server import add_arguments
+
+
+def start_server(args: argparse.Namespace) -> Tuple[subprocess.Popen, str]:
+    """(process, url) of a mock website started with args"""
+    command = [
+        sys.executable,
+        "-m",
+        "benchmarks.server",
+        "--port",
+        "0",
+        "--categories",
+        str(args.nb_categories),
+        "--subcategories",
+        str(args.nb_subcategories),
+        "--articles",
+        str(args.nb_articles),
+        "--steps",
+        str(args.steps),
+        "--latency",
+        str(args.latency),
+        "--bandwidth",
+        str(args.bandwidth),
+        "--error-rate",
+        str(args.error_rate),
+    ]
+    server = subprocess.Popen(
+        command,
+        cwd=pathlib.Path(__file__).parent.parent,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    # first line announces where it's listening
+    line = server.stdout.readline()
+    if "http://" not in line:
+        server.kill()
+        raise RuntimeError(f"Mock server failed to start: {line}")
+    print(line.strip())
+    return server, line.strip().rsplit(" ", 1)[-1]
+
+
+def run_scraper(url: str, output_dir: pathlib.Path, extra_args: List[str]) -> int:
+    """exit code of a complete scrape of url, with stats in output_dir"""
+    URLS["en"] = url
+    sys.argv = [
+        "wikihow2zim",
+        "--language",
+        "en",
+        "--output",
+        str(output_dir),
+        "--tmp-dir",
+        str(output_dir),
+        "--stats-filename",
+        str(output_dir.joinpath("stats.json")),
+    ] + extra_args
+    try:
+        entrypoint.main()
+    except SystemExit as exc:
+        return exc.code or 0
+    return 0
+
+
+def get_results(
+    url: str, output_dir: pathlib.Path, duration: float, returncode: int
+) -> Dict:
+    with urllib.request.urlopen(f"{url}/__stats") as resp:
+        served = json.load(resp)
+    stats_fpath = output_dir.joinpath("stats.json")
+    if not stats_fpath.exists():
+        # scraper failed before writing any progress
+        return {"returncode": returncode, "duration": duration, "served": served}
+    stats = json.loads(stats_fpath.read_text())
+    zims = list(output_dir.glob("*.zim"))
+    return {
+        "returncode": returncode,
+        "duration": round(duration, 2),
+        "articles": stats["articles"]["done"],
+        "categories": stats["categories"]["done"],
+        "images": stats["images"]["done"],
+        "videos": stats["videos"]["done"],
+        "pages_per_second": round(
+            (stats["articles"]["done"] + stats["categories"]["done"]) / duration, 2
+        ),
+        "requests": stats["requests"],
+        "bytes": stats["bytes"],
+        "served": served,
+        "phases": stats["phases"]["durations"],
+        "zim_size": zims[0].stat().st_size if zims else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="End-to-end scraper benchmark against a local mock website"
+    )
+    add_arguments(parser)
+    parser.add_argument("--json", help="Path to write results to (JSON)")
+    parser.add_argument(
+        "--keep-output", help="Folder to keep ZIM and stats in", dest="keep_output"
+    )
+    parser.add_argument(
+        "scraper_args", nargs="*", help="scraper options, after a `--` separator"
+    )
+    args = parser.parse_args()
+
+    server, url = start_server(args)
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_dir = pathlib.Path(args.keep_output or tmp_dir).resolve()
+            started_on = time.monotonic()
+            returncode = run_scraper(url, output_dir, args.scraper_args)
+            results = get_results(
+                url, output_dir, time.monotonic() - started_on, returncode
+            )
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(json.dumps(results, indent=2))
+    if args.json:
+        pathlib.Path(args.json).write_text(json.dumps(results, indent=2))
+    return returncode
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,497 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+""" Local stand-in for a wikiHow website
+
+Serves a deterministic, synthetic wiki (see corpus.py for pages structure):
+homepage, Special:CategoryListing, paginated category pages, articles,
+`api.php` queries used by the scraper (categorymembers, info, recent changes),
+CSS with url() resources, images and videos.
+
+Latency, bandwidth and HTTP 429 responses can be injected to reproduce
+a remote website's behavior.
+
+    python -m benchmarks.server [--port 8765] [--latency 0.05] [--error-rate 0.01]
+
+`GET /__stats` returns the number of requests served, per kind."""
+
+import argparse
+import collections
+import functools
+import hashlib
+import http.server
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from .corpus import article_page, category_page, categorylisting_page, home_page, slug
+
+CATEGORY_PREFIX = "Category"
+FOOTER_LINKS = ["wikiHow:About wikiHow", "wikiHow:Terms of Use"]
+# members per API response and articles per category page
+API_LIMIT = 500
+CATEGORY_PAGE_SIZE = 50
+
+
+class MockWiki:
+    """Synthetic wiki: nb_categories root categories, each with nb_subcategories
+    subcategories. Every category holds nb_articles articles"""
+
+    def __init__(
+        self,
+        nb_categories: int = 4,
+        nb_subcategories: int = 3,
+        nb_articles: int = 20,
+        nb_steps: int = 12,
+    ):
+        self.nb_steps = nb_steps
+        # category -> (parent, subcategories, articles). Keyed on URL form
+        self.categories: Dict[str, Tuple[str, List[str], List[str]]] = {}
+        # article -> (title, categories)
+        self.articles: Dict[str, Tuple[str, List[str]]] = {}
+        self.roots = []
+
+        for index in range(nb_categories):
+            root = f"Topic {index}"
+            self.roots.append(root)
+            subcats = [f"Topic {index} Part {sub}" for sub in range(nb_subcategories)]
+            self.add_category(root, "", subcats, nb_articles)
+            for subcat in subcats:
+                self.add_category(subcat, root, [], nb_articles)
+
+    def add_category(self, name: str, parent: str, subcats: List[str], nb: int):
+        articles = [f"Do {name} Thing {index}" for index in range(nb)]
+        self.categories[slug(name)] = (parent, subcats, articles)
+        for title in articles:
+            self.articles[slug(title)] = (title, [name] + ([parent] if parent else []))
+
+    @staticmethod
+    def page_id(name: str) -> int:
+        return int(hashlib.sha256(name.encode("UTF-8")).hexdigest()[:8], 16)
+
+    def revision(self, article: str) -> int:
+        return 1000 + self.page_id(article) % 1000
+
+    def home(self) -> str:
+        return home_page(self.roots, FOOTER_LINKS)
+
+    def categorylisting(self) -> str:
+        return categorylisting_page(self.roots)
+
+    def category(self, name: str, page_num: int) -> Optional[str]:
+        if name not in self.categories:
+            return None
+        _, subcats, articles = self.categories[name]
+        nb_pages = max(1, -(-len(articles) // CATEGORY_PAGE_SIZE))
+        start = (page_num - 1) * CATEGORY_PAGE_SIZE
+        end = start + CATEGORY_PAGE_SIZE
+        return category_page(
+            name.replace("-", " "),
+            articles=articles[start:end] or articles[:1],
+            subcats=subcats,
+            page_num=page_num,
+            nb_pages=nb_pages,
+        )
+
+    def article(self, name: str) -> Optional[str]:
+        if name in self.articles:
+            title, categories = self.articles[name]
+        elif name.lower() in (slug(link).lower() for link in FOOTER_LINKS):
+            # namespaces are case-insensitive
+            title, categories = name.replace("-", " "), []
+        else:
+            return None
+        related = [
+            other
+            for category in categories
+            for other in self.categories[slug(category)][2]
+            if other != title
+        ]
+        return article_page(
+            title,
+            nb_steps=self.nb_steps,
+            categories=categories or ["wikiHow"],
+            related_titles=related[:8],
+            # no YouTube: it would require reaching youtube.com
+            with_youtube=False,
+        )
+
+    def random_article(self) -> str:
+        return next(iter(self.articles))
+
+
+class MockApi:
+    """MediaWiki API (action=query, formatversion=2) over a MockWiki"""
+
+    def __init__(self, wiki: MockWiki, base_url: str):
+        self.wiki = wiki
+        self.base_url = base_url
+
+    def category_of(self, title: str) -> Optional[str]:
+        """URL form of a `Category:` title"""
+        prefix, _, name = title.partition(":")
+        if prefix != CATEGORY_PREFIX or not name:
+            return None
+        return slug(name)
+
+    def page_info(self, article: str) -> Dict:
+        title, _ = self.wiki.articles[article]
+        return {
+            "pageid": self.wiki.page_id(article),
+            "ns": 0,
+            "title": title,
+            "contentmodel": "wikitext",
+            "lastrevid": self.wiki.revision(article),
+            "fullurl": f"{self.base_url}/{article}",
+        }
+
+    def category_info(self, category: str) -> Dict:
+        return {
+            "pageid": self.wiki.page_id(category),
+            "ns": 14,
+            "title": f"{CATEGORY_PREFIX}:{category.replace('-', ' ')}",
+        }
+
+    def members_of(self, title: str, types: str) -> List[Dict]:
+        category = self.category_of(title)
+        if category not in self.wiki.categories:
+            return []
+        _, subcats, articles = self.wiki.categories[category]
+        members = []
+        if "subcat" in types:
+            members += [self.category_info(slug(subcat)) for subcat in subcats]
+        if "page" in types:
+            members += [self.page_info(slug(article)) for article in articles]
+        return members
+
+    def query(self, params: Dict[str, str]) -> Dict:
+        if params.get("action") != "query":
+            return {"error": {"code": "badvalue", "info": "Only action=query"}}
+
+        if params.get("list") == "categorymembers":
+            members = self.members_of(params.get("cmtitle", ""), params["cmtype"])
+            return self.paginate("categorymembers", members, "cmcontinue", params)
+
+        if params.get("generator") == "categorymembers":
+            members = self.members_of(params.get("gcmtitle", ""), params["gcmtype"])
+            return self.paginate("pages", members, "gcmcontinue", params)
+
+        if params.get("list") in ("recentchanges", "logevents"):
+            # the synthetic wiki never changes
+            return {"batchcomplete": True, "query": {params["list"]: []}}
+
+        if params.get("titles"):
+            pages = []
+            for title in params["titles"].split("|"):
+                if slug(title) not in self.wiki.articles:
+                    pages.append({"ns": 0, "title": title, "missing": True})
+                    continue
+                page = self.page_info(slug(title))
+                if "categories" in params.get("prop", ""):
+                    page["categories"] = [
+                        self.category_info(slug(category))
+                        for category in self.wiki.articles[slug(title)][1]
+                    ]
+                pages.append(page)
+            return {"batchcomplete": True, "query": {"pages": pages}}
+
+        return {"error": {"code": "badvalue", "info": "Unsupported query"}}
+
+    @staticmethod
+    def paginate(key: str, members: List[Dict], param: str, params: Dict) -> Dict:
+        offset = int(params.get(param, 0))
+        end = offset + API_LIMIT
+        data = {"query": {key: members[offset:end]}}
+        if end < len(members):
+            data["continue"] = {param: str(end), "continue": "-||"}
+        else:
+            data["batchcomplete"] = True
+        return data
+
+
+@functools.lru_cache(maxsize=1024)
+def get_image(path: str) -> Tuple[bytes, str]:
+    """(content, mimetype) of an image for path, unique to it"""
+    rng = random.Random(path)
+    width, height = (96, 96) if "icon" in path or "logo" in path else (728, 546)
+    img = Image.new("RGB", (width, height), (rng.randrange(256), 128, 64))
+    # a few distinct pixels so that each image has its own content
+    for _ in range(16):
+        img.putpixel((rng.randrange(width), rng.randrange(height)), (0, 0, 0))
+
+    fmt, mimetype = "JPEG", "image/jpeg"
+    if path.endswith(".png"):
+        fmt, mimetype = "PNG", "image/png"
+    elif path.endswith(".webp"):
+        fmt, mimetype = "WEBP", "image/webp"
+    elif path.endswith(".ico"):
+        fmt, mimetype = "ICO", "image/x-icon"
+    stream = io.BytesIO()
+    img.save(stream, format=fmt)
+    return stream.getvalue(), mimetype
+
+
+@functools.lru_cache(maxsize=1)
+def get_video() -> bytes:
+    """a 2s MP4 clip, generated with ffmpeg
+
+    Without ffmpeg (which the scraper needs to re-encode videos anyway),
+    random bytes of similar size are served"""
+    if not shutil.which("ffmpeg"):
+        return os.urandom(200 * 2**10)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fpath = f"{tmp_dir}/video.mp4"
+        subprocess.run(
+            [
+                "ffmpeg",
+                "-loglevel",
+                "error",
+                "-f",
+                "lavfi",
+                "-i",
+                "testsrc=duration=2:size=320x180:rate=15",
+                "-pix_fmt",
+                "yuv420p",
+                fpath,
+            ],
+            check=True,
+        )
+        with open(fpath, "rb") as fh:
+            return fh.read()
+
+
+def get_css(modules: str) -> str:
+    """stylesheet referencing url() resources, distinct per modules"""
+    name = slug(modules.replace(".", "-").replace(",", "-"))
+    return "\n".join(
+        [
+            f"/* {modules} */",
+            "body { font-family: sans-serif; margin: 0 }",
+            f".{name} .icon {{ background: url(/images/{name}-sprite.png) no-repeat }}",
+            f'.{name} .logo {{ background-image: url("/images/{name}-logo.png") }}',
+            "@font-face { font-family: x; src: url(data:font/woff2;base64,AAAA) }",
+            ".section { padding: 0 1em; border: 1px solid #ccc }",
+        ]
+    )
+
+
+class MockHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # set on the subclass built by make_server()
+    wiki: MockWiki = None
+    api: MockApi = None
+    latency: float = 0
+    bandwidth: int = 0
+    error_rate: float = 0
+    retry_after: int = 1
+    stats: collections.Counter = None
+    stats_lock: threading.Lock = None
+
+    def count(self, kind: str):
+        with self.stats_lock:
+            self.stats[kind] += 1
+
+    def do_GET(self):
+        self.handle_request(self.path)
+
+    def do_HEAD(self):
+        self.handle_request(self.path, with_body=False)
+
+    def do_POST(self):
+        # pywikiapi POSTs queries whose URL would be too long
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length).decode("UTF-8")
+        self.handle_request(f"{self.path}?{body}")
+
+    def handle_request(self, target: str, with_body: bool = True):
+        url = urllib.parse.urlparse(target)
+        path = urllib.parse.unquote(url.path)
+        params = dict(urllib.parse.parse_qsl(url.query, keep_blank_values=True))
+
+        if path == "/__stats":
+            with self.stats_lock:
+                return self.respond(200, json.dumps(self.stats), "application/json")
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if self.error_rate and random.random() < self.error_rate:
+            self.count("429")
+            return self.respond(
+                429,
+                "Too Many Requests",
+                "text/plain",
+                headers={"Retry-After": str(self.retry_after)},
+            )
+
+        status, content, mimetype, headers = self.route(path, params)
+        self.count(str(status))
+        self.respond(status, content, mimetype, headers, with_body)
+
+    def route(self, path: str, params: Dict) -> Tuple[int, object, str, Dict]:
+        """(status, content, mimetype, headers) for a request"""
+        html = "text/html; charset=UTF-8"
+        if path in ("/", "/Main-Page"):
+            self.count("page")
+            return 200, self.wiki.home(), html, {}
+        if path == "/api.php":
+            self.count("api")
+            return 200, json.dumps(self.api.query(params)), "application/json", {}
+        if path == "/load.php":
+            self.count("css")
+            return 200, get_css(params.get("modules", "")), "text/css", {}
+        if path == "/Special:CategoryListing":
+            self.count("page")
+            return 200, self.wiki.categorylisting(), html, {}
+        if path == "/Special:Randomizer":
+            return 302, "", html, {"Location": f"/{self.wiki.random_article()}"}
+        if path.endswith(".mp4"):
+            self.count("video")
+            return 200, get_video(), "video/mp4", {}
+        if path.endswith((".jpg", ".png", ".webp", ".ico")):
+            self.count("image")
+            content, mimetype = get_image(path)
+            return 200, content, mimetype, {}
+
+        name = slug(path[1:])
+        prefix, _, category = name.partition(":")
+        content = (
+            self.wiki.category(category, int(params.get("pg", 1)))
+            if prefix == CATEGORY_PREFIX
+            else self.wiki.article(name)
+        )
+        if content is None:
+            self.count("missing")
+            return 404, "Not Found", "text/plain", {}
+        self.count("page")
+        return 200, content, html, {}
+
+    def respond(
+        self,
+        status: int,
+        content,
+        mimetype: str,
+        headers: Dict = None,
+        with_body: bool = True,
+    ):
+        body = content.encode("UTF-8") if isinstance(content, str) else content
+        self.send_response(status)
+        self.send_header("Content-Type", mimetype)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if not with_body:
+            return
+        if not self.bandwidth:
+            self.wfile.write(body)
+            return
+        # throttle this response to bandwidth (bytes per second)
+        chunk_size = max(1024, self.bandwidth // 10)
+        stream = io.BytesIO(body)
+        for chunk in iter(lambda: stream.read(chunk_size), b""):
+            self.wfile.write(chunk)
+            time.sleep(len(chunk) / self.bandwidth)
+
+    def log_message(self, *args):
+        pass
+
+
+def make_server(
+    wiki: MockWiki,
+    host: str = "127.0.0.1",
+    port: int = 0,
+    latency: float = 0,
+    bandwidth: int = 0,
+    error_rate: float = 0,
+) -> http.server.ThreadingHTTPServer:
+    """HTTP server for wiki (port 0 picks a free one)"""
+    handler = type(
+        "Handler",
+        (MockHandler,),
+        {
+            "wiki": wiki,
+            "latency": latency,
+            "bandwidth": bandwidth,
+            "error_rate": error_rate,
+            "stats": collections.Counter(),
+            "stats_lock": threading.Lock(),
+        },
+    )
+    server = http.server.ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    handler.api = MockApi(wiki, f"http://{host}:{server.server_port}")
+    return server
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """options shared by the server and benchmark harness"""
+    parser.add_argument("--categories", type=int, default=4, dest="nb_categories")
+    parser.add_argument("--subcategories", type=int, default=3, dest="nb_subcategories")
+    parser.add_argument(
+        "--articles", type=int, default=20, help="per category", dest="nb_articles"
+    )
+    parser.add_argument("--steps", type=int, default=12, help="per article")
+    parser.add_argument(
+        "--latency", type=float, default=0, help="seconds added to each response"
+    )
+    parser.add_argument(
+        "--bandwidth", type=int, default=0, help="bytes per second, per response"
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0,
+        help="ratio of requests answered with HTTP 429",
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in wikiHow website")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    wiki = MockWiki(
+        nb_categories=args.nb_categories,
+        nb_subcategories=args.nb_subcategories,
+        nb_articles=args.nb_articles,
+        nb_steps=args.steps,
+    )
+    server = make_server(
+        wiki,
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        bandwidth=args.bandwidth,
+        error_rate=args.error_rate,
+    )
+    print(
+        f"Serving {len(wiki.categories)} categories and {len(wiki.articles)} "
+        f"articles on http://{args.host}:{server.server_port}",
+        flush=True,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
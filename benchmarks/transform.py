@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+""" Offline micro-benchmark of the HTML transform hot path
+
+Runs the bundled corpus through the same steps as scrape_article() and
+scrape_category_page(), timing each of them: parsing, blacklist cleanup,
+videos handling (also reported per video), rewriting, footer crumbs and Jinja
+rendering.
+Images and videos are not processed: their deferral is stubbed.
+
+    python -m benchmarks.transform [--iterations 20] [--json results.json]
+
+`--backend` selects the HTML backend to benchmark, `--partial-parsing` only
+builds the regions of pages the scraper uses. `--compare` checks that both
+backends, with and without partial parsing, render every page identically."""
+
+import argparse
+import collections
+import difflib
+import json
+import pathlib
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from wikihow2zim.rewriter import Rewriter
+from wikihow2zim.scraper import (
+    ARTICLE_BLACKLIST,
+    CATEGORY_BLACKLIST,
+    remove_blacklisted,
+    wikihow2zim,
+)
+from wikihow2zim.shared import Global
+from wikihow2zim.utils import get_digest, get_footer_crumbs_from, get_page_soup_of
+
+from .corpus import CORPUS_DIR
+
+
+class StubGrabber:
+    """stands for Imager and VideoGrabber: returns in-ZIM path immediately"""
+
+    def __init__(self, folder: str, suffix: str):
+        self.folder = folder
+        self.suffix = suffix
+        self.nb_requested = 0
+
+    def defer(self, url: str, path: str = None) -> str:
+        self.nb_requested += 1
+        return path or f"{self.folder}/{get_digest(url)}{self.suffix}"
+
+    @staticmethod
+    def youtube_poster_url(url: str) -> str:
+        return f"{url}/poster.webp"
+
+
+def setup(tmp_dir: pathlib.Path) -> wikihow2zim:
+    """a scraper ready to transform pages, without network access"""
+    scraper = wikihow2zim(
+        lang_code="en",
+        _output_dir=str(tmp_dir),
+        _tmp_dir=str(tmp_dir),
+        build_dir_is_tmp_dir=True,
+    )
+    Global.metadata = {
+        "category_prefix": "Category",
+        "homepage_name": "Main-Page",
+        "footer_links": [],
+        "dir": "ltr",
+        "linked_styles": [],
+        "inline_digest": "inline",
+    }
+    scraper.env_context.update(
+        {
+            "dir": "ltr",
+            "lang": "en",
+            "linked_styles": [],
+            "inline_digest": "inline",
+            "homepage_name": "Main-Page",
+        }
+    )
+    Global.imager = StubGrabber("images", ".webp")
+    Global.vidgrabber = StubGrabber("videos", ".webm")
+    Global.rewriter = Rewriter()
+    # some links are kept, others removed (not expected), as with --only
+    Global.conf.full_mode = False
+    Global.expected_categories.update({"Recipes", "Food-and-Entertaining"})
+    Global.expected_articles.update(
+        {f"Cook-Something-Nice-{index}" for index in range(0, 40, 2)}
+    )
+    return scraper
+
+
+def article_steps(scraper: wikihow2zim) -> List[Callable]:
+    """steps of process_article(), each taking and returning a state dict"""
+
+    def blacklist(state):
+        state["content"] = state["soup"].select("div#content_wrapper")[0]
+        remove_blacklisted(state["content"], ARTICLE_BLACKLIST)
+
+    def videos(state):
+        scraper.handle_videos_for(state["soup"])
+
+    def crumbs(state):
+        state["crumbs"] = get_footer_crumbs_from(state["soup"])
+
+    def rewrite(state):
+        state["html"] = scraper.rewriter.rewrite(state["content"], to_root="./")
+
+    def render(state):
+        soup = state["soup"]
+        state["page"] = scraper.render_page(
+            "article.html",
+            "./",
+            body_classes=" ".join(soup.find("body").attrs.get("class", [])),
+            content=state["html"],
+            page_linked_styles=[],
+            viewport_classes=" ".join(
+                soup.find(attrs={"id": "mw-mf-viewport"}).attrs.get("class", [])
+                + ["wikihow-article"]
+            ),
+            breadcrumbs=state["crumbs"],
+            title=soup.find("title").string,
+        )
+
+    return [blacklist, videos, crumbs, rewrite, render]
+
+
+def category_steps(scraper: wikihow2zim) -> List[Callable]:
+    """steps of scrape_category_page()"""
+
+    def blacklist(state):
+        state["content"] = state["soup"].select("div#content_wrapper")[0]
+        remove_blacklisted(state["content"], CATEGORY_BLACKLIST)
+
+    def crumbs(state):
+        state["crumbs"] = get_footer_crumbs_from(state["soup"])
+
+    def rewrite(state):
+        state["html"] = scraper.rewriter.rewrite(state["content"], to_root="./")
+
+    def render(state):
+        soup = state["soup"]
+        state["page"] = scraper.render_page(
+            "category.html",
+            "./",
+            body_classes=" ".join(soup.find("body").attrs.get("class", [])),
+            content=state["html"],
+            page_linked_styles=[],
+            viewport_classes="wikihow-category",
+            breadcrumbs=state["crumbs"],
+            title=soup.find("title").string,
+        )
+
+    return [blacklist, crumbs, rewrite, render]
+
+
+def run_page(html: str, steps: List[Callable], timings: Dict[str, float]) -> Dict:
+    """state after running all steps on html, adding their durations to timings"""
+    started_on = time.perf_counter()
+    state = {"soup": get_page_soup_of(html)}
+    timings["parse"] += time.perf_counter() - started_on
+    for step in steps:
+        started_on = time.perf_counter()
+        step(state)
+        timings[step.__name__] += time.perf_counter() - started_on
+    return state
+
+
+def steps_for(scraper: wikihow2zim, fpath: pathlib.Path) -> List[Callable]:
+    if fpath.stem.startswith("article"):
+        return article_steps(scraper)
+    return category_steps(scraper)
+
+
+def compare(scraper: wikihow2zim) -> int:
+    """number of corpus pages rendered differently by backends and parsing modes"""
+    nb_differing = 0
+    for fpath in sorted(CORPUS_DIR.glob("*.html")):
+        html = fpath.read_text()
+        pages = {}
+        for backend in ("bs4", "lxml"):
+            for partial_parsing in (False, True):
+                Global.conf.html_backend = backend
+                Global.conf.partial_parsing = partial_parsing
+                state = run_page(html, steps_for(scraper, fpath), collections.Counter())
+                name = backend + (" (partial)" if partial_parsing else "")
+                pages[name] = state["page"].decode("utf-8")
+        reference, *others = pages.items()
+        differing = [(name, page) for name, page in others if page != reference[1]]
+        if not differing:
+            print(f"{fpath.name:<22} identical")
+            continue
+        nb_differing += 1
+        print(f"{fpath.name:<22} DIFFERS")
+        for name, page in differing:
+            diff = difflib.unified_diff(
+                reference[1].splitlines(),
+                page.splitlines(),
+                reference[0],
+                name,
+                lineterm="",
+            )
+            print("\n".join(list(diff)[:40]))
+    return nb_differing
+
+
+def benchmark(scraper: wikihow2zim, iterations: int) -> Dict:
+    results = {}
+    for fpath in sorted(CORPUS_DIR.glob("*.html")):
+        html = fpath.read_text()
+        steps = steps_for(scraper, fpath)
+
+        # warmup (templates compilation, selectors cache)
+        run_page(html, steps, collections.defaultdict(float))
+
+        timings = collections.defaultdict(float)
+        Global.vidgrabber.nb_requested = 0
+        for _ in range(iterations):
+            run_page(html, steps, timings)
+        nb_videos = Global.vidgrabber.nb_requested // iterations
+        # cost of replacing each video with our own <video/> node
+        ms_per_video = (
+            round(timings["videos"] / iterations / nb_videos * 1000, 3)
+            if nb_videos
+            else None
+        )
+
+        tracemalloc.start()
+        run_page(html, steps, collections.defaultdict(float))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        total = sum(timings.values())
+        results[fpath.name] = {
+            "size": len(html),
+            "pages_per_second": round(iterations / total, 2),
+            "peak_memory": peak,
+            "videos": nb_videos,
+            "ms_per_video": ms_per_video,
+            "steps": {
+                name: round(duration / iterations * 1000, 3)
+                for name, duration in timings.items()
+            },
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Offline micro-benchmark of the HTML transform hot path"
+    )
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--json", help="Path to write results to (JSON)")
+    parser.add_argument("--backend", choices=["bs4", "lxml"], default="bs4")
+    parser.add_argument(
+        "--partial-parsing",
+        help="Only build the regions of pages the scraper uses",
+        action="store_true",
+        dest="partial_parsing",
+    )
+    parser.add_argument(
+        "--compare",
+        help="Only check that both backends produce identical pages",
+        action="store_true",
+    )
+    args = parser.parse_args()
+
+    Global.logger.setLevel("WARNING")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        scraper = setup(pathlib.Path(tmp_dir))
+        if args.compare:
+            return 1 if compare(scraper) else 0
+        Global.conf.html_backend = args.backend
+        Global.conf.partial_parsing = args.partial_parsing
+        results = benchmark(scraper, args.iterations)
+
+    for name, result in results.items():
+        steps = ", ".join(f"{step}={ms}ms" for step, ms in result["steps"].items())
+        if result["videos"]:
+            steps += f" | {result['videos']} videos, {result['ms_per_video']}ms each"
+        print(
+            f"{name:<22} {result['size'] // 1024:>5} KiB "
+            f"{result['pages_per_second']:>8} pages/s "
+            f"peak {result['peak_memory'] // 1024:>6} KiB | {steps}"
+        )
+
+    if args.json:
+        pathlib.Path(args.json).write_text(json.dumps(results, indent=2))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
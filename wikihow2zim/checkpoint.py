@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+import json
+import pathlib
+import sqlite3
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from zimscraperlib.zim.creator import Creator
+
+from .shared import logger
+
+
+class Checkpoint:
+    """SQLite journal of a scrape, allowing to resume it after a crash
+
+    A ZIM being written can't be reopened so everything added to the Creator
+    is journaled, to be replayed into a new one on resume. Along with it:
+    - discovery results (expected categories and articles)
+    - completed units of work (articles, categories) and missing ones
+    - requested media (images, videos): pending ones are those not journaled"""
+
+    def __init__(self, fpath: pathlib.Path, resume: bool = False):
+        self.fpath = fpath
+        if not resume and self.fpath.exists():
+            logger.info(f"Discarding previous checkpoint at {self.fpath}")
+            self.remove()
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(fpath), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE IF NOT EXISTS entries (
+                    path TEXT PRIMARY KEY, title TEXT, mimetype TEXT,
+                    is_front INTEGER, content BLOB, target TEXT);
+                CREATE TABLE IF NOT EXISTS done (
+                    kind TEXT, name TEXT, PRIMARY KEY (kind, name));
+                CREATE TABLE IF NOT EXISTS requests (
+                    kind TEXT, url TEXT, path TEXT, PRIMARY KEY (kind, url));
+                """
+            )
+
+    def execute(self, query: str, params: Tuple = ()):
+        """run a writing query in its own (committed) transaction"""
+        with self.lock, self.conn:
+            self.conn.execute(query, params)
+
+    def journal_item(
+        self,
+        path: str,
+        title: Optional[str],
+        mimetype: Optional[str],
+        is_front: Optional[bool],
+        content: bytes,
+    ):
+        self.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, NULL)",
+            (path, title, mimetype, is_front, content),
+        )
+
+    def journal_redirect(
+        self, path: str, target: str, title: Optional[str], is_front: Optional[bool]
+    ):
+        self.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, NULL, ?, NULL, ?)",
+            (path, title, is_front, target),
+        )
+
+    def entries(self) -> Iterator[Tuple]:
+        """(path, title, mimetype, is_front, content, target) in journaling order"""
+        cursor = self.conn.execute(
+            "SELECT path, title, mimetype, is_front, content, target "
+            "FROM entries ORDER BY rowid"
+        )
+        yield from cursor
+
+    def replay(self, creator: Creator) -> List[str]:
+        """add all journaled entries to (a fresh) creator, returning their paths"""
+        paths = []
+        for path, title, mimetype, is_front, content, target in self.entries():
+            # don't journal those again
+            if target is None:
+                Creator.add_item_for(
+                    creator,
+                    path=path,
+                    title=title,
+                    content=content,
+                    mimetype=mimetype,
+                    is_front=None if is_front is None else bool(is_front),
+                )
+            else:
+                Creator.add_redirect(
+                    creator,
+                    path=path,
+                    target_path=target,
+                    title=title or "",
+                    is_front=None if is_front is None else bool(is_front),
+                )
+            paths.append(path)
+        return paths
+
+    def mark_done(self, kind: str, name: str):
+        self.execute("INSERT OR IGNORE INTO done VALUES (?, ?)", (kind, name))
+
+    def done(self, kind: str) -> Set[str]:
+        with self.lock:
+            return {
+                name
+                for (name,) in self.conn.execute(
+                    "SELECT name FROM done WHERE kind=?", (kind,)
+                )
+            }
+
+    def record_request(self, kind: str, url: str, path: str):
+        self.execute(
+            "INSERT OR IGNORE INTO requests VALUES (?, ?, ?)", (kind, url, path)
+        )
+
+    def requests(self, kind: str) -> Tuple[List[Tuple[str, str]], List[str]]:
+        """([(url, path), …] of pending requests, [url, …] of completed ones)"""
+        pending, completed = [], []
+        with self.lock:
+            for url, path, is_journaled in self.conn.execute(
+                "SELECT url, requests.path, entries.path IS NOT NULL FROM requests "
+                "LEFT JOIN entries ON requests.path = entries.path WHERE kind=?",
+                (kind,),
+            ):
+                if is_journaled:
+                    completed.append(url)
+                else:
+                    pending.append((url, path))
+        return pending, completed
+
+    def save_discovery(self, discovery: Dict[str, Any]):
+        self.execute(
+            "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+            ("discovery", json.dumps(discovery)),
+        )
+
+    def discovery(self) -> Optional[Dict[str, Any]]:
+        """discovery results, if recorded"""
+        row = self.conn.execute(
+            "SELECT value FROM meta WHERE key=?", ("discovery",)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def remove(self):
+        """delete checkpoint files (once ZIM is complete)"""
+        if getattr(self, "conn", None):
+            self.conn.close()
+        for suffix in ("", "-wal", "-shm"):
+            pathlib.Path(f"{self.fpath}{suffix}").unlink(missing_ok=True)
+
+
+class JournaledCreator(Creator):
+    """Creator journaling added items and redirects to an optional Checkpoint"""
+
+    def __init__(self, *args, checkpoint: Optional[Checkpoint] = None, **kwargs):
+        self.checkpoint = checkpoint
+        super().__init__(*args, **kwargs)
+
+    def add_item_for(
+        self,
+        path: str,
+        title: Optional[str] = None,
+        fpath: Optional[pathlib.Path] = None,
+        content: Optional[bytes] = None,
+        mimetype: Optional[str] = None,
+        is_front: Optional[bool] = None,
+        **kwargs,
+    ):
+        if self.checkpoint:
+            # fpath might be deleted once added
+            data = fpath.read_bytes() if content is None else content
+            self.checkpoint.journal_item(
+                path=path,
+                title=title,
+                mimetype=mimetype,
+                is_front=is_front,
+                content=data.encode("UTF-8") if isinstance(data, str) else data,
+            )
+        return super().add_item_for(
+            path=path,
+            title=title,
+            fpath=fpath,
+            content=content,
+            mimetype=mimetype,
+            is_front=is_front,
+            **kwargs,
+        )
+
+    def add_redirect(
+        self,
+        path: str,
+        target_path: str,
+        title: Optional[str] = "",
+        is_front: Optional[bool] = None,
+        **kwargs,
+    ):
+        if self.checkpoint:
+            self.checkpoint.journal_redirect(
+                path=path, target=target_path, title=title, is_front=is_front
+            )
+        return super().add_redirect(
+            path=path,
+            target_path=target_path,
+            title=title,
+            is_front=is_front,
+            **kwargs,
+        )
@@ -5,7 +5,7 @@ import re
 import tempfile
 import urllib.parse
 from dataclasses import dataclass, field
-from typing import List, Optional, Set
+from typing import Dict, List, Optional, Set, Tuple
 
 from zimscraperlib.i18n import get_language_details
 
@@ -18,6 +18,16 @@ with open(ROOT_DIR.joinpath("VERSION"), "r") as fh:
 
 SCRAPER = f"{NAME} {VERSION}"
 IMAGES_ENCODER_VERSION = 1
+# in-ZIM record of articles revision IDs, for --previous-zim
+REVISIONS_PATH = "scraper/revisions.json"
+# MediaWiki keeps recent changes for 90 days by default.
+# snapshots older than that (with a margin) can't be refreshed: days
+SNAPSHOT_MAX_AGE = 80
+# snapshots made with another version are ignored (2: with articles titles)
+SNAPSHOT_VERSION = 2
+API_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+# max size of in-run HTTP responses memo
+HTTP_MEMO_SIZE = 2**25
 VIDEOS_ENCODER_VERSION = 1
 URLS = {
     "en": "https://www.wikihow.com",
@@ -74,7 +84,20 @@ class Conf:
 
     # performances
     nb_threads: Optional[int] = -1
+    nb_api_threads: Optional[int] = 1
+    engine: Optional[str] = "threads"
+    concurrency: Optional[int] = 100
+    html_backend: Optional[str] = "bs4"
+    partial_parsing: Optional[bool] = False
+    rate_limit: Optional[float] = 0
+    bandwidth_limit: Optional[int] = 0
+    host_rate_limit: List[str] = field(default_factory=list)
+    host_budgets: Dict[str, Tuple[float, int, int]] = field(default_factory=dict)
     s3_url_with_credentials: Optional[str] = ""
+    http_cache: Optional[pathlib.Path] = None
+    discovery_snapshot: Optional[pathlib.Path] = None
+    previous_zim: Optional[pathlib.Path] = None
+    http_cache_size: Optional[int] = 2048
 
     # quality
     without_videos: Optional[bool] = False
@@ -92,6 +115,12 @@ class Conf:
     delay: Optional[float] = 0
     api_delay: Optional[float] = 0
     stats_filename: Optional[str] = None
+    checkpoint: Optional[pathlib.Path] = None
+    metrics_port: Optional[int] = None
+    metrics_host: Optional[str] = "127.0.0.1"
+    profile: Optional[bool] = False
+    metrics_textfile: Optional[pathlib.Path] = None
+    resume: Optional[bool] = False
     skip_dom_check: Optional[bool] = False
     skip_footer_links: Optional[bool] = False
     single_article: Optional[str] = ""
@@ -130,6 +159,29 @@ class Conf:
             )
         self.build_dir.joinpath("videos").mkdir(parents=True, exist_ok=True)
 
+        if self.http_cache:
+            self.http_cache = pathlib.Path(self.http_cache).expanduser().resolve()
+
+        if self.previous_zim:
+            self.previous_zim = pathlib.Path(self.previous_zim).expanduser().resolve()
+
+        if self.discovery_snapshot:
+            self.discovery_snapshot = (
+                pathlib.Path(self.discovery_snapshot).expanduser().resolve()
+            )
+            self.discovery_snapshot.parent.mkdir(parents=True, exist_ok=True)
+
+        if self.resume and not self.checkpoint:
+            raise ValueError("--resume requires --checkpoint")
+
+        if self.checkpoint:
+            self.checkpoint = pathlib.Path(self.checkpoint).expanduser().resolve()
+            self.checkpoint.parent.mkdir(parents=True, exist_ok=True)
+
+        if self.metrics_textfile:
+            self.metrics_textfile = pathlib.Path(self.metrics_textfile).expanduser()
+            self.metrics_textfile.parent.mkdir(parents=True, exist_ok=True)
+
         if self.stats_filename:
             self.stats_filename = pathlib.Path(self.stats_filename).expanduser()
             self.stats_filename.parent.mkdir(parents=True, exist_ok=True)
@@ -158,6 +210,40 @@ class Conf:
         # whether requesting a _full mode_ (complete wiki)
         self.full_mode = not self.categories and not self.only and not self.exclude
 
+        if self.nb_threads < 1:
+            self.nb_threads = 1
+        if self.nb_api_threads < 1:
+            self.nb_api_threads = 1
+        if self.concurrency < 1:
+            self.concurrency = 1
+
+        # per-host (requests, bytes) per second budgets. HOST=RPS[:BPS] format
+        # with HOST a URL netloc, including its port if any
+        self.rate_limit = self.rate_limit or 0
+        self.bandwidth_limit = self.bandwidth_limit or 0
+        for entry in self.host_rate_limit or []:
+            match = re.match(
+                r"^(?P<host>[^=\s]+)=(?P<rps>\d+(\.\d+)?)(:(?P<bps>\d+))?$", entry
+            )
+            if not match or not float(match.group("rps")):
+                raise ValueError(
+                    f"Invalid host rate limit: {entry}. Format is HOST=RPS[:BPS]"
+                )
+            self.host_budgets[match.group("host")] = (
+                float(match.group("rps")),
+                int(match.group("bps") or 0),
+                0,
+            )
+
+        # --delay is a minimum interval between requests to the source website:
+        # a bucket of a single token, allowing no burst
+        if self.delay:
+            rps, bps, _ = self.host_budgets.get(
+                self.domain, (self.rate_limit, self.bandwidth_limit, 0)
+            )
+            rps = min(rps, 1 / self.delay) if rps else 1 / self.delay
+            self.host_budgets[self.domain] = (rps, bps, 1)
+
         if self.missing_tolerance < 0:
             self.missing_tolerance = 0
         if self.missing_tolerance > 100:
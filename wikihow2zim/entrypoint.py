@@ -128,6 +128,92 @@ def main():
         dest="s3_url_with_credentials",
     )
 
+    parser.add_argument(
+        "--threads",
+        help="Number of article/category pages to scrape in parallel. "
+        "--delay still applies globally. Defaults to 1",
+        type=int,
+        default=1,
+        dest="nb_threads",
+    )
+
+    parser.add_argument(
+        "--api-threads",
+        help="Number of parallel API queries to discover categories and articles. "
+        "Defaults to 1",
+        type=int,
+        default=1,
+        dest="nb_api_threads",
+    )
+
+    parser.add_argument(
+        "--engine",
+        help="How to fetch articles and API listings. `threads` fetches from "
+        "--threads workers. `async` keeps up to --concurrency requests in flight "
+        "on an event loop, --threads workers only parsing and rendering pages. "
+        "Defaults to threads",
+        choices=["threads", "async"],
+        default="threads",
+    )
+
+    parser.add_argument(
+        "--concurrency",
+        help="Maximum number of in-flight requests with --engine async. "
+        "Defaults to 100",
+        type=int,
+        default=100,
+    )
+
+    parser.add_argument(
+        "--html-backend",
+        help="How to parse and rewrite pages. `bs4` uses BeautifulSoup. `lxml` "
+        "works on lxml trees directly: faster and lighter, for the same output. "
+        "Defaults to bs4",
+        choices=["bs4", "lxml"],
+        default="bs4",
+        dest="html_backend",
+    )
+
+    parser.add_argument(
+        "--partial-parsing",
+        help="Only build the parts of article and category pages that are used "
+        "(title, styles, content and breadcrumbs) instead of the whole document. "
+        "Faster and lighter, for the same output",
+        action="store_true",
+        default=False,
+        dest="partial_parsing",
+    )
+
+    parser.add_argument(
+        "--http-cache",
+        help="Path to a folder to keep fetched pages and CSS resources in accross "
+        "runs. Those are revalidated (conditional requests) before reuse",
+        dest="http_cache",
+    )
+
+    parser.add_argument(
+        "--http-cache-size",
+        help="Maximum size (MiB) of --http-cache. Least recently used entries are "
+        "removed above it. Defaults to 2048",
+        type=int,
+        default=2048,
+        dest="http_cache_size",
+    )
+
+    parser.add_argument(
+        "--previous-zim",
+        help="Path to a previous ZIM of this scraper. Articles which revision "
+        "didn't change since are copied from it instead of scraped",
+        dest="previous_zim",
+    )
+
+    parser.add_argument(
+        "--discovery-snapshot",
+        help="Path to an SQLite file to save discovered categories and articles "
+        "to. If present (and less than 80 days old), only changes since are queried",
+        dest="discovery_snapshot",
+    )
+
     parser.add_argument(
         "--debug", help="Enable verbose output", action="store_true", default=False
     )
@@ -159,11 +245,39 @@ def main():
 
     parser.add_argument(
         "--delay",
-        help="Add this delay (seconds) before each request to please "
-        "wikiHow servers. Can be fractions. Defaults to 0: no delay",
+        help="Minimum interval (seconds) between requests to wikiHow, to please "
+        "its servers. Applies accross all threads, without bursts. "
+        "Can be fractions. Defaults to 0: no delay",
         type=float,
     )
 
+    parser.add_argument(
+        "--rate-limit",
+        help="Maximum number of requests per second to any host. "
+        "Defaults to 0: no limit",
+        type=float,
+        dest="rate_limit",
+    )
+
+    parser.add_argument(
+        "--bandwidth-limit",
+        help="Maximum number of bytes per second downloaded from any host. "
+        "Defaults to 0: no limit",
+        type=int,
+        dest="bandwidth_limit",
+    )
+
+    parser.add_argument(
+        "--host-rate-limit",
+        help="Specific requests (and bytes) per second budget for a host, "
+        "overriding --rate-limit and --bandwidth-limit. "
+        "Format: `HOST=RPS[:BPS]`, HOST including its port if any "
+        "(`127.0.0.1:8080=5`). Use several times for several hosts",
+        default=[],
+        action="append",
+        dest="host_rate_limit",
+    )
+
     parser.add_argument(
         "--api-delay",
         help="Add this delay (seconds) before each API query (!= calls) to please "
@@ -202,6 +316,52 @@ def main():
         dest="single_article",
     )
 
+    parser.add_argument(
+        "--checkpoint",
+        help="Path to a file to journal the scrape to, so it can be resumed "
+        "should it fail. Removed once the ZIM is complete",
+        dest="checkpoint",
+    )
+
+    parser.add_argument(
+        "--resume",
+        help="Resume scrape from --checkpoint, skipping completed work",
+        action="store_true",
+        default=False,
+        dest="resume",
+    )
+
+    parser.add_argument(
+        "--profile",
+        help="Profile (cProfile) each phase of the scrape. Stats are dumped "
+        "to a profile folder in output directory",
+        action="store_true",
+        default=False,
+        dest="profile",
+    )
+
+    parser.add_argument(
+        "--metrics-port",
+        help="Expose Prometheus metrics on this local HTTP port",
+        type=int,
+        dest="metrics_port",
+    )
+
+    parser.add_argument(
+        "--metrics-host",
+        help="Address to bind --metrics-port to. Defaults to 127.0.0.1 (local "
+        "only). Use 0.0.0.0 to expose metrics on all interfaces",
+        default="127.0.0.1",
+        dest="metrics_host",
+    )
+
+    parser.add_argument(
+        "--metrics-textfile",
+        help="Periodically write Prometheus metrics to this file "
+        "(for node_exporter's textfile collector)",
+        dest="metrics_textfile",
+    )
+
     parser.add_argument(
         "--stats-filename",
         help="Path to store the progress JSON file to.",
@@ -4,8 +4,10 @@
 
 import queue
 import threading
-from typing import Callable
+import time
+from typing import Callable, Optional
 
+from .metrics import EXECUTOR_BUSY, EXECUTOR_BUSY_TIME, EXECUTOR_QUEUE, EXECUTOR_WORKERS
 from .shared import logger
 
 _shutdown = False
@@ -21,6 +23,18 @@ def excepthook(args):
 
 threading.excepthook = excepthook
 
+# all executors, for metrics
+_executors = []
+EXECUTOR_QUEUE.set_function(
+    lambda: (({"executor": ex.name}, ex.qsize()) for ex in _executors)
+)
+EXECUTOR_WORKERS.set_function(
+    lambda: (({"executor": ex.name}, ex.nb_workers) for ex in _executors)
+)
+EXECUTOR_BUSY.set_function(
+    lambda: (({"executor": ex.name}, ex.nb_busy) for ex in _executors)
+)
+
 
 class Executor(queue.Queue):
     """Custom FIFO queue based Executor that's less generic than ThreadPoolExec one
@@ -38,6 +52,11 @@ class Executor(queue.Queue):
         self._shutdown_lock = threading.Lock()
         self.nb_workers = nb_workers
         self.exceptions = []
+        # metrics label. ex: PAGE-T- -> page
+        self.name = prefix.split("-")[0].lower()
+        self.nb_busy = 0
+        self.busy_lock = threading.Lock()
+        _executors.append(self)
 
     @property
     def exception(self):
@@ -102,6 +121,9 @@ class Executor(queue.Queue):
             callback = kwargs.pop("callback") if "callback" in kwargs.keys() else None
             dont_release = kwargs.pop("dont_release", False)
 
+            with self.busy_lock:
+                self.nb_busy += 1
+            started_on = time.monotonic()
             try:
                 func(**kwargs)
             except Exception as exc:
@@ -109,8 +131,14 @@ class Executor(queue.Queue):
                 logger.exception(exc)
                 if raises:
                     self.exceptions.append(exc)
-                    self.shutdown()
+                    # can't join from within one of our workers
+                    self.shutdown(wait=False)
             finally:
+                with self.busy_lock:
+                    self.nb_busy -= 1
+                EXECUTOR_BUSY_TIME.inc(
+                    time.monotonic() - started_on, executor=self.name
+                )
                 # user will manually release the queue for this task.
                 # most likely in a libzim-written callback
                 if not dont_release:
@@ -118,6 +146,20 @@ class Executor(queue.Queue):
                 if callback:
                     callback.__call__()
 
+    def await_tasks(self, timeout: Optional[float] = None) -> bool:
+        """Await completion of all submitted tasks, returning whether they did
+
+        Tasks can submit other tasks. Returns early should the executor stop.
+        Tasks submitted with `dont_release` are never considered completed"""
+        end = time.monotonic() + timeout if timeout is not None else None
+        with self.all_tasks_done:
+            while self.unfinished_tasks and self.alive:
+                remaining = 2.0 if end is None else min(2.0, end - time.monotonic())
+                if remaining <= 0:
+                    return False
+                self.all_tasks_done.wait(timeout=remaining)
+        return True
+
     def drain(self):
         """Empty the queue without processing the tasks (tasks will be lost)"""
         while True:
@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+import asyncio
+import datetime
+import json
+import logging
+import urllib.parse
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+import backoff
+
+from .executor import Executor
+from .httpcache import HttpCache
+from .metrics import HTTP_DURATION, HTTP_RESPONSES
+from .shared import Global, logger
+from .utils import entry_for, get_url, no_leading_slash, only_path_of, to_url
+
+
+class ApiError(Exception):
+    pass
+
+
+def is_not_recoverable(exc: Exception) -> bool:
+    return isinstance(exc, aiohttp.ClientResponseError) and exc.status == 404
+
+
+def retries(func):
+    """retry policy of async requests. Identical to utils.fetch's"""
+    return backoff.on_exception(
+        backoff.expo,
+        (aiohttp.ClientError, asyncio.TimeoutError),
+        giveup=is_not_recoverable,
+        logger=logger,
+        backoff_log_level=logging.WARNING,
+        max_tries=7,  # try up to 7 times
+        factor=60,  # each try delayed to match 60x2^<nbtry> seconds (60, 120, 240,…)
+        max_value=3600,  # dont wait more than an hour
+    )(func)
+
+
+class AsyncFetcher:
+    """Keeps many page and API requests in flight on a single asyncio event loop
+
+    Only network I/O happens on the loop. Fetched pages are handed over
+    to an Executor so parsing and rewriting happen on its workers.
+    Requests are subject to the same rate limiter and 429-pause as the
+    synchronous ones."""
+
+    def __init__(self, concurrency: int = 100):
+        self.concurrency = concurrency
+        self.session = None
+
+    async def await_pause(self):
+        """non-blocking (for the loop) version of Global.await_pause()"""
+        while Global.paused_until:
+            try:
+                if Global.paused_until <= datetime.datetime.now():
+                    Global.paused_until = None
+                    return
+            except TypeError:
+                # should paused_until be set to None already
+                return
+            await asyncio.sleep(1)
+
+    async def get(
+        self, url: str, headers: Optional[Dict] = None
+    ) -> Tuple[aiohttp.ClientResponse, str]:
+        """(response, text) of a rate-limited GET request to url"""
+        await self.await_pause()
+
+        host = urllib.parse.urlparse(url).netloc
+        wait = Global.limiter.delay_for_request(host)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+        try:
+            with HTTP_DURATION.time(host=host):
+                async with self.session.get(url, headers=headers) as resp:
+                    body = await resp.read()
+                    text = body.decode(resp.get_encoding(), errors="replace")
+        except Exception:
+            HTTP_RESPONSES.inc(host=host, status="error")
+            raise
+        HTTP_RESPONSES.inc(host=host, status=resp.status)
+        Global.limiter.account(host, len(body))
+
+        if resp.status == 429:
+            Global.pause()
+        return resp, text
+
+    @retries
+    async def fetch(
+        self, path: str, failsafe: bool = False, **params
+    ) -> Tuple[str, List[str]]:
+        """(source text, actual_paths) of a path from source website
+
+        See utils.fetch()"""
+        url = get_url(path, **params)
+        entry = Global.http_cache.get(url)
+        if entry:
+            return entry.text, list(entry.paths)
+        entry = Global.http_cache.load(url)
+
+        resp, text = await self.get(url, headers=HttpCache.validators(entry))
+        if resp.status == 304 and entry:
+            Global.http_cache.revalidated(url, entry)
+            return entry.text, list(entry.paths)
+        if not failsafe:
+            resp.raise_for_status()
+
+        # requested a category page (?pg=xxx) but got redirected (losing param)
+        if params and resp.history:
+            return await self.fetch(
+                only_path_of(str(resp.url)), failsafe=failsafe, **params
+            )
+        paths = [
+            no_leading_slash(only_path_of(str(r.url)))
+            for r in list(resp.history) + [resp]
+        ]
+        if resp.status == 200:
+            Global.http_cache.store(url, entry_for(resp, text.encode("UTF-8"), paths))
+        return text, paths
+
+    @retries
+    async def fetch_api(self, params: Dict) -> Dict:
+        """decoded JSON response of an API call"""
+        resp, text = await self.get(
+            f"{to_url('/api.php')}?{urllib.parse.urlencode(params)}"
+        )
+        resp.raise_for_status()
+        data = json.loads(text)
+
+        error = data.get("error")
+        if error and error.get("code") == "maxlag":
+            await asyncio.sleep(int(resp.headers.get("Retry-After", 5)))
+            return await self.fetch_api(params)
+        if error:
+            raise ApiError(f"{error.get('code')}: {error.get('info')}")
+        return data
+
+    async def query(self, **params) -> AsyncIterator[Dict]:
+        """`query` parts of an API query's results, following continuations"""
+        params = {
+            "action": "query",
+            "format": "json",
+            "formatversion": 2,
+            "continue": "",
+            **params,
+        }
+        while True:
+            data = await self.fetch_api(params)
+            if "query" in data:
+                yield data["query"]
+            if "continue" not in data:
+                break
+            params.update(data["continue"])
+
+            if Global.conf.api_delay:
+                await asyncio.sleep(Global.conf.api_delay)
+
+    async def run_all(self, coro_func: Callable, items: Iterable):
+        """await coro_func(item) for all items, with up to concurrency in flight"""
+        items = iter(items)
+
+        async def worker():
+            # items is shared by all workers ; next() can't be interrupted
+            for item in items:
+                await coro_func(item)
+
+        async with aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency),
+            timeout=aiohttp.ClientTimeout(total=600),
+        ) as self.session:
+            tasks = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+            try:
+                await asyncio.gather(*tasks)
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+    def fetch_pages(self, paths: Iterable[str], callback: Callable, executor: Executor):
+        """fetch all paths, submitting callback(path, content, paths) to executor
+
+        content is None for pages that returned HTTP 404.
+        Stops fetching should executor die (a callback failed)"""
+
+        async def fetch_page(path: str):
+            if not executor.alive:
+                return
+
+            try:
+                content, paths = await self.fetch(path)
+            except aiohttp.ClientResponseError as exc:
+                if exc.status != 404:
+                    raise exc
+                content, paths = None, []
+
+            # submit blocks when executor's queue is full: off the loop
+            await asyncio.get_running_loop().run_in_executor(
+                None,
+                lambda: executor.submit(
+                    callback, raises=True, path=path, content=content, paths=paths
+                ),
+            )
+
+        try:
+            asyncio.run(self.run_all(fetch_page, paths))
+        except RuntimeError:
+            # executor died in between (a task failed)
+            if executor.alive:
+                raise
+
+    def query_all(self, queries: Iterable[Tuple[Any, Dict]], callback: Callable):
+        """run (key, params) API queries concurrently, calling callback(key, result)
+
+        callback is called from the event loop: it must be quick"""
+
+        async def run_query(query: Tuple[Any, Dict]):
+            key, params = query
+            async for result in self.query(**params):
+                callback(key, result)
+
+        asyncio.run(self.run_all(run_query, queries))
@@ -0,0 +1,704 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+""" lxml HTML backend: a faster stand-in for BeautifulSoup
+
+Implements the subset of bs4's API the scraper uses (find, select, decompose,
+replace_with, attrs, etc.) directly on lxml.html elements, with bs4 semantics.
+Serialization mimics bs4's minimal formatter (sorted attributes, `<br/>`
+void elements, raw script and style) so both backends produce identical pages.
+
+CSS selectors are translated to XPath. Only what the scraper uses is supported:
+type, `#id`, `.class`, `[attr]`, `[attr=value]`, `:empty`, `:not()`,
+descendant and child combinators and selector lists. Selector compiles them
+once for either backend.
+
+Partial parsing (parse_regions(), LxmlSoup.parse_regions()) only keeps the regions
+of article and category pages the scraper uses, for either backend.
+
+Known difference: libxml2 gives HTML4 boolean attributes without a value
+(`<input disabled>`) their name as value, so those are rendered
+`disabled="disabled"` where bs4 renders `disabled=""`."""
+
+import collections.abc
+import functools
+import re
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import bs4.builder
+import bs4.element
+import soupsieve
+from lxml import etree
+from lxml import html as lxml_html
+
+# bs4's notion of multi-valued (class, rel…) and void elements
+MULTI_VALUED_ATTRIBUTES = bs4.builder.HTMLTreeBuilder.DEFAULT_CDATA_LIST_ATTRIBUTES
+VOID_ELEMENTS = frozenset(bs4.builder.HTMLTreeBuilder.empty_element_tags)
+# elements which text is not escaped
+RAW_TEXT_ELEMENTS = ("script", "style")
+# bs4 collapses blank strings to a newline or a space, but in <pre/> and <textarea/>
+BLANK_STRINGS_XPATH = (
+    "//text()[not(normalize-space())][not(ancestor::pre or ancestor::textarea)]"
+)
+# partial parsing of pages only builds those elements (and their contents):
+# by name, in <head/>, or by id, in the innermost shell
+REGION_NAMES = ("title", "link")
+REGION_IDS = ("content_wrapper", "footer_crumbs", "large_pagination")
+# regions ancestors kept (empty) for their attributes, nested in that order
+REGION_SHELLS = ("html", "body", "#mw-mf-viewport")
+# regions and shells (but the root), nested ones included, in document order.
+# selecting @id attributes then their element is much faster than `//*[@id=…]`
+REGIONS_XPATH = " | ".join(
+    [f"//{key}" for key in REGION_NAMES + REGION_SHELLS[1:] if key[0] != "#"]
+    + [
+        "//@id[{}]/..".format(
+            " or ".join(
+                [f".='{id_}'" for id_ in REGION_IDS]
+                + [f".='{key[1:]}'" for key in REGION_SHELLS if key[0] == "#"]
+            )
+        )
+    ]
+)
+
+SELECTOR_TOKEN_RE = re.compile(
+    r"""
+    (?P<comma>\s*,\s*)
+    |(?P<child>\s*>\s*)
+    |(?P<close>\s*\))
+    |(?P<descendant>\s+)
+    |(?P<type>\*|[a-zA-Z][\w-]*)
+    |(?P<id>\#[\w-]+)
+    |(?P<class>\.[\w-]+)
+    |(?P<attr>\[\s*(?P<attr_name>[\w-]+)\s*
+        (?:=\s*(?:"(?P<dq_value>[^"]*)"|'(?P<sq_value>[^']*)'|(?P<value>[\w-]+))\s*)?
+    \])
+    |(?P<empty>:empty)
+    |(?P<not>:not\(\s*)
+    """,
+    re.VERBOSE,
+)
+
+_local = threading.local()
+
+
+@functools.lru_cache(maxsize=None)
+def multi_valued_for(tag: str) -> frozenset:
+    """names of multi-valued attributes for tag"""
+    return frozenset(
+        MULTI_VALUED_ATTRIBUTES["*"] + MULTI_VALUED_ATTRIBUTES.get(tag, [])
+    )
+
+
+def xpath_literal(value: str) -> str:
+    return f'"{value}"' if "'" in value else f"'{value}'"
+
+
+def parse_selector(selector: str, pos: int = 0, nested: bool = False):
+    """(XPath predicate matching selector on context node, end position)"""
+    alternatives = []
+    expr, conds, axis = None, [], None
+
+    def close_compound():
+        cond = " and ".join(conds) or "true()"
+        conds.clear()
+        return cond if expr is None else f"{cond} and {axis}::*[{expr}]"
+
+    while pos < len(selector):
+        match = SELECTOR_TOKEN_RE.match(selector, pos)
+        if not match:
+            raise ValueError(f"Unsupported selector: {selector}")
+        kind, token = match.lastgroup, match.group()
+        pos = match.end()
+
+        if kind == "type":
+            if token != "*":
+                conds.append(f"self::{token.lower()}")
+        elif kind == "id":
+            conds.append(f"@id={xpath_literal(token[1:])}")
+        elif kind == "class":
+            # plain contains() first: much cheaper, true for few elements
+            conds.append(
+                f"contains(@class, {xpath_literal(token[1:])}) and "
+                "contains(concat(' ', normalize-space(@class), ' '), "
+                f"{xpath_literal(f' {token[1:]} ')})"
+            )
+        elif kind == "attr":
+            value = match.group("dq_value", "sq_value", "value")
+            value = next((item for item in value if item is not None), None)
+            name = match.group("attr_name")
+            conds.append(
+                f"@{name}" if value is None else f"@{name}={xpath_literal(value)}"
+            )
+        elif kind == "empty":
+            conds.append("not(*) and not(text()[normalize-space()])")
+        elif kind == "not":
+            negated, pos = parse_selector(selector, pos, nested=True)
+            conds.append(f"not({negated})")
+        elif kind in ("descendant", "child"):
+            expr = close_compound()
+            axis = "ancestor" if kind == "descendant" else "parent"
+        elif kind == "comma":
+            alternatives.append(close_compound())
+            expr, axis = None, None
+        elif kind == "close":
+            if not nested:
+                raise ValueError(f"Unbalanced selector: {selector}")
+            break
+
+    alternatives.append(close_compound())
+    return " or ".join(f"({alt})" for alt in alternatives), pos
+
+
+@functools.lru_cache(maxsize=None)
+def xpath_for(selector: str, axis: str = "descendant") -> str:
+    """XPath expression selecting elements of axis matching CSS selector"""
+    predicate, _ = parse_selector(selector.strip())
+    return f"{axis}::*[{predicate}]"
+
+
+def compiled_xpath(expression: str) -> etree.XPath:
+    """compiled XPath of expression, cached for current thread"""
+    cache = getattr(_local, "xpaths", None)
+    if cache is None:
+        cache = _local.xpaths = {}
+    if expression not in cache:
+        cache[expression] = etree.XPath(expression)
+    return cache[expression]
+
+
+def collapse_blank_strings(root: etree.ElementBase):
+    for string in compiled_xpath(BLANK_STRINGS_XPATH)(root):
+        collapsed = "\n" if "\n" in string else " "
+        if string == collapsed:
+            continue
+        if string.is_text:
+            string.getparent().text = collapsed
+        else:
+            string.getparent().tail = collapsed
+
+
+def is_region(name: str, attrs: Dict) -> bool:
+    return name in REGION_NAMES or attrs.get("id") in REGION_IDS
+
+
+def shell_key(name: str, attrs: Dict) -> Optional[str]:
+    """which of REGION_SHELLS an element is, if any"""
+    for key in (name, f"#{attrs.get('id')}"):
+        if key in REGION_SHELLS:
+            return key
+    return None
+
+
+def parse_regions(text: str) -> bs4.BeautifulSoup:
+    """a bs4 soup of text's regions only, nested in their shells
+
+    Elements outside regions are not built (SoupStrainer) but for shells'
+    attributes, collected while parsing"""
+    shells = {}
+
+    def keep(name: str, attrs: Dict) -> bool:
+        if is_region(name, attrs):
+            return True
+        key = shell_key(name, attrs)
+        if key:
+            shells.setdefault(key, (name, attrs))
+        return False
+
+    soup = bs4.BeautifulSoup(text, "lxml", parse_only=bs4.SoupStrainer(keep))
+    regions = [node.extract() for node in list(soup.contents)]
+
+    html = soup.new_tag("html", attrs=shells.get("html", ("html", {}))[1])
+    head = soup.new_tag("head")
+    html.append(head)
+    parent = html
+    for key in REGION_SHELLS[1:]:
+        if key in shells:
+            name, attrs = shells[key]
+            parent.append(soup.new_tag(name, attrs=attrs))
+            parent = parent.contents[-1]
+    for region in regions:
+        if isinstance(region, bs4.element.Doctype):
+            soup.append(region)
+        elif isinstance(region, bs4.element.Tag):
+            (head if region.name in REGION_NAMES else parent).append(region)
+    soup.append(html)
+    return soup
+
+
+def matches_attrs(elem: "LxmlTag", attrs: Dict) -> bool:
+    """whether elem's attributes match bs4's find() attrs filter"""
+    for name, expected in attrs.items():
+        value = elem.attrib.get(name)
+        if expected is True or expected is False:
+            if (value is not None) != expected:
+                return False
+        elif value is None:
+            return False
+        elif name in multi_valued_for(elem.tag):
+            values = value.split()
+            if expected != " ".join(values) and expected not in values:
+                return False
+        elif value != expected:
+            return False
+    return True
+
+
+def escape(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def quoted(value: str) -> str:
+    """quoted attribute value, as bs4 does"""
+    if '"' in value:
+        if "'" in value:
+            return '"' + value.replace('"', "&quot;") + '"'
+        return "'" + value + "'"
+    return '"' + value + '"'
+
+
+def serialize(elem, out: List[str]):
+    """append HTML of elem (without its tail) to out"""
+    tag = elem.tag
+    if tag is etree.Comment:
+        out.append(f"<!--{elem.text or ''}-->")
+        return
+    if tag is etree.ProcessingInstruction:
+        out.append(f"<?{elem.target} {elem.text or ''}>")
+        return
+    if tag is etree.Entity:
+        out.append(elem.text)
+        return
+
+    out.append("<" + tag)
+    multi_valued = multi_valued_for(tag)
+    for name, value in sorted(elem.attrib.items()):
+        if name in multi_valued:
+            value = " ".join(value.split())
+        out.append(f" {name}={quoted(escape(value))}")
+
+    if tag in VOID_ELEMENTS and not elem.text and not len(elem):
+        out.append("/>")
+        return
+    out.append(">")
+    serialize_contents(elem, out)
+    out.append(f"</{tag}>")
+
+
+def serialize_contents(elem, out: List[str]):
+    """append HTML of elem's children to out"""
+    is_raw = elem.tag in RAW_TEXT_ELEMENTS
+    if elem.text:
+        out.append(elem.text if is_raw else escape(elem.text))
+    for child in elem:
+        serialize(child, out)
+        if child.tail:
+            out.append(child.tail if is_raw else escape(child.tail))
+
+
+class TextNode(str):
+    """a text node (text or tail of an element), as a bs4 NavigableString"""
+
+    def __new__(cls, value: str, owner: etree.ElementBase, attribute: str):
+        node = super().__new__(cls, value)
+        node.owner = owner
+        node.attribute = attribute
+        return node
+
+    def replace_with(self, value: str) -> "TextNode":
+        setattr(self.owner, self.attribute, value)
+        return self
+
+
+class Attributes(collections.abc.MutableMapping):
+    """bs4-like view of an element's attributes: multi-valued ones as lists"""
+
+    __slots__ = ("elem",)
+
+    def __init__(self, elem: "LxmlTag"):
+        self.elem = elem
+
+    def __getitem__(self, key: str) -> Union[str, List[str]]:
+        value = self.elem.attrib[key]
+        if key in multi_valued_for(self.elem.tag):
+            return value.split()
+        return value
+
+    def __setitem__(self, key: str, value: Union[str, List[str]]):
+        if isinstance(value, (list, tuple)):
+            value = " ".join(value)
+        self.elem.attrib[key] = str(value)
+
+    def __delitem__(self, key: str):
+        del self.elem.attrib[key]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.elem.attrib
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.elem.attrib)
+
+    def __len__(self) -> int:
+        return len(self.elem.attrib)
+
+
+class LxmlTag(lxml_html.HtmlElement):
+    """lxml.html element with the bs4 Tag API used by the scraper"""
+
+    @property
+    def name(self) -> str:
+        return self.tag
+
+    @property
+    def attrs(self) -> Attributes:
+        return Attributes(self)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.attrs[key]
+        return super().__getitem__(key)
+
+    def __setitem__(self, key, value):
+        if isinstance(key, str):
+            self.attrs[key] = value
+        else:
+            super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        if isinstance(key, str):
+            self.attrib.pop(key, None)
+        else:
+            super().__delitem__(key)
+
+    def __bool__(self) -> bool:
+        return True
+
+    def __str__(self) -> str:
+        return self.decode()
+
+    def get(self, key: str, default=None):
+        return self.attrs.get(key, default)
+
+    @property
+    def parent(self) -> Optional["LxmlTag"]:
+        return self.getparent()
+
+    @property
+    def parents(self) -> Iterator["LxmlTag"]:
+        return self.iterancestors()
+
+    @property
+    def contents(self) -> List:
+        """children, text nodes included"""
+        nodes = [TextNode(self.text, self, "text")] if self.text else []
+        for child in self:
+            nodes.append(child)
+            if child.tail:
+                nodes.append(TextNode(child.tail, child, "tail"))
+        return nodes
+
+    @property
+    def previous_sibling(self):
+        previous = self.getprevious()
+        if previous is not None:
+            if previous.tail:
+                return TextNode(previous.tail, previous, "tail")
+            return previous
+        parent = self.getparent()
+        if parent is not None and parent.text:
+            return TextNode(parent.text, parent, "text")
+        return None
+
+    @property
+    def decomposed(self) -> bool:
+        """whether this element was removed from its document"""
+        return self.getroottree().getroot() not in (self, *self.iterancestors())
+
+    @property
+    def string(self) -> Optional[str]:
+        """single string within this element, recursively"""
+        contents = self.contents
+        if len(contents) != 1:
+            return None
+        child = contents[0]
+        if isinstance(child, LxmlTag):
+            return child.string
+        return child if isinstance(child, str) else child.text
+
+    def select(self, selector: str) -> List["LxmlTag"]:
+        return compiled_xpath(xpath_for(selector))(self)
+
+    def find_all(
+        self,
+        name: Union[str, Callable, None] = None,
+        attrs: Optional[Dict] = None,
+        recursive: bool = True,
+        **kwargs,
+    ) -> List["LxmlTag"]:
+        return list(self.iter_matching(name, attrs, recursive, **kwargs))
+
+    def find(
+        self,
+        name: Union[str, Callable, None] = None,
+        attrs: Optional[Dict] = None,
+        recursive: bool = True,
+        **kwargs,
+    ) -> Optional["LxmlTag"]:
+        return next(self.iter_matching(name, attrs, recursive, **kwargs), None)
+
+    def iter_matching(
+        self,
+        name: Union[str, Callable, None],
+        attrs: Optional[Dict],
+        recursive: bool,
+        include_self: bool = False,
+        **kwargs,
+    ) -> Iterator["LxmlTag"]:
+        """elements matching bs4's find_all() filters, in document order"""
+        attrs = dict(attrs or {}, **kwargs)
+        tag = name if isinstance(name, str) else etree.Element
+        if include_self:
+            candidates = self.iter(tag)
+        elif recursive:
+            candidates = self.iterdescendants(tag)
+        else:
+            candidates = self.iterchildren(tag)
+        for elem in candidates:
+            if callable(name) and not name(elem):
+                continue
+            if attrs and not matches_attrs(elem, attrs):
+                continue
+            yield elem
+
+    def decompose(self):
+        if self.getparent() is not None:
+            self.drop_tree()
+
+    def unwrap(self):
+        self.drop_tag()
+
+    def append(self, value: Union[str, "LxmlTag"]):
+        """add a string or an element at the end of this element's contents"""
+        if not isinstance(value, str):
+            return super().append(value)
+        if len(self):
+            self[-1].tail = (self[-1].tail or "") + value
+        else:
+            self.text = (self.text or "") + value
+
+    def replace_with(self, value: Union[str, "LxmlTag", "LxmlSoup"]):
+        """replace this element with a string, an element or a soup's contents"""
+        if isinstance(value, LxmlSoup):
+            nodes = value.contents
+        else:
+            nodes = [value]
+
+        tail, self.tail = self.tail, None
+        # nodes are inserted after self, which is then dropped (keeping its tail)
+        anchor = self
+        for node in nodes:
+            if isinstance(node, str):
+                anchor.tail = (anchor.tail or "") + node
+                continue
+            node.tail = None
+            anchor.addnext(node)
+            anchor = node
+        if tail:
+            anchor.tail = (anchor.tail or "") + tail
+        self.drop_tree()
+        return self
+
+    def decode(self) -> str:
+        out = []
+        serialize(self, out)
+        return "".join(out)
+
+    def decode_contents(self) -> str:
+        out = []
+        serialize_contents(self, out)
+        return "".join(out)
+
+
+class LxmlSoup:
+    """a parsed document, standing for bs4.BeautifulSoup
+
+    With unwrap, its contents are those of <body/> (and <html/>)"""
+
+    def __init__(self, root: LxmlTag, unwrap: bool = False):
+        self.root = root
+        self.unwrapped = unwrap
+
+    @staticmethod
+    def parse_tree(text: str) -> LxmlTag:
+        parser = getattr(_local, "parser", None)
+        if parser is None:
+            parser = _local.parser = etree.HTMLParser(default_doctype=False)
+            parser.set_element_class_lookup(
+                etree.ElementDefaultClassLookup(element=LxmlTag)
+            )
+        # fed (as bs4 does) rather than parsed at once: same tree
+        # libxml2 refuses empty documents, bs4 returns an empty soup
+        parser.feed(text if text.strip() else "<html></html>")
+        return parser.close()
+
+    @classmethod
+    def parse(cls, text: str, unwrap: bool = False) -> "LxmlSoup":
+        root = cls.parse_tree(text)
+        collapse_blank_strings(root)
+        return cls(root, unwrap=unwrap)
+
+    @classmethod
+    def parse_regions(cls, text: str) -> "LxmlSoup":
+        """a soup of text's regions only, nested in their shells, as parse_regions()
+
+        libxml2 builds the whole tree (in C), then the root <html/> is emptied
+        and only gets the regions back"""
+        root = cls.parse_tree(text)
+        shells, regions = {}, []
+        # in document order: those in a region come right after it
+        for elem in compiled_xpath(REGIONS_XPATH)(root):
+            if regions and regions[-1] in elem.iterancestors():
+                continue
+            attrs = dict(elem.attrib)
+            if is_region(elem.tag, attrs):
+                regions.append(elem)
+            else:
+                shells.setdefault(shell_key(elem.tag, attrs), (elem.tag, attrs))
+
+        for child in list(root):
+            root.remove(child)
+        root.text = None
+        head = etree.SubElement(root, "head")
+        parent = root
+        for key in REGION_SHELLS[1:]:
+            if key in shells:
+                parent = etree.SubElement(parent, *shells[key])
+        for region in regions:
+            (head if region.tag in REGION_NAMES else parent).append(region)
+            region.tail = None
+        collapse_blank_strings(root)
+        return cls(root)
+
+    def new_tag(self, name: str, attrs: Optional[Dict] = None) -> LxmlTag:
+        """a detached element for this document, as BeautifulSoup.new_tag()"""
+        tag = self.root.makeelement(name)
+        for key, value in (attrs or {}).items():
+            tag[key] = value
+        return tag
+
+    @property
+    def contents(self) -> List:
+        if not self.unwrapped:
+            return [self.root]
+        nodes = []
+        for node in self.root.contents:
+            if isinstance(node, LxmlTag) and node.tag == "body":
+                nodes += node.contents
+            else:
+                nodes.append(node)
+        return nodes
+
+    def select(self, selector: str) -> List[LxmlTag]:
+        return compiled_xpath(xpath_for(selector, "descendant-or-self"))(self.root)
+
+    def find_all(
+        self,
+        name: Union[str, Callable, None] = None,
+        attrs: Optional[Dict] = None,
+        **kwargs,
+    ) -> List[LxmlTag]:
+        return list(
+            self.root.iter_matching(name, attrs, True, include_self=True, **kwargs)
+        )
+
+    def find(
+        self,
+        name: Union[str, Callable, None] = None,
+        attrs: Optional[Dict] = None,
+        **kwargs,
+    ) -> Optional[LxmlTag]:
+        return next(
+            self.root.iter_matching(name, attrs, True, include_self=True, **kwargs),
+            None,
+        )
+
+    def decode(self) -> str:
+        doctype = self.root.getroottree().docinfo.doctype
+        return ("" if self.unwrapped or not doctype else f"{doctype}\n") + "".join(
+            node.decode() if isinstance(node, LxmlTag) else escape(node)
+            for node in self.contents
+        )
+
+    def __str__(self) -> str:
+        return self.decode()
+
+
+def children_of(tag: Union[bs4.element.Tag, LxmlTag]) -> List:
+    """element children of tag (no text nor comments), for either backend"""
+    if isinstance(tag, LxmlTag):
+        return list(tag.iterchildren(etree.Element))
+    return [child for child in tag.contents if isinstance(child, bs4.element.Tag)]
+
+
+def walk(
+    tag: Union[bs4.element.Tag, LxmlTag],
+    names: Tuple[str, ...],
+    regions: Tuple[str, ...],
+    in_region: bool = False,
+) -> List[Tuple]:
+    """(element, in_region) of tag's descendants named names, in document order
+
+    Found in a single traversal (C-level with lxml) tracking whether each element
+    is inside an element named regions (or tag is, per in_region)"""
+    found = []
+    if isinstance(tag, LxmlTag):
+        depth = 1 if in_region else 0
+        for event, elem in etree.iterwalk(
+            tag, events=("start", "end"), tag=names + regions
+        ):
+            if elem is tag:
+                continue
+            if event == "start":
+                if elem.tag in names:
+                    found.append((elem, depth > 0))
+                if elem.tag in regions:
+                    depth += 1
+            elif elem.tag in regions:
+                depth -= 1
+        return found
+
+    def collect(elem: bs4.element.Tag, in_region: bool):
+        for child in elem.contents:
+            if not isinstance(child, bs4.element.Tag):
+                continue
+            if child.name in names:
+                found.append((child, in_region))
+            collect(child, in_region or child.name in regions)
+
+    collect(tag, in_region)
+    return found
+
+
+class Selector:
+    """a CSS selector compiled once, for either backend's elements
+
+    Use a selector list (`a, b`) to match several selectors in one traversal"""
+
+    def __init__(self, css: str):
+        self.css = css
+        self.pattern = soupsieve.compile(css)
+        # fails early if unsupported by the lxml backend
+        xpath_for(css)
+
+    def select(self, tag: Union[bs4.element.Tag, LxmlTag, LxmlSoup]) -> List:
+        """elements matching, in tag (in document order)"""
+        if isinstance(tag, (LxmlTag, LxmlSoup)):
+            return tag.select(self.css)
+        return self.pattern.select(tag)
+
+    def match(self, tag: Union[bs4.element.Tag, LxmlTag]) -> bool:
+        """whether tag itself matches"""
+        if isinstance(tag, LxmlTag):
+            return bool(compiled_xpath(xpath_for(self.css, "self"))(tag))
+        return self.pattern.match(tag)
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+import collections
+import hashlib
+import json
+import os
+import pathlib
+import threading
+import zlib
+from typing import Dict, Optional
+
+from .shared import logger
+
+
+class CacheEntry(
+    collections.namedtuple("CacheEntry", ("content", "paths", "etag", "last_modified"))
+):
+    """A cached response: content (bytes), traversed paths and validators"""
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("UTF-8")
+
+    @property
+    def size(self) -> int:
+        return len(self.content)
+
+
+class HttpCache:
+    """Cache of HTTP responses, for the current run and accross runs
+
+    - an in-run memo (LRU, bounded by memo_size bytes) returning responses
+      without any request.
+    - an optional on-disk store (compressed, bounded by max_size bytes with LRU
+      eviction) of responses with validators (ETag, Last-Modified) which
+      are revalidated using conditional requests."""
+
+    def __init__(
+        self,
+        directory: Optional[pathlib.Path] = None,
+        max_size: int = 0,
+        memo_size: int = 0,
+    ):
+        self.directory = directory
+        self.max_size = max_size
+        self.memo_size = memo_size
+
+        self.lock = threading.Lock()
+        self.memo = collections.OrderedDict()
+        self.memo_used = 0
+
+        # on-disk entries: fpath -> size
+        self.files: Dict[pathlib.Path, int] = {}
+        self.disk_used = 0
+        if self.directory:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            for fpath in self.directory.glob("*/*"):
+                if fpath.suffix == ".tmp":
+                    fpath.unlink()
+                    continue
+                self.files[fpath] = fpath.stat().st_size
+            self.disk_used = sum(self.files.values())
+            logger.debug(
+                f"HTTP cache at {self.directory}: {len(self.files)} entries, "
+                f"{self.disk_used} bytes"
+            )
+
+    @staticmethod
+    def validators(entry: Optional[CacheEntry]) -> Dict[str, str]:
+        """HTTP headers to revalidate an entry with a conditional request"""
+        headers = {}
+        if entry and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry and entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        """entry from in-run memo, if present"""
+        with self.lock:
+            entry = self.memo.get(url)
+            if entry is not None:
+                self.memo.move_to_end(url)
+            return entry
+
+    def memoize(self, url: str, entry: CacheEntry):
+        if entry.size > self.memo_size:
+            return
+        with self.lock:
+            if url in self.memo:
+                self.memo_used -= self.memo.pop(url).size
+            self.memo[url] = entry
+            self.memo_used += entry.size
+            while self.memo_used > self.memo_size:
+                _, evicted = self.memo.popitem(last=False)
+                self.memo_used -= evicted.size
+
+    def fpath_for(self, url: str) -> pathlib.Path:
+        digest = hashlib.sha1(url.encode("UTF-8")).hexdigest()  # nosec
+        return self.directory.joinpath(digest[:2], digest)
+
+    def load(self, url: str) -> Optional[CacheEntry]:
+        """entry from on-disk store, if present. Must be revalidated before use"""
+        if not self.directory:
+            return None
+
+        fpath = self.fpath_for(url)
+        try:
+            with open(fpath, "rb") as fh:
+                header = json.loads(fh.readline())
+                content = zlib.decompress(fh.read())
+        except FileNotFoundError:
+            return None
+        except Exception as exc:
+            logger.debug(f"Ignoring unreadable HTTP cache entry {fpath}: {exc}")
+            return None
+        return CacheEntry(content=content, **header)
+
+    def revalidated(self, url: str, entry: CacheEntry):
+        """record that a loaded entry is still valid (HTTP 304)"""
+        fpath = self.fpath_for(url)
+        try:
+            # mtime is used for LRU eviction
+            os.utime(fpath)
+        except OSError:
+            pass
+        self.memoize(url, entry)
+
+    def store(self, url: str, entry: CacheEntry):
+        """add/replace entry in memo and in on-disk store if it can be revalidated"""
+        self.memoize(url, entry)
+
+        if not self.directory or not (entry.etag or entry.last_modified):
+            return
+
+        fpath = self.fpath_for(url)
+        fpath.parent.mkdir(exist_ok=True)
+        tmp_fpath = fpath.with_suffix(".tmp")
+        header = {
+            "paths": entry.paths,
+            "etag": entry.etag,
+            "last_modified": entry.last_modified,
+        }
+        try:
+            with open(tmp_fpath, "wb") as fh:
+                fh.write(json.dumps(header).encode("UTF-8") + b"\n")
+                fh.write(zlib.compress(entry.content))
+            size = tmp_fpath.stat().st_size
+            os.replace(tmp_fpath, fpath)
+        except OSError as exc:
+            logger.warning(f"Unable to write HTTP cache entry {fpath}: {exc}")
+            return
+
+        with self.lock:
+            self.disk_used += size - self.files.get(fpath, 0)
+            self.files[fpath] = size
+            if self.disk_used > self.max_size:
+                self.evict()
+
+    def evict(self):
+        """remove least recently used files until store is 90% of max_size"""
+
+        def mtime(fpath):
+            try:
+                return fpath.stat().st_mtime
+            except OSError:
+                return 0
+
+        for fpath in sorted(self.files, key=mtime):
+            if self.disk_used <= self.max_size * 0.9:
+                break
+            self.disk_used -= self.files.pop(fpath)
+            fpath.unlink(missing_ok=True)
@@ -2,10 +2,15 @@
 # -*- coding: utf-8 -*-
 # vim: ai ts=4 sts=4 et sw=4 nu
 
+import hashlib
 import io
+import multiprocessing
 import pathlib
 import re
+import threading
 import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from typing import Optional
 
 import requests
@@ -15,54 +20,109 @@ from zimscraperlib.download import stream_file
 from zimscraperlib.image.optimization import optimize_webp
 
 from .constants import IMAGES_ENCODER_VERSION
+from .metrics import IMAGE_ENCODE
 from .shared import Global
-from .utils import get_digest, get_version_ident_for, normalize_ident, to_url
+from .utils import (
+    get_digest,
+    get_nb_cpus,
+    get_version_ident_for,
+    normalize_ident,
+    to_url,
+)
 
 logger = Global.logger
 
 
+def encode_webp(data: bytes) -> bytes:
+    """optimized WebP of bitmap image data. Runs in encoding processes"""
+    webp = io.BytesIO()
+    with Image.open(io.BytesIO(data)) as img:
+        img.save(webp, format="WEBP")
+    return optimize_webp(
+        src=webp,
+        lossless=False,
+        quality=60,
+        method=6,
+    ).getvalue()
+
+
 class Imager:
     def __init__(self):
         self.aborted = False
         # list of source URLs that we've processed and added to ZIM
         self.handled = set()
+        # defer() is called from all page workers
+        self.lock = threading.Lock()
         self.nb_requested = 0
         self.nb_done = 0
+        # sha256 of source and optimized contents -> in-ZIM path of first item
+        # same picture is often served under different URLs
+        self.contents = {}
+        self.nb_duplicates = 0
+        # CPU-bound decoding and encoding, off the GIL of downloading threads
+        self.encoder = self.get_encoder()
 
         Global.img_executor.start()
 
+    @staticmethod
+    def get_encoder() -> ProcessPoolExecutor:
+        """pool of encoding processes, one per CPU"""
+        # spawned as forking a multi-threaded process is unsafe
+        return ProcessPoolExecutor(
+            max_workers=get_nb_cpus(),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
     def abort(self):
         """request imager to cancel processing of futures"""
         self.aborted = True
+        self.encoder.shutdown(wait=False)
+
+    def shutdown(self):
+        """stop encoding processes, once all images are processed"""
+        self.encoder.shutdown()
 
     def get_image_data(self, url: str) -> io.BytesIO:
         """Bytes stream of an optimized version of source image
 
         Bitmap images are converted to WebP and optimized
         SVG images are kept as is"""
-        src, webp = io.BytesIO(), io.BytesIO()
+        return self.optimize(url, self.get_source_data(url))
+
+    def get_source_data(self, url: str) -> io.BytesIO:
+        """Bytes stream of source image"""
+        src = io.BytesIO()
 
         Global.await_pause()
         try:
             stream_file(url=url, byte_stream=src, session=Global.session)
         except requests.exceptions.HTTPError as exc:
             if getattr(exc.response, "status_code") == 429:
+                # image is not added: it would be empty
                 Global.pause()
-            else:
-                raise exc
+            raise exc
+        return src
 
+    def optimize(self, url: str, src: io.BytesIO) -> io.BytesIO:
+        """Bytes stream of an optimized version of source image stream"""
         if pathlib.Path(url).suffix == ".svg" or "/math/render/svg/" in url:
             return src
 
-        with Image.open(src) as img:
-            img.save(webp, format="WEBP")
-        del src
-        return optimize_webp(
-            src=webp,
-            lossless=False,
-            quality=60,
-            method=6,
-        )
+        with IMAGE_ENCODE.time():
+            # bytes are pickled once each way
+            data = src.getvalue()
+            del src
+            encoder = self.encoder
+            try:
+                return io.BytesIO(encoder.submit(encode_webp, data).result())
+            except BrokenProcessPool:
+                # a process died (ex: out of memory): all its futures fail.
+                # replace pool for the next images
+                with self.lock:
+                    if self.encoder is encoder and not self.aborted:
+                        logger.warning("Image encoding pool broken, restarting it")
+                        self.encoder = self.get_encoder()
+                raise
 
     def get_s3_key_for(self, url: str) -> str:
         """S3 key to use for that url"""
@@ -95,13 +155,17 @@ class Imager:
         digest = get_digest(url.geturl())
         path = self.get_path_for(url) if path is None else path
 
-        if digest in self.handled:
-            logger.debug(f"URL `{url.geturl()}` already processed.")
-            return path
+        with self.lock:
+            if digest in self.handled:
+                logger.debug(f"URL `{url.geturl()}` already processed.")
+                return path
+
+            # record that we are processing this one
+            self.handled.add(digest)
+            self.nb_requested += 1
 
-        # record that we are processing this one
-        self.handled.add(digest)
-        self.nb_requested += 1
+        if Global.checkpoint:
+            Global.checkpoint.record_request("image", url.geturl(), path)
 
         Global.img_executor.submit(
             self.process_image,
@@ -115,9 +179,54 @@ class Imager:
 
     def once_done(self):
         """default callback for single image processing"""
-        self.nb_done += 1
+        # called from writer (creator callback) and image threads (redirects)
+        with self.lock:
+            self.nb_done += 1
         logger.debug(f"Images {self.nb_done}/{self.nb_requested}")
 
+    def get_duplicate_of(self, *contents: bytes) -> Optional[str]:
+        """in-ZIM path of a previously added image with any of those contents"""
+        with self.lock:
+            # empty contents are not images, they don't identify any
+            for content in filter(None, contents):
+                target = self.contents.get(hashlib.sha256(content).digest())
+                if target:
+                    return target
+
+    def register(self, path: str, *contents: bytes) -> Optional[str]:
+        """register path as the item for contents unless it's a duplicate
+
+        Returns path of the original item if duplicate, None otherwise"""
+        digests = [hashlib.sha256(content).digest() for content in contents if content]
+        with self.lock:
+            for digest in digests:
+                if digest in self.contents:
+                    return self.contents[digest]
+            for digest in digests:
+                self.contents[digest] = path
+
+    def add_redirect(self, path: str, target: str):
+        """add path as a redirect to identical, already added image"""
+        logger.debug(f"Image {path} is a duplicate of {target}")
+        Global.writer.add_redirect(path=path, target_path=target)
+        with self.lock:
+            self.nb_duplicates += 1
+        self.once_done()
+
+    def add_image(self, path: str, data: bytes, mimetype: str, *sources: bytes):
+        """add optimized image data to ZIM at path, as redirect if a duplicate"""
+        target = self.register(path, data, *sources)
+        if target:
+            self.add_redirect(path, target)
+            return
+
+        Global.writer.add_item_for(
+            path=path,
+            content=data,
+            mimetype=mimetype,
+            callback=self.once_done,
+        )
+
     def process_image(self, url: str, path: str, mimetype: str) -> str:
         """download image from url or S3 and add to Zim at path. Upload if req."""
 
@@ -126,13 +235,16 @@ class Imager:
 
         # just download, optimize and add to ZIM if not using S3
         if not Global.conf.s3_url:
-            with Global.lock:
-                Global.creator.add_item_for(
-                    path=path,
-                    content=self.get_image_data(url.geturl()).getvalue(),
-                    mimetype=mimetype,
-                    callback=self.once_done,
-                )
+            src = self.get_source_data(url.geturl())
+            source = src.getvalue()
+            # don't spend time optimizing a picture we already have
+            target = self.get_duplicate_of(source)
+            if target:
+                self.add_redirect(path, target)
+                return path
+
+            data = self.optimize(url.geturl(), src).getvalue()
+            self.add_image(path, data, mimetype, source)
             return path
 
         # we are using S3 cache
@@ -158,30 +270,24 @@ class Imager:
             logger.exception(exc)
             download_failed = True
         else:
-            with Global.lock:
-                Global.creator.add_item_for(
-                    path=path,
-                    content=fileobj.getvalue(),
-                    mimetype=mimetype,
-                    callback=self.once_done,
-                )
+            self.add_image(path, fileobj.getvalue(), mimetype)
             return path
 
         # we're using S3 but don't have it or failed to download
         try:
-            fileobj = self.get_image_data(url.geturl())
+            src = self.get_source_data(url.geturl())
+            source = src.getvalue()
+            target = self.get_duplicate_of(source)
+            if target:
+                self.add_redirect(path, target)
+                return path
+            fileobj = self.optimize(url.geturl(), src)
         except Exception as exc:
             logger.error(f"Failed to download/convert/optim source  at {url.geturl()}")
             logger.exception(exc)
             return path
 
-        with Global.lock:
-            Global.creator.add_item_for(
-                path=path,
-                content=fileobj.getvalue(),
-                mimetype=mimetype,
-                callback=self.once_done,
-            )
+        self.add_image(path, fileobj.getvalue(), mimetype, source)
 
         # only upload it if we didn't have it in cache
         if not download_failed:
@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+import contextlib
+import http.server
+import math
+import os
+import pathlib
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+PREFIX = "wikihow2zim_"
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    120,
+    300,
+    math.inf,
+)
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"))
+        for name, value in labels.items()
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str):
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.lock = threading.Lock()
+        # sorted labels tuple -> value
+        self.values = {}
+
+    @staticmethod
+    def key_for(labels: Dict[str, str]) -> Tuple:
+        return tuple(sorted(labels.items()))
+
+    def samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        """(name, labels, value) of all samples"""
+        with self.lock:
+            values = list(self.values.items())
+        for key, value in values:
+            yield self.name, dict(key), value
+
+    def expose(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self.key_for(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self.function = None
+
+    def set(self, value: float, **labels):
+        with self.lock:
+            self.values[self.key_for(labels)] = value
+
+    def set_function(self, function: Callable[[], Iterable[Tuple[Dict, float]]]):
+        """compute (labels, value) samples on collection instead"""
+        self.function = function
+
+    def samples(self):
+        if self.function is None:
+            yield from super().samples()
+            return
+        for labels, value in self.function():
+            yield self.name, labels, value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(buckets)
+        if self.buckets[-1] != math.inf:
+            self.buckets += (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self.key_for(labels)
+        with self.lock:
+            if key not in self.values:
+                # per-bucket counts, sum
+                self.values[key] = [[0] * len(self.buckets), 0]
+            counts = self.values[key]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[0][index] += 1
+                    break
+            counts[1] += value
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """observe duration of the with block"""
+        started_on = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started_on, **labels)
+
+    def samples(self):
+        with self.lock:
+            values = [
+                (key, (list(counts), total))
+                for key, (counts, total) in self.values.items()
+            ]
+        for key, (counts, total) in values:
+            labels = dict(key)
+            cumulated = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulated += count
+                bucket_labels = {**labels, "le": format_value(bound)}
+                yield f"{self.name}_bucket", bucket_labels, cumulated
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulated
+
+
+class Registry:
+    """Minimal Prometheus-compatible metrics registry
+
+    Counters, gauges and histograms (with labels) exposed in Prometheus' text
+    format. Metrics are always collected ; that's a few dict updates"""
+
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self.register(Counter(name, documentation))
+
+    def gauge(self, name: str, documentation: str) -> Gauge:
+        return self.register(Gauge(name, documentation))
+
+    def histogram(self, name: str, documentation: str, **kwargs) -> Histogram:
+        return self.register(Histogram(name, documentation, **kwargs))
+
+    def expose(self) -> str:
+        """all metrics in Prometheus text format"""
+        lines = []
+        for metric in self.metrics:
+            lines += metric.expose()
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_DURATION = registry.histogram(
+    "http_request_duration_seconds", "Duration of HTTP requests, per host"
+)
+HTTP_RESPONSES = registry.counter(
+    "http_responses_total", "HTTP responses, per host and status code"
+)
+PAUSES = registry.counter("pauses_total", "Requests pauses following HTTP 429")
+EXECUTOR_QUEUE = registry.gauge("executor_queue_size", "Tasks in executor's queue")
+EXECUTOR_WORKERS = registry.gauge("executor_workers", "Workers of executor")
+EXECUTOR_BUSY = registry.gauge("executor_busy_workers", "Workers running a task")
+EXECUTOR_BUSY_TIME = registry.counter(
+    "executor_busy_seconds_total", "Time spent running tasks, all workers combined"
+)
+IMAGE_ENCODE = registry.histogram(
+    "image_encode_duration_seconds", "Duration of images conversion and optimization"
+)
+VIDEO_DOWNLOAD = registry.histogram(
+    "video_download_duration_seconds", "Duration of videos download"
+)
+VIDEO_ENCODE = registry.histogram(
+    "video_encode_duration_seconds", "Duration of videos re-encoding"
+)
+CREATOR_WAIT = registry.histogram(
+    "creator_wait_duration_seconds",
+    "Time spent waiting for room in the ZIM writer's queue",
+    buckets=(0.0001, 0.001, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, math.inf),
+)
+WRITER_QUEUE = registry.gauge("zim_writer_queue_size", "Calls in ZIM writer's queue")
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = registry.expose().encode("UTF-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class MetricsExporter:
+    """Exposes registry on an HTTP port and/or periodically writes it to a file"""
+
+    def __init__(
+        self,
+        port: Optional[int] = None,
+        textfile: Optional[pathlib.Path] = None,
+        interval: int = 15,
+        host: str = "127.0.0.1",
+    ):
+        self.port = port
+        self.host = host
+        self.textfile = textfile
+        self.interval = interval
+        self.server = None
+        self.stopped = threading.Event()
+        self.threads = []
+
+    def start(self):
+        if self.port:
+            self.server = http.server.ThreadingHTTPServer(
+                (self.host, self.port), MetricsHandler
+            )
+            self.threads.append(
+                threading.Thread(
+                    target=self.server.serve_forever, name="METRICS-HTTP", daemon=True
+                )
+            )
+        if self.textfile:
+            self.threads.append(
+                threading.Thread(target=self.run, name="METRICS-FILE", daemon=True)
+            )
+        for thread in self.threads:
+            thread.start()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.write_textfile()
+
+    def write_textfile(self):
+        """write metrics to textfile, atomically (write-then-rename)"""
+        tmp_fpath = self.textfile.with_name(f".{self.textfile.name}.tmp")
+        with open(tmp_fpath, "w") as fh:
+            fh.write(registry.expose())
+        os.replace(tmp_fpath, self.textfile)
+
+    def stop(self):
+        """stop exporting, after a last write of textfile"""
+        self.stopped.set()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+        for thread in self.threads:
+            thread.join()
+        if self.textfile:
+            self.write_textfile()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+import contextlib
+import cProfile
+import datetime
+import io
+import pathlib
+import pstats
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+from .shared import logger
+
+
+class PhaseTimer:
+    """Times the successive phases of a scrape, optionally profiling them
+
+    With a profile_dir, each phase is profiled (cProfile) and its stats dumped
+    to `<index>-<phase>.prof` with a text summary (`.txt`) next to it.
+    Profiled are the main thread and threads started during the phase
+    (page and API workers) but not the long-lived image and video workers."""
+
+    def __init__(self, profile_dir: Optional[pathlib.Path] = None):
+        self.profile_dir = profile_dir
+        if self.profile_dir:
+            self.profile_dir.mkdir(parents=True, exist_ok=True)
+        self.durations: Dict[str, float] = {}
+        self.current = None
+        self.started_on = None
+        # profilers of threads started during current phase
+        self.profilers = []
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """time (and profile) the with block as phase name"""
+        self.current, self.started_on = name, time.monotonic()
+        profiler = self.start_profiling() if self.profile_dir else None
+        try:
+            yield
+        finally:
+            if profiler:
+                self.stop_profiling(name, profiler)
+            self.durations[name] = (
+                self.durations.get(name, 0) + time.monotonic() - self.started_on
+            )
+            self.current = None
+            logger.debug(f"Phase {name} took {self.format(self.durations[name])}")
+
+    def start_profiling(self) -> cProfile.Profile:
+        self.profilers = []
+        threading.setprofile(self.profile_thread)
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def profile_thread(self, frame, event, arg):
+        """bootstrap profiler of a new thread (threading.setprofile hook)"""
+        profiler = cProfile.Profile()
+        with self.lock:
+            self.profilers.append(profiler)
+        sys.setprofile(None)
+        profiler.enable()
+
+    def stop_profiling(self, name: str, profiler: cProfile.Profile):
+        profiler.disable()
+        threading.setprofile(None)
+
+        stats = pstats.Stats(profiler)
+        with self.lock:
+            for thread_profiler in self.profilers:
+                stats.add(thread_profiler)
+            self.profilers = []
+
+        fpath = self.profile_dir.joinpath(f"{len(self.durations) + 1:02}-{name}.prof")
+        stats.dump_stats(fpath)
+        stats.stream = io.StringIO()
+        stats.sort_stats("cumulative").print_stats(100)
+        fpath.with_suffix(".txt").write_text(stats.stream.getvalue())
+        logger.debug(f"Profile of phase {name} dumped to {fpath}")
+
+    @staticmethod
+    def format(duration: float) -> str:
+        return str(datetime.timedelta(seconds=round(duration)))
+
+    def as_dict(self) -> Dict:
+        """phases durations (seconds) and current phase, for stats file"""
+        durations = {name: round(duration) for name, duration in self.durations.items()}
+        if self.current:
+            durations[self.current] = round(
+                durations.get(self.current, 0) + time.monotonic() - self.started_on
+            )
+        return {"current": self.current, "durations": durations}
+
+    def log_summary(self):
+        total = sum(self.durations.values()) or 1
+        logger.info(
+            "Phases timing:\n"
+            + "\n".join(
+                f"  {name}: {self.format(duration)} ({duration / total:.0%})"
+                for name, duration in self.durations.items()
+            )
+        )
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+import json
+import pathlib
+import posixpath
+import re
+import threading
+from typing import Callable, Dict, List, Optional
+
+from libzim.reader import Archive
+
+from .constants import REVISIONS_PATH
+from .shared import Global, logger
+
+# in-ZIM references found in rendered pages and stylesheets
+REFERENCE_RE = re.compile(
+    r"""(?:(?:src|href|poster)=["']|url\(\s*["']?)([^"'()#?\s]+)"""
+)
+
+
+class PreviousZim:
+    """A previous build of the ZIM, to reuse rendered pages of unchanged articles
+
+    Builds record the revision ID of their articles at REVISIONS_PATH.
+    Reused pages are copied along with the resources (images, videos,
+    stylesheets) they reference."""
+
+    def __init__(self, fpath: pathlib.Path):
+        self.archive = Archive(fpath)
+        self.revisions: Dict[str, int] = {}
+        if self.archive.has_entry_by_path(REVISIONS_PATH):
+            self.revisions = json.loads(
+                bytes(self.archive.get_entry_by_path(REVISIONS_PATH).get_item().content)
+            )
+        else:
+            logger.warning(f"{fpath.name} has no revisions record. Can't reuse pages")
+
+        # paths already copied (or being copied)
+        self.copied = set()
+        self.lock = threading.Lock()
+
+    def is_unchanged(self, article: str, revision: Optional[int]) -> bool:
+        """whether article is in previous ZIM at that revision"""
+        return (
+            revision is not None
+            and self.revisions.get(article) == revision
+            and self.archive.has_entry_by_path(article)
+        )
+
+    def claim(self, path: str) -> bool:
+        """record path as copied, returning whether it was not already"""
+        with self.lock:
+            if path in self.copied:
+                return False
+            self.copied.add(path)
+            return True
+
+    def copy(
+        self,
+        path: str,
+        is_front: bool = False,
+        relink: Optional[Callable[[str, bytes], bytes]] = None,
+    ) -> List[str]:
+        """add entry at path to ZIM, along with its dependencies
+
+        relink(path, content) updates links of a (front) HTML page to this ZIM
+
+        Returns list of paths added to ZIM"""
+        if not self.claim(path):
+            return []
+
+        entry = self.archive.get_entry_by_path(path)
+        if entry.is_redirect:
+            target = entry.get_redirect_entry()
+            added = self.copy(target.path, is_front=is_front, relink=relink)
+            Global.writer.add_redirect(path=path, target_path=target.path)
+            return added + [path]
+
+        item = entry.get_item()
+        content = bytes(item.content)
+        if relink and item.mimetype.startswith("text/html"):
+            content = relink(path, content)
+        Global.writer.add_item_for(
+            path=path,
+            title=item.title,
+            content=content,
+            mimetype=item.mimetype,
+            is_front=is_front,
+        )
+        added = [path]
+
+        if item.mimetype.startswith(("text/html", "text/css")):
+            for reference in self.get_references(path, content.decode("UTF-8")):
+                # other pages are handled on their own
+                if self.is_resource(reference):
+                    added += self.copy(reference)
+        return added
+
+    def is_resource(self, path: str) -> bool:
+        """whether path is a non-HTML entry of previous ZIM"""
+        if not self.archive.has_entry_by_path(path):
+            return False
+        entry = self.archive.get_entry_by_path(path)
+        while entry.is_redirect:
+            entry = entry.get_redirect_entry()
+        return not entry.get_item().mimetype.startswith("text/html")
+
+    @staticmethod
+    def get_references(path: str, content: str) -> List[str]:
+        """in-ZIM paths referenced from content of item at path"""
+        references = set()
+        for reference in REFERENCE_RE.findall(content):
+            # external or absolute URLs are not in-ZIM ones
+            if ":" in reference or reference.startswith("/"):
+                continue
+            reference = posixpath.normpath(
+                posixpath.join(posixpath.dirname(path), reference)
+            )
+            # outside of the ZIM's root (or the root itself)
+            if reference == "." or reference == ".." or reference.startswith("../"):
+                continue
+            references.add(reference)
+        return sorted(references)
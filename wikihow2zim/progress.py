@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+import json
+import os
+import pathlib
+import threading
+import time
+from typing import Callable, Dict
+
+from .shared import Global, logger
+
+
+class ProgressWriter(threading.Thread):
+    """Periodically writes progress JSON to fpath, atomically (write-then-rename)
+
+    get_progress() returns a dict with at least `done` and `total` keys.
+    Network figures and an ETA (at pace since baseline) are added to it.
+    Baseline is first write, or last reset_baseline() call."""
+
+    def __init__(
+        self, fpath: pathlib.Path, get_progress: Callable[[], Dict], interval: int = 10
+    ):
+        super().__init__(name="PROGRESS", daemon=True)
+        self.fpath = fpath
+        self.get_progress = get_progress
+        self.interval = interval
+        self.stopped = threading.Event()
+
+        self.started_on = time.monotonic()
+        # (time, done) pace is measured from. work of a resumed run doesn't count
+        self.baseline = None
+        # (time, nb_requests) of previous write, for current requests rate
+        self.previous = (self.started_on, Global.limiter.nb_requests)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.write()
+            except Exception as exc:
+                logger.warning(f"Unable to write progress to {self.fpath}: {exc}")
+
+    def reset_baseline(self):
+        """measure pace from now on, not counting time spent and work done so far"""
+        self.baseline = (time.monotonic(), self.get_progress()["done"])
+
+    def stop(self):
+        """stop writing, after a last update"""
+        self.stopped.set()
+        self.join()
+        self.write()
+
+    def write(self):
+        progress = self.get_progress()
+        now = time.monotonic()
+        elapsed = now - self.started_on
+
+        nb_requests = Global.limiter.nb_requests
+        previous_on, previous_requests = self.previous
+        self.previous = (now, nb_requests)
+        progress.update(
+            {
+                "requests": nb_requests,
+                "bytes": Global.limiter.nb_bytes,
+                "requests_per_second": round(
+                    (nb_requests - previous_requests) / max(now - previous_on, 1), 2
+                ),
+                "elapsed": round(elapsed),
+                "eta": self.get_eta(progress["done"], progress["total"], now),
+            }
+        )
+
+        tmp_fpath = self.fpath.with_name(f".{self.fpath.name}.tmp")
+        with open(tmp_fpath, "w") as fh:
+            json.dump(progress, fh, indent=2)
+        os.replace(tmp_fpath, self.fpath)
+
+    def get_eta(self, done: int, total: int, now: float):
+        """nb of seconds to complete, at pace since baseline. None if unknown"""
+        if self.baseline is None:
+            self.baseline = (now, done)
+        baseline_on, baseline_done = self.baseline
+        nb_done = done - baseline_done
+        if not nb_done or now <= baseline_on:
+            return None
+        return round((total - done) * (now - baseline_on) / nb_done)
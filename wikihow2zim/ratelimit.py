@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+import threading
+import time
+import urllib.parse
+from typing import Dict, Optional, Tuple
+
+import requests
+import requests.adapters
+from urllib3.util.retry import Retry
+
+from .metrics import HTTP_DURATION, HTTP_RESPONSES
+
+
+class TokenBucket:
+    """Thread-safe token bucket, refilled at `rate` tokens per second
+
+    Tokens are taken upfront and the bucket can go into debt: callers are
+    then told how long to wait for the debt to be repaid. This allows
+    accounting for amounts (bytes) only known after the fact."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        # allow bursts of up to a second worth of tokens by default
+        self.capacity = capacity if capacity else max(rate, 1)
+        self.tokens = self.capacity
+        self.updated_on = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, amount: float = 1) -> float:
+        """take amount tokens, returning nb of seconds to wait before using them"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated_on) * self.rate
+            )
+            self.updated_on = now
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0
+            return -self.tokens / self.rate
+
+
+class HostBudget:
+    """Requests and bytes budgets (per second) for a single host. 0 is unlimited
+
+    requests_burst is the requests bucket capacity. 0 is a second worth of them"""
+
+    def __init__(
+        self, requests_rate: float = 0, bytes_rate: float = 0, requests_burst: int = 0
+    ):
+        self.requests = (
+            TokenBucket(requests_rate, requests_burst) if requests_rate else None
+        )
+        self.bytes = TokenBucket(bytes_rate) if bytes_rate else None
+        self.nb_requests = 0
+        self.nb_bytes = 0
+
+
+class RateLimiter:
+    """Per-host rate limiting of outbound HTTP requests
+
+    Hosts without a specific budget get their own budget built from the default
+    one. Both requests and downloaded bytes are accounted (and throttled)"""
+
+    def __init__(self):
+        self.default = (0, 0)
+        self.budgets: Dict[str, HostBudget] = {}
+        self.lock = threading.Lock()
+
+    def configure(
+        self,
+        default: Tuple[float, float] = (0, 0),
+        per_host: Optional[Dict[str, Tuple[float, float, int]]] = None,
+    ):
+        """set budgets, default (requests_rate, bytes_rate) and per-host ones
+
+        per-host budgets are (requests_rate, bytes_rate, requests_burst)"""
+        with self.lock:
+            self.default = default
+            self.budgets.clear()
+            for host, budget in (per_host or {}).items():
+                self.budgets[host] = HostBudget(*budget)
+
+    def budget_for(self, host: str) -> HostBudget:
+        with self.lock:
+            if host not in self.budgets:
+                self.budgets[host] = HostBudget(*self.default)
+            return self.budgets[host]
+
+    def delay_for_request(self, host: str) -> float:
+        """nb of seconds to wait before sending a request to host (reserved)"""
+        budget = self.budget_for(host)
+        delays = [0]
+        if budget.requests is not None:
+            delays.append(budget.requests.reserve())
+        # bytes are accounted after download. we only wait for the debt to be repaid
+        if budget.bytes is not None:
+            delays.append(budget.bytes.reserve(0))
+        return max(delays)
+
+    def acquire(self, host: str):
+        """block current thread until a request to host can be sent"""
+        wait = self.delay_for_request(host)
+        if wait > 0:
+            time.sleep(wait)
+
+    def account(self, host: str, nb_bytes: int):
+        """record a completed request to host which downloaded nb_bytes
+
+        Bytes are taken from the budget without blocking: the debt (if any)
+        delays the next requests to that host"""
+        budget = self.budget_for(host)
+        with self.lock:
+            budget.nb_requests += 1
+            budget.nb_bytes += nb_bytes
+        if budget.bytes is not None and nb_bytes:
+            budget.bytes.reserve(nb_bytes)
+
+    @property
+    def nb_requests(self) -> int:
+        with self.lock:
+            return sum(budget.nb_requests for budget in self.budgets.values())
+
+    @property
+    def nb_bytes(self) -> int:
+        with self.lock:
+            return sum(budget.nb_bytes for budget in self.budgets.values())
+
+
+class RateLimitedAdapter(requests.adapters.HTTPAdapter):
+    """requests' HTTPAdapter awaiting its RateLimiter before each request"""
+
+    def __init__(self, limiter: RateLimiter, **kwargs):
+        self.limiter = limiter
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        host = urllib.parse.urlparse(request.url).netloc
+        self.limiter.acquire(host)
+        try:
+            with HTTP_DURATION.time(host=host):
+                resp = super().send(request, **kwargs)
+        except Exception:
+            HTTP_RESPONSES.inc(host=host, status="error")
+            raise
+        HTTP_RESPONSES.inc(host=host, status=resp.status_code)
+        if kwargs.get("stream"):
+            # don't consume streamed body ; rely on announced size
+            try:
+                nb_bytes = int(resp.headers.get("Content-Length", 0))
+            except ValueError:
+                nb_bytes = 0
+        else:
+            nb_bytes = len(resp.content)
+        self.limiter.account(host, nb_bytes)
+        return resp
+
+
+def get_session(limiter: RateLimiter, max_retries: int) -> requests.Session:
+    """Session to hold cookies and connection pool, with rate-limited requests"""
+    session = requests.Session()
+    # same retry policy as scraperlib's session
+    retries = Retry(
+        total=max_retries,
+        connect=max_retries,
+        read=max_retries,
+        status=2,
+        redirect=False,
+        backoff_factor=30,
+        status_forcelist=[413, 429, 500, 502, 503, 504],
+    )
+    adapter = RateLimitedAdapter(
+        limiter=limiter,
+        max_retries=retries,
+        # shared by page, image and video workers
+        pool_maxsize=64,
+    )
+    # mounting on `http` prefix would be shadowed by Session's default adapters
+    for prefix in ("http://", "https://"):
+        session.mount(prefix, adapter)
+    return session
@@ -2,11 +2,13 @@
 # vim: ai ts=4 sts=4 et sw=4 nu
 
 import collections
+import functools
 import re
 import urllib.parse
 
 import bs4
 
+from .htmlbackend import Selector, children_of, walk
 from .shared import GlobalMixin, logger
 from .utils import normalize_ident, rebuild_uri
 
@@ -20,10 +22,40 @@ seldef = collections.namedtuple(
     ],
 )
 
+# links to articles and categories, removed (or their parent) if not in the ZIM
+EXCLUSION_SELDEFS = (
+    # related articles in article page
+    seldef(Selector("#relatedwikihows > a.related-wh[href]"), False, False, False),
+    # related articles in sidebar
+    seldef(Selector(".related_articles > a.related-wh[href]"), False, False, False),
+    # link to article in category page
+    seldef(Selector("#cat_all div.responsive_thumb > a[href]"), False, True, False),
+    # sub category link in category page
+    seldef(Selector("#subcats > ul a[href]"), True, True, False),
+    # categorlyListing thumbnail link (english)
+    seldef(Selector(".cat_container a[href]"), True, True, False),
+    # categorylisting link to category
+    seldef(Selector("#catlist a[href]"), True, True, False),
+    # EN Top categories categorylisting link to category
+    seldef(Selector("#catlist_container .catlist a[href]"), True, True, False),
+    # top breadcrumb in article page
+    seldef(Selector(".breadcrumbs a[href]"), True, True, False),
+    # top breadcrumb in article page
+    seldef(Selector("#footer_crumbs .breadcrumbs a[href]"), True, True, False),
+    # list of categories article is in  - in About section of article page
+    seldef(Selector(".sp_box.sp_fullbox a[href]"), True, True, True),
+    seldef(Selector(".cat_grid .responsive_thumb a[href]"), True, True, True),
+)
+EXCLUDABLE_LINKS = Selector(", ".join(sdef.selector.css for sdef in EXCLUSION_SELDEFS))
+RELATED_SECTIONS = Selector(".section.relatedwikihows, .sidebox.related_articles")
+
 
 def remove_link_for_exclusion(link, selector_def):
     """remove a link or its parent based on selector_def"""
-    if selector_def.clear_parent_previous_sibling:
+    if (
+        selector_def.clear_parent_previous_sibling
+        and link.parent.previous_sibling is not None
+    ):
         link.parent.previous_sibling.replace_with("")
 
     if selector_def.target_is_parent:
@@ -32,6 +64,15 @@ def remove_link_for_exclusion(link, selector_def):
         link.decompose()
 
 
+@functools.lru_cache(maxsize=None)
+def exclusion_res_for(to_root: str, category_prefix: str):
+    """(article_re, category_re) matching in-ZIM links from to_root"""
+    return (
+        re.compile(r"^" + to_root + r"(?P<path>.+)"),
+        re.compile(r"^" + to_root + category_prefix + r":(?P<path>.+)"),
+    )
+
+
 def is_in_code(elem):
     """whether this node is inside a <code /> one
 
@@ -62,71 +103,77 @@ class Rewriter(GlobalMixin):
         # sets of articles and categories that should not be included
         # filled by --exclude option
 
-    def rewrite(self, content: str, to_root: str = "", unwrap: bool = False):
-        if not content:
-            return ""
+    def rewrite(self, content: bs4.element.Tag, to_root: str = "") -> str:
+        """HTML of content's children, rewritten in place for the ZIM
 
-        try:
-            soup = bs4.BeautifulSoup(content, "lxml")
-        except Exception as exc:
-            logger.error(f"Unable to init soup for {content}: {exc}")
-            return content
-        if not soup:
+        content is modified: read anything needed from it (or its soup) first"""
+        if not content:
             return ""
 
-        for attr in ("body", "html"):
-            getattr(soup, attr).unwrap()
-
-        self.rewrite_links(soup, to_root)
-        self.rewrite_links_for_excludes(soup, to_root)
-        self.remove_empty_sections(soup, to_root)
-
-        self.rewrite_pictures(soup, to_root)
+        # links, pictures and images found in a single walk, tracking <code/>.
+        # images are deferred once exclusions removed some (with their links)
+        images = []
+        for elem, in_code in walk(
+            content,
+            names=("a", "img", "picture"),
+            regions=("code", "pre"),
+            in_region=content.name in ("code", "pre") or is_in_code(content),
+        ):
+            if elem.name == "a":
+                self.rewrite_link(elem, to_root, in_code)
+            elif elem.name == "picture":
+                self.rewrite_picture(elem)
+            else:
+                images.append((elem, in_code))
+        self.rewrite_links_for_excludes(content, to_root)
+        self.remove_empty_sections(content, to_root)
 
-        self.rewrite_images(soup, to_root)
+        for img, in_code in images:
+            if not img.decomposed:
+                self.rewrite_image(img, to_root, in_code)
 
-        return str(soup)
+        return content.decode_contents()
 
-    def rewrite_links(self, soup, to_root):
-        # rewrite links targets
-        for link in soup.find_all("a", href=True):
+    def rewrite_link(self, link, to_root: str, in_code: bool):
+        if link.get("href") is None:
+            return
 
-            # don't bother empty href=""
-            if not link.get("href", "").strip():
-                # remove link to ""
-                del link["href"]
-                continue
+        # don't bother empty href=""
+        if not link["href"].strip():
+            # remove link to ""
+            del link["href"]
+            return
 
-            # Ignore reference links on the page
-            if link["href"].startswith("#"):
-                continue
+        # Ignore reference links on the page
+        if link["href"].startswith("#"):
+            return
 
-            # skip links inside <code /> nodes
-            if is_in_code(link):
-                continue
+        # skip links inside <code /> nodes
+        if in_code:
+            return
 
-            link["href"] = link["href"].strip()
+        link["href"] = link["href"].strip()
 
-            is_relative = link["href"][0] in ("/", ".") or not link["href"].startswith(
-                "http"
-            )
+        is_relative = link["href"][0] in ("/", ".") or not link["href"].startswith(
+            "http"
+        )
 
-            if not is_relative:
-                match = self.domain_re.match(link["href"])
-                if match:
-                    is_relative = True
-                    # make the link relative and remove / so it's Zim compat
-                    link["href"] = match.groupdict().get("path")[1:]
+        if not is_relative:
+            match = self.domain_re.match(link["href"])
+            if match:
+                is_relative = True
+                # make the link relative and remove / so it's Zim compat
+                link["href"] = match.groupdict().get("path")[1:]
 
-            # rewrite relative links to match our in-zim URIs
-            if is_relative:
-                # might be a relative link for which we don't offer an offline
-                # version. ex: /help/*
-                if not self.rewrite_relative_link(link, to_root):
-                    continue
+        # rewrite relative links to match our in-zim URIs
+        if is_relative:
+            # might be a relative link for which we don't offer an offline
+            # version. ex: /help/*
+            if not self.rewrite_relative_link(link, to_root):
+                return
 
-            # link is not relative, apply rules
-            self.rewrite_external_link(link)
+        # link is not relative, apply rules
+        self.rewrite_external_link(link)
 
     def rewrite_external_link(self, link):
         link["class"] = " ".join(link.get("class", []) + ["external-link"])
@@ -164,103 +211,83 @@ class Rewriter(GlobalMixin):
         if self.conf.full_mode:
             return
 
-        article_re = re.compile(r"^" + to_root + r"(?P<path>.+)")
-        category_re = re.compile(
-            r"^" + to_root + self.metadata["category_prefix"] + r":(?P<path>.+)"
+        article_re, category_re = exclusion_res_for(
+            to_root, self.metadata["category_prefix"]
         )
 
-        selectors = [
-            # related articles in article page
-            seldef("#relatedwikihows > a.related-wh[href]", False, False, False),
-            # related articles in sidebar
-            seldef(".related_articles > a.related-wh[href]", False, False, False),
-            # link to article in category page
-            seldef("#cat_all div.responsive_thumb > a[href]", False, True, False),
-            # sub category link in category page
-            seldef("#subcats > ul a[href]", True, True, False),
-            # categorlyListing thumbnail link (english)
-            seldef(".cat_container a[href]", True, True, False),
-            # categorylisting link to category
-            seldef("#catlist a[href]", True, True, False),
-            # EN Top categories categorylisting link to category
-            seldef("#catlist_container .catlist a[href]", True, True, False),
-            # top breadcrumb in article page
-            seldef(".breadcrumbs a[href]", True, True, False),
-            # top breadcrumb in article page
-            seldef("#footer_crumbs .breadcrumbs a[href]", True, True, False),
-            # list of categories article is in  - in About section of article page
-            seldef(".sp_box.sp_fullbox a[href]", True, True, True),
-            seldef(".cat_grid .responsive_thumb a[href]", True, True, True),
-        ]
-
-        for sdef in selectors:
-            for link in soup.select(sdef.selector):
-                try:
-                    href = normalize_ident(link.attrs["href"])
-                except TypeError:
-                    logger.debug(f"Invalid link during rewrite: {link}")
+        # all selectors matched at once, links then handled by those matching them
+        for link in EXCLUDABLE_LINKS.select(soup):
+            # removed with a previous link's parent
+            if link.decomposed:
+                continue
+            try:
+                href = normalize_ident(link.attrs["href"])
+            except TypeError:
+                logger.debug(f"Invalid link during rewrite: {link}")
+                continue
+            for sdef in EXCLUSION_SELDEFS:
+                if not sdef.selector.match(link):
                     continue
                 if sdef.for_category:
                     match = category_re.match(href)
                     match_path = match.groupdict().get("path") if match else None
                     if match_path and match_path not in self.expected_categories:
                         remove_link_for_exclusion(link, sdef)
+                        break
                 else:
                     match = article_re.match(href)
                     match_path = match.groupdict().get("path") if match else None
                     if match_path and match_path not in self.expected_articles:
                         remove_link_for_exclusion(link, sdef)
+                        break
 
     def remove_empty_sections(self, soup, to_root):
         """remove sections left empty by links removal; if any"""
         removed_relateds = False
-        for section_sel in (".section.relatedwikihows", ".sidebox.related_articles"):
-            for section in soup.select(section_sel):
-                if not section.select("a"):
-                    removed_relateds = True
-                    section.decompose()
+        for section in RELATED_SECTIONS.select(soup):
+            if not section.find("a"):
+                removed_relateds = True
+                section.decompose()
 
         if removed_relateds:
             _ = [item.decompose() for item in soup.select("#rwh_toc")]
 
-    def rewrite_images(self, soup, to_root):
-        for img in soup.find_all("img"):
-            if img.attrs.get("onload"):
-                del img.attrs["onload"]
+    def rewrite_image(self, img, to_root: str, in_code: bool):
+        if img.attrs.get("onload"):
+            del img.attrs["onload"]
 
-            if not img.get("src") and not img.get("data-src"):
-                continue
+        if not img.get("src") and not img.get("data-src"):
+            return
 
-            if img.get("data-src") and not img.get("src"):
-                img["src"] = img["data-src"]
-                del img["data-src"]
-                try:
-                    del img["data-src-nowebp"]
-                except KeyError:
-                    pass
+        if img.get("data-src") and not img.get("src"):
+            img["src"] = img["data-src"]
+            del img["data-src"]
+            try:
+                del img["data-src-nowebp"]
+            except KeyError:
+                pass
 
-            # skip links inside <code /> nodes
-            if is_in_code(img):
-                continue
+        # skip links inside <code /> nodes
+        if in_code:
+            return
 
-            # will introduce Webp Polyfill later
-            # img["onerror"] = "onImageLoadingError(this);"
-            path = self.imager.defer(img["src"])
-            if path is None:
-                del img["src"]
-            else:
-                img["src"] = f"{to_root}{path}"
+        # will introduce Webp Polyfill later
+        # img["onerror"] = "onImageLoadingError(this);"
+        path = self.imager.defer(img["src"])
+        if path is None:
+            del img["src"]
+        else:
+            img["src"] = f"{to_root}{path}"
 
-    def rewrite_pictures(self, soup, to_root):
+    def rewrite_picture(self, picture):
         """remove all elements (source mostly) inside picture except img
 
         pictures are used where there are webp version and the img is used as
         fallback."""
-        for picture in soup.find_all("picture"):
-            # there's no fallback img, we can't remove sources
-            if not picture.find("img"):
-                continue
+        # there's no fallback img, we can't remove sources
+        if not picture.find("img"):
+            return
 
-            for child in picture.contents:
-                if isinstance(child, bs4.element.Tag) and child.name != "img":
-                    child.decompose()
+        for child in children_of(picture):
+            if child.name != "img":
+                child.decompose()
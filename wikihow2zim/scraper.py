@@ -1,11 +1,16 @@
 # -*- coding: utf-8 -*-
 
+import collections
 import datetime
+import hashlib
+import json
 import pathlib
 import random
 import re
 import shutil
+import threading
 import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
 
 import bs4
 import requests
@@ -16,15 +21,33 @@ from zimscraperlib.image.transformation import resize_image
 from zimscraperlib.inputs import handle_user_provided_file
 from zimscraperlib.zim.items import URLItem
 
-from .constants import DEFAULT_HOMEPAGE, ROOT_DIR, Conf
+from .constants import (
+    API_TIMESTAMP_FORMAT,
+    DEFAULT_HOMEPAGE,
+    REVISIONS_PATH,
+    ROOT_DIR,
+    SNAPSHOT_MAX_AGE,
+    SNAPSHOT_VERSION,
+    Conf,
+)
+from .htmlbackend import Selector
+from .metrics import MetricsExporter
+from .phases import PhaseTimer
+from .previous import PreviousZim
+from .progress import ProgressWriter
 from .shared import Global, GlobalMixin, logger
+from .shell import PageShell
+from .snapshot import DiscoverySnapshot
 from .utils import (
     cat_ident_for,
+    fetch_bytes,
     fix_pagination_links,
     get_categorylisting_url,
     get_digest,
     get_footer_crumbs_from,
     get_footer_links_from,
+    get_page_soup,
+    get_page_soup_of,
     get_soup,
     get_soup_of,
     is_in_review,
@@ -38,6 +61,61 @@ from .utils import (
 )
 
 
+def compile_blacklist(*passes: Iterable[str]) -> Tuple[Selector, ...]:
+    """a Selector per pass, matching any of its selectors in a single traversal"""
+    return tuple(Selector(", ".join(selectors)) for selectors in passes)
+
+
+def remove_blacklisted(content, blacklist: Tuple[Selector, ...]):
+    """remove elements matching blacklist from content, pass after pass"""
+    for selector in blacklist:
+        for elem in selector.select(content):
+            elem.decompose()
+
+
+# elements removed from pages' content. `:empty` ones are matched last,
+# once what they contained is removed
+CATEGORY_BLACKLIST = compile_blacklist(
+    (
+        "script",
+        "noscript > img",
+        "#cat_wca",
+        ".cat-promo",
+    ),
+    ("noscript:empty",),
+)
+
+ARTICLE_BLACKLIST = compile_blacklist(
+    (
+        "script",
+        ".pdf_link",
+        "#side_follow",
+        "#sidebar_share",
+        "#other_languages",
+        "#article_rating_mobile",
+        "#end_options",
+        ".section.tips",
+        ".section.bss_share_container",
+        ".wh_ad_inner, .wh_ad_active, [data-service=adsense], .wh_ad_spacing",
+        "noscript > img",
+        # User success stories
+        "#userreviews_mobile",
+        # Q&A block
+        "#qa >:not(#qa_answered_questions_container)",
+        # Expert Q&A
+        ".qa_heading sticking",
+        "#qa_answered_questions_container #qa_aq_search_container, "
+        "#qa_answered_questions_container #qa_add_curated_question",
+        ".qa_answer_footer",
+        ".qa_no_answered",
+        "#qa_see_more_answered",
+        "#userreview_recipe_cta",
+        "#aboutthisarticle > div.page_stats.section_text",
+    ),
+    ("noscript:empty",),
+)
+
+
 class DomIntegrityError(Exception):
     pass
 
@@ -49,6 +127,7 @@ class wikihow2zim(GlobalMixin):
         for option in Global.conf.required:
             if getattr(Global.conf, option) is None:
                 raise ValueError(f"Missing parameter `{option}`")
+        Global.setup_http()
 
         # jinja2 environment setup
         self.env = Environment(
@@ -58,16 +137,45 @@ class wikihow2zim(GlobalMixin):
 
         # jinja context that we'll pass to all templates
         self.env_context = {"conf": Global.conf}
+        # article.html and category.html pre-rendered, once env_context is set
+        self.page_shells: Dict[str, PageShell] = {}
         # used to prevent twice processing the resources of CSS
         # that we are going to download as they link to each other
         # Source HTML references a dynamic CSS that is built using a varietyof features
         # so it's very common different CSS urls references the same resources (imgs)
         self.resources_digests = set()
+        # CSS are requested from all page workers
+        self.resources_lock = threading.Lock()
+        # URLs of CSS resources that could not be added. Not retried
+        self.failed_resources = set()
         # List of URLs which returned HTTP 404.
         # There are legit scenarios for 404 on wikiHow: login pages
         # we need to track them for later use
         self.missing_articles = set()
         self.missing_categories = set()
+        # expected lists are built by API workers
+        self.discovery_lock = threading.Lock()
+        # discovered tree: category -> parent categories ("" for root ones)
+        # and article -> categories. Persisted with --discovery-snapshot
+        self.category_parents = {}
+        self.article_categories = {}
+        # article -> last revision ID, to reuse unchanged ones with --previous-zim
+        self.article_revisions = {}
+        # article -> MediaWiki title, to query revisions (paths are ambiguous:
+        # spaces and dashes are both dashes)
+        self.article_titles = {}
+        self.nb_reused = 0
+        # work completed before a crash, with --resume
+        self.completed_articles = set()
+        self.completed_categories = set()
+        # work completed during this run, per kind
+        self.nb_done = collections.Counter()
+        self.progress_lock = threading.Lock()
+        self.phases = PhaseTimer(
+            profile_dir=self.conf.output_dir.joinpath("profile")
+            if self.conf.profile
+            else None
+        )
 
     @property
     def build_dir(self):
@@ -177,53 +285,50 @@ class wikihow2zim(GlobalMixin):
         for size in (96, 48):
             resize_image(illus_fpath, width=size, height=size, method="thumbnail")
             with open(illus_fpath, "rb") as fh:
-                with self.lock:
-                    self.creator.add_illustration(size, fh.read())
+                self.writer.add_illustration(size, fh.read())
 
         # download and add actual favicon (ICO file)
         favicon_fpath = self.build_dir / "favicon.ico"
         handle_user_provided_file(source=self.metadata["favicon"], dest=favicon_fpath)
-        with self.lock:
-            self.creator.add_item_for("favicon.ico", fpath=favicon_fpath)
+        self.writer.add_item_for("favicon.ico", fpath=favicon_fpath)
 
         # download apple-touch-icon
-        with self.lock:
-            self.creator.add_item(
-                URLItem(url=self.metadata["icon"], path="apple-touch-icon.png")
-            )
+        self.writer.add_item(
+            URLItem(url=self.metadata["icon"], path="apple-touch-icon.png")
+        )
 
     def get_from_cache(self, url: str) -> bytes:
-        """retrieve from local cache if present, otherwise download it first
-
-        Only useful for devel/debug because there are many resources linked
-        to assets and source website is quite slow"""
-        fpath = self.build_dir.joinpath(f"cache_{get_digest(url)}")
-        if fpath.exists():
-            with open(fpath, "rb") as fh:
-                return fh.read()
+        """retrieve from HTTP cache if present (and valid), otherwise download it
 
-        with open(fpath, "wb") as fh:
-            content = self.session.get(url).content
-            fh.write(content)
-            return content
+        There are many resources linked to assets and source website is quite slow"""
+        return fetch_bytes(url)
 
     def add_css(self, url: str, inline: bool = False) -> str:
         """Download and add a CSS URL/text, including all its dependencies
 
         All url() resources from the passed CSS URL/string will be fetched
-        and added to ZIM as well. url() will be rewritten in the CSS source
-        before adding to Zim"""
+        and added to ZIM as well, concurrently on the CSS executor.
+        url() will be rewritten in the CSS source before adding to Zim"""
 
         if not inline:
             url = to_url(url)
 
         # skip if we already added it. Can be referenced from multiple pages
         digest = get_digest(url)
-        if digest in self.resources_digests:
-            return
+        with self.resources_lock:
+            if digest in self.resources_digests:
+                return
+            # claim it so concurrent workers don't process it as well
+            self.resources_digests.add(digest)
 
         # fetch and transform source CSS
-        source = url if inline else self.get_from_cache(url).decode("UTF-8")
+        try:
+            source = url if inline else self.get_from_cache(url).decode("UTF-8")
+        except Exception as exc:
+            # release claim so it can be retried from another page
+            with self.resources_lock:
+                self.resources_digests.discard(digest)
+            raise exc
         content, resources = parse_css(source)
 
         # fetch and add to Zim all its resources
@@ -231,44 +336,62 @@ class wikihow2zim(GlobalMixin):
             rsc_url = to_url(rsc_url)
             rsc_digest = get_digest(rsc_url)
 
-            # skip resource if already handled
-            if rsc_digest in self.resources_digests:
+            # stylesheets have resources of their own. add_css() claims them
+            if rsc_path.endswith(".css"):
+                with self.resources_lock:
+                    if rsc_url in self.failed_resources:
+                        continue
+                Global.css_executor.submit(self.add_imported_css, url=rsc_url)
                 continue
 
-            try:
-                with self.lock:
-                    # specifically don't specify mimetype here so that scraperlib
-                    # determines it from content. We may encounter PNG and SVG
-                    self.creator.add_item_for(
-                        path=rsc_path,
-                        content=self.get_from_cache(rsc_url),
-                    )
-            except Exception:
-                # many are just not working at all
-                logger.debug(f"Failed (OK) to add resource from {rsc_url}")
-            else:
+            # skip resource if already handled (or failed)
+            with self.resources_lock:
+                if rsc_digest in self.resources_digests:
+                    continue
                 self.resources_digests.add(rsc_digest)
-                logger.debug(f"> {rsc_path}")
 
-        path = f"assets/{digest}.css"
-        with self.lock:
-            self.creator.add_item_for(
-                path=path,
-                content=content,
-                mimetype="text/css",
+            Global.css_executor.submit(
+                self.add_css_resource, url=rsc_url, path=rsc_path
             )
+
+        path = f"assets/{digest}.css"
+        self.writer.add_item_for(
+            path=path,
+            content=content,
+            mimetype="text/css",
+        )
         logger.debug(f"> {path}")
-        self.resources_digests.add(digest)
         return digest
 
+    def add_css_resource(self, url: str, path: str):
+        """download and add a resource of a CSS file, recording failures"""
+        try:
+            content = self.get_from_cache(url)
+            # specifically don't specify mimetype here so that scraperlib
+            # determines it from content. We may encounter PNG and SVG
+            self.writer.add_item_for(path=path, content=content)
+        except Exception:
+            # many are just not working at all
+            logger.debug(f"Failed (OK) to add resource from {url}")
+            with self.resources_lock:
+                self.failed_resources.add(url)
+        else:
+            logger.debug(f"> {path}")
+
+    def add_imported_css(self, url: str):
+        """add a stylesheet imported by another one, recording failures"""
+        try:
+            self.add_css(url)
+        except Exception:
+            logger.debug(f"Failed (OK) to add stylesheet from {url}")
+            with self.resources_lock:
+                self.failed_resources.add(url)
+
     def add_assets(self):
         """download and add site-wide assets, identified in metadata step"""
         logger.info("Adding assets")
 
-        with self.lock:
-            self.creator.add_item(
-                URLItem(path="assets/logo", url=self.metadata["logo"])
-            )
+        self.writer.add_item(URLItem(path="assets/logo", url=self.metadata["logo"]))
 
         # handle the external and inline CSS found in homepage
         self.metadata["inline_digest"] = self.add_css(
@@ -292,8 +415,7 @@ class wikihow2zim(GlobalMixin):
             path = str(fpath.relative_to(ROOT_DIR))
 
             logger.debug(f"> {path}")
-            with self.lock:
-                self.creator.add_item_for(path=path, fpath=fpath)
+            self.writer.add_item_for(path=path, fpath=fpath)
 
     def build_categories_list(self):
         """Parses Sitemap online to get a list of root-level categories"""
@@ -309,74 +431,430 @@ class wikihow2zim(GlobalMixin):
         return re.sub(r"^" + self.metadata["category_prefix"] + r":", "", title)
 
     def build_expected_categories(self):
-        """Retrieves list of all categories using the API. Filters based on flags"""
-        logger.info("Building list of expected categories")
+        """Retrieves list of all categories using the API. Filters based on flags
 
+        Category tree is walked breadth-first by the API workers, each
+        discovered subcategory being queued (once) for its own subcategories"""
+        logger.info(
+            "Building list of expected categories "
+            f"using {self.conf.nb_api_threads} API worker(s)"
+        )
+
+        Global.api_executor.start()
         for category in self.conf.categories:
             if category in self.exclusion_categories:
                 continue
 
-            self.expected_categories.add(no_trailing_slash(category))
+            # cross-cat is common: might have been discovered from another one
+            if not self.add_expected_category(no_trailing_slash(category)):
+                continue
 
             if category.endswith("/"):
                 continue
 
-            # keep track of queried cats as cross-cat is common (will be returned)
-            query_list = {no_trailing_slash(category)}  # start with initial request
-
-            while query_list:
-                item = query_list.pop()
-                for query in self.api_site.query(
-                    list="categorymembers",
-                    cmtitle=f"{self.metadata['category_prefix']}:{item}",
-                    cmtype="subcat",
-                ):
-                    for cat_member in query.get("categorymembers"):
-                        # only interested in (sub)categories
-                        if cat_member.get("ns") != 14:
-                            continue
-                        category_title = self.cleaned_category_title(
-                            cat_member.get("title")
-                        )
-                        if category_title in self.expected_categories:
-                            continue
-                        logger.debug(f"subcat: {category_title}")
-                        if category_title not in self.exclusion_categories:
-                            query_list.add(category_title)
-                            self.expected_categories.add(category_title)
-
-                    if self.conf.api_delay:
-                        time.sleep(self.conf.api_delay)
+            Global.api_executor.submit(
+                self.discover_subcategories,
+                category=no_trailing_slash(category),
+                raises=True,
+            )
+
+        self.await_api_executor(
+            lambda: f"> {len(self.expected_categories)} categories found, "
+            f"{Global.api_executor.qsize()} pending queries"
+        )
 
         logger.info(f"Nb of Expected categories: {len(self.expected_categories)}")
         logger.debug(f"List of Expected categories: {self.expected_categories}")
 
-    def build_expected_articles(self):
+    def await_api_executor(self, progress: Callable):
+        """await completion of API tasks, logging progress() every 30s
+
+        First exception in any task stops the executor and is raised here"""
+        while not Global.api_executor.await_tasks(timeout=30):
+            logger.info(progress())
+        Global.api_executor.shutdown()
+        if Global.api_executor.exception:
+            raise Global.api_executor.exception
+
+    def add_expected_category(self, category: str, parent: str = "") -> bool:
+        """record category (in parent) as expected, returning whether it was not"""
+        with self.discovery_lock:
+            self.category_parents.setdefault(category, set()).add(parent)
+            if category in self.expected_categories:
+                return False
+            self.expected_categories.add(category)
+            return True
+
+    def discover_subcategories(self, category: str):
+        """record subcategories of category, queuing their own discovery"""
+        for query in self.api_site.query(
+            list="categorymembers",
+            cmtitle=f"{self.metadata['category_prefix']}:{category}",
+            cmtype="subcat",
+            cmlimit="max",
+        ):
+            for cat_member in query.get("categorymembers"):
+                # only interested in (sub)categories
+                if cat_member.get("ns") != 14:
+                    continue
+                category_title = self.cleaned_category_title(cat_member.get("title"))
+                if category_title in self.exclusion_categories:
+                    continue
+                if not self.add_expected_category(category_title, parent=category):
+                    continue
+                logger.debug(f"subcat: {category_title}")
+                Global.api_executor.submit(
+                    self.discover_subcategories, category=category_title, raises=True
+                )
+
+            if self.conf.api_delay:
+                time.sleep(self.conf.api_delay)
+
+    def category_articles_query(self, category: str, gcmtype: str = "page") -> Dict:
+        """API query params listing articles in a category"""
+        return {
+            "generator": "categorymembers",
+            "gcmtitle": f"{self.metadata['category_prefix']}:{category}",
+            "gcmtype": gcmtype,
+            "gcmlimit": "max",
+            "prop": "info",
+            "inprop": "url",
+        }
+
+    def add_category_articles(self, category: str, query: Dict):
+        """record articles from a category_articles_query() result as expected"""
+        for cat_member in query["pages"]:
+            # only interested in actual articles
+            if cat_member.get("ns") != 0:
+                continue
+            title = to_path(normalize_ident(cat_member.get("fullurl")))
+            if title in self.exclusion_articles:
+                continue
+            logger.debug(f"-> article: {title}")
+            self.expected_articles.add(title)
+            self.article_categories.setdefault(title, set()).add(category)
+            self.article_revisions[title] = cat_member.get("lastrevid")
+            self.article_titles[title] = cat_member.get("title")
+
+    def build_expected_articles(self, categories: Optional[Iterable[str]] = None):
+        """Retrieves list of articles in categories (defaults to expected ones)"""
         logger.info("Building list of expected articles")
-        for category in self.expected_categories:
-            logger.debug(f"Category: {category}")
+        if categories is None:
+            categories = self.expected_categories
+
+        if self.conf.engine == "async":
+            Global.fetcher.query_all(
+                (
+                    (category, self.category_articles_query(category))
+                    for category in categories
+                ),
+                callback=self.add_category_articles,
+            )
+        else:
+            Global.api_executor.start()
+            for category in categories:
+                Global.api_executor.submit(
+                    self.list_category_articles, category=category, raises=True
+                )
+            self.await_api_executor(
+                lambda: f"> {len(self.expected_articles)} articles found, "
+                f"{Global.api_executor.qsize()} pending categories"
+            )
+
+        logger.info(f"Nb of expected articles: {len(self.expected_articles)}")
+
+    def list_category_articles(self, category: str):
+        logger.debug(f"Category: {category}")
+        for query in self.api_site.query(**self.category_articles_query(category)):
+            with self.discovery_lock:
+                self.add_category_articles(category, query)
+
+            if self.conf.api_delay:
+                time.sleep(self.conf.api_delay)
+
+    def build_expected_lists(self):
+        """expected categories and articles from inclusion list, discovery or
+        checkpoint (when resuming)"""
+        self.build_filters_lists()
+        discovery = Global.checkpoint.discovery() if Global.checkpoint else None
+        if discovery:
+            self.restore_discovery(discovery)
+            return
+
+        if self.inclusion_list:
+            for title in self.inclusion_list:
+                if title.startswith("Category:"):
+                    self.expected_categories.add(self.cleaned_category_title(title))
+                else:
+                    self.expected_articles.add(title)
+            logger.info(
+                f"Nb expected articles: {len(self.expected_articles)}"
+                f"\nExpected categories {self.expected_categories}"
+            )
+        else:
+            if not self.conf.categories:
+                self.build_categories_list()
+
+            self.discover()
+
+        if Global.checkpoint:
+            Global.checkpoint.save_discovery(
+                {
+                    "categories": sorted(self.expected_categories),
+                    "articles": sorted(self.expected_articles),
+                    "revisions": self.article_revisions,
+                    "titles": self.article_titles,
+                }
+            )
+
+    def discovery_signature(self) -> str:
+        """digest of the inputs discovery depends on"""
+        return hashlib.sha256(
+            json.dumps(
+                [
+                    SNAPSHOT_VERSION,
+                    self.conf.lang_code,
+                    sorted(self.conf.categories),
+                    sorted(self.exclusion_categories),
+                    sorted(self.exclusion_articles),
+                ]
+            ).encode("UTF-8")
+        ).hexdigest()
+
+    def discover(self):
+        """Build expected categories and articles lists
+
+        Using --discovery-snapshot, lists are built from the snapshot (if recent
+        enough and made with same inputs) updated with changes since then."""
+        snapshot = (
+            DiscoverySnapshot(self.conf.discovery_snapshot)
+            if self.conf.discovery_snapshot
+            else None
+        )
+        started_on = datetime.datetime.utcnow()
+        signature = self.discovery_signature()
+
+        since = snapshot.timestamp_for(signature) if snapshot else None
+        if since and started_on - datetime.datetime.strptime(
+            since, API_TIMESTAMP_FORMAT
+        ) > datetime.timedelta(days=SNAPSHOT_MAX_AGE):
+            logger.info(f"Discovery snapshot from {since} is too old. Ignoring")
+            since = None
+
+        if since:
+            category_parents, article_categories, article_titles = snapshot.read()
+            self.category_parents.update(category_parents)
+            self.article_categories.update(article_categories)
+            self.article_titles.update(article_titles)
+            self.refresh_discovery(since)
+        else:
+            self.build_expected_categories()
+            self.build_expected_articles()
+
+        if snapshot:
+            snapshot.save(
+                signature=signature,
+                timestamp=started_on.strftime(API_TIMESTAMP_FORMAT),
+                category_parents=self.category_parents,
+                article_categories=self.article_categories,
+                article_titles=self.article_titles,
+            )
+            snapshot.close()
+
+    def refresh_discovery(self, since: str):
+        """Update snapshot-loaded discovery with changes since timestamp
+
+        - categories whose members changed (`categorize` recent changes) are
+          listed again and reconciled: new subcategories are fully discovered,
+          orphaned ones removed with their articles.
+        - deleted or moved articles (logevents) are removed; moved and restored
+          ones are re-attached to their expected categories."""
+        logger.info(f"Refreshing discovery snapshot with changes since {since}")
+
+        # compare categories on their URL form: roots are URL identifiers
+        names = {
+            category.replace(" ", "-"): category for category in self.category_parents
+        }
+
+        touched, removed, moved = set(), set(), set()
+        for query in self.api_site.query(
+            list="recentchanges",
+            rcstart=since,
+            rcdir="newer",
+            rcnamespace=14,
+            rctype="categorize|new",
+            rcprop="title",
+            rclimit="max",
+        ):
+            for change in query.get("recentchanges"):
+                name = self.cleaned_category_title(change.get("title"))
+                if name.replace(" ", "-") in names:
+                    touched.add(names[name.replace(" ", "-")])
+
+        for query in self.api_site.query(
+            list="logevents",
+            lestart=since,
+            ledir="newer",
+            lenamespace=0,
+            leprop="title|type|details",
+            lelimit="max",
+        ):
+            for event in query.get("logevents"):
+                path = event.get("title", "").replace(" ", "-")
+                if event.get("type") == "move":
+                    removed.add(path)
+                    moved.add(event.get("params", {}).get("target_title"))
+                elif event.get("type") == "delete" and event.get("action") == "delete":
+                    removed.add(path)
+                elif event.get("type") == "delete" and event.get("action") == "restore":
+                    moved.add(event.get("title"))
+
+        logger.info(
+            f"> {len(touched)} changed categories, {len(removed)} removed "
+            f"and {len(moved)} moved or restored articles"
+        )
+
+        for article in removed:
+            self.article_categories.pop(article, None)
+
+        # moved (target) and restored articles: find their expected categories
+        moved = sorted(filter(bool, moved))
+        while moved:
+            titles, moved = moved[:50], moved[50:]
             for query in self.api_site.query(
-                generator="categorymembers",
-                gcmtitle=f"{self.metadata['category_prefix']}:{category}",
-                gcmtype="page",
-                prop="info",
+                titles="|".join(titles),
+                prop="categories|info",
                 inprop="url",
+                cllimit="max",
             ):
-                for cat_member in query["pages"]:
-                    # only interested in actual articles
-                    if cat_member.get("ns") != 0:
+                for page in query.get("pages"):
+                    if page.get("ns") != 0 or page.get("missing"):
                         continue
-                    title = to_path(normalize_ident(cat_member.get("fullurl")))
-                    if title in self.exclusion_articles:
+                    article = to_path(normalize_ident(page.get("fullurl")))
+                    if article in self.exclusion_articles:
                         continue
-                    logger.debug(f"-> article: {title}")
-                    self.expected_articles.add(title)
-
+                    self.article_titles[article] = page.get("title")
+                    self.article_revisions[article] = page.get("lastrevid")
+                    for category in page.get("categories", []):
+                        name = self.cleaned_category_title(category.get("title"))
+                        if name.replace(" ", "-") in names:
+                            self.article_categories.setdefault(article, set()).add(
+                                names[name.replace(" ", "-")]
+                            )
+
+        # list changed categories again (subcats and articles)
+        listings = {}
+
+        def list_members(category: str):
+            articles, subcats = set(), set()
+            for query in self.api_site.query(
+                **self.category_articles_query(category, gcmtype="page|subcat")
+            ):
+                for member in query.get("pages", []):
+                    if member.get("ns") == 0:
+                        article = to_path(normalize_ident(member.get("fullurl")))
+                        articles.add(article)
+                        with self.discovery_lock:
+                            self.article_titles[article] = member.get("title")
+                            self.article_revisions[article] = member.get("lastrevid")
+                    elif member.get("ns") == 14:
+                        subcats.add(self.cleaned_category_title(member.get("title")))
                 if self.conf.api_delay:
                     time.sleep(self.conf.api_delay)
+            with self.discovery_lock:
+                listings[category] = (articles, subcats)
+
+        if touched:
+            Global.api_executor.start()
+            for category in touched:
+                Global.api_executor.submit(list_members, category=category, raises=True)
+            self.await_api_executor(
+                lambda: f"> {len(listings)}/{len(touched)} changed categories listed"
+            )
 
+        # snapshot categories are known: only walk those reconciliation adds
+        known = set(self.category_parents)
+        self.reconcile_discovery(listings)
+
+        # fully discover new categories (and their subcategories)
+        new = set(self.category_parents) - known
+        self.expected_categories.clear()
+        self.expected_categories.update(self.category_parents)
+        if new:
+            Global.api_executor.start()
+            for category in new:
+                Global.api_executor.submit(
+                    self.discover_subcategories, category=category, raises=True
+                )
+            self.await_api_executor(
+                lambda: f"> {len(self.expected_categories)} categories found, "
+                f"{Global.api_executor.qsize()} pending queries"
+            )
+        new = self.expected_categories - known
+        if new:
+            self.build_expected_articles(categories=new)
+
+        self.expected_categories.clear()
+        self.expected_categories.update(self.category_parents)
+        self.expected_articles.clear()
+        self.expected_articles.update(self.article_categories)
+
+        logger.info(
+            f"Nb of Expected categories: {len(self.expected_categories)} "
+            f"({len(new)} new)"
+        )
         logger.info(f"Nb of expected articles: {len(self.expected_articles)}")
 
+    def reconcile_discovery(self, listings: Dict[str, Tuple[Set[str], Set[str]]]):
+        """update mappings with fresh (articles, subcats) listings of categories"""
+        members, children = {}, {}
+        for article, categories in self.article_categories.items():
+            for category in categories:
+                members.setdefault(category, set()).add(article)
+        for category, parents in self.category_parents.items():
+            for parent in parents:
+                children.setdefault(parent, set()).add(category)
+
+        def unlink_article(article: str, category: str):
+            categories = self.article_categories.get(article, set())
+            categories.discard(category)
+            if not categories:
+                self.article_categories.pop(article, None)
+
+        def unlink_category(category: str, parent: str):
+            parents = self.category_parents.get(category, set())
+            parents.discard(parent)
+            if parents:
+                return
+            # orphaned category: removed along with its content
+            self.category_parents.pop(category, None)
+            for article in members.get(category, set()):
+                unlink_article(article, category)
+            for child in children.get(category, set()):
+                unlink_category(child, category)
+
+        non_recursive = {
+            no_trailing_slash(category)
+            for category in self.conf.categories
+            if category.endswith("/")
+        }
+        for category, (articles, subcats) in listings.items():
+            if category not in self.category_parents:
+                # removed in the meantime
+                continue
+
+            for article in members.get(category, set()) - articles:
+                unlink_article(article, category)
+            for article in articles - self.exclusion_articles:
+                self.article_categories.setdefault(article, set()).add(category)
+
+            if category in non_recursive:
+                continue
+            for child in children.get(category, set()) - subcats:
+                unlink_category(child, category)
+            for subcat in subcats - self.exclusion_categories:
+                self.category_parents.setdefault(subcat, set()).add(category)
+
     def build_filters_lists(self):
         """Using provided path/URL from --exclude and --only, build (in|ex)clusion list
 
@@ -426,23 +904,22 @@ class wikihow2zim(GlobalMixin):
         if self.conf.single_category:
             logger.info(f"Using {self.conf.single_category} as homepage")
 
-            with self.lock:
-                self.creator.add_redirect(
-                    path=self.metadata["homepage_name"],
+            self.writer.add_redirect(
+                path=self.metadata["homepage_name"],
+                target_path=f'{self.metadata["category_prefix"]}:'
+                f"{self.conf.single_category}",
+            )
+
+            if self.metadata["homepage_name"] != DEFAULT_HOMEPAGE:
+                self.writer.add_redirect(
+                    path=DEFAULT_HOMEPAGE,
                     target_path=f'{self.metadata["category_prefix"]}:'
                     f"{self.conf.single_category}",
                 )
-
-                if self.metadata["homepage_name"] != DEFAULT_HOMEPAGE:
-                    self.creator.add_redirect(
-                        path=DEFAULT_HOMEPAGE,
-                        target_path=f'{self.metadata["category_prefix"]}:'
-                        f"{self.conf.single_category}",
-                    )
-                self.creator.add_redirect(
-                    path=self.metadata["url_special_category"],
-                    target_path=DEFAULT_HOMEPAGE,
-                )
+            self.writer.add_redirect(
+                path=self.metadata["url_special_category"],
+                target_path=DEFAULT_HOMEPAGE,
+            )
             return
         logger.info("Building homepage")
 
@@ -462,7 +939,7 @@ class wikihow2zim(GlobalMixin):
         page = self.env.get_template("home.html").render(
             to_root="./",
             body_classes=" ".join(soup.find("body").attrs.get("class", [])),
-            content=self.rewriter.rewrite(content.decode_contents(), to_root="./"),
+            content=self.rewriter.rewrite(content, to_root="./"),
             page_linked_styles=linked_styles,
             viewport_classes=" ".join(
                 soup.find(attrs={"id": "mw-mf-viewport"}).attrs.get("class", [])
@@ -472,22 +949,21 @@ class wikihow2zim(GlobalMixin):
             **self.env_context,
         )
 
-        with self.lock:
-            self.creator.add_item_for(
-                path=self.metadata["homepage_name"],
-                title=self.conf.title,
-                content=page,
-                mimetype="text/html",
-                is_front=True,
-            )
-            self.creator.add_redirect(
-                path=self.metadata["url_special_category"], target_path=DEFAULT_HOMEPAGE
-            )
+        self.writer.add_item_for(
+            path=self.metadata["homepage_name"],
+            title=self.conf.title,
+            content=page,
+            mimetype="text/html",
+            is_front=True,
+        )
+        self.writer.add_redirect(
+            path=self.metadata["url_special_category"], target_path=DEFAULT_HOMEPAGE
+        )
 
-            if DEFAULT_HOMEPAGE != self.metadata["homepage_name"]:
-                self.creator.add_redirect(
-                    path=DEFAULT_HOMEPAGE, target_path=self.metadata["homepage_name"]
-                )
+        if DEFAULT_HOMEPAGE != self.metadata["homepage_name"]:
+            self.writer.add_redirect(
+                path=DEFAULT_HOMEPAGE, target_path=self.metadata["homepage_name"]
+            )
 
     def scrape_footer_articles(self):
         """Scrape and create all pages found in footer links"""
@@ -496,33 +972,202 @@ class wikihow2zim(GlobalMixin):
             # to create wikiHow Main-Page (already added a redirect in homepage)
             if link.path and link.path != "Main-Page":
                 self.scrape_article(link.path, remove_all_links=True)
-            if self.conf.delay:
-                time.sleep(self.conf.delay)
+
+    def await_executor(self):
+        """await completion of pages executor, raising first exception of its tasks"""
+        self.executor.shutdown()
+        if self.executor.exception:
+            raise self.executor.exception
+
+    def run_on_executor(self, task: Callable, tasks_kwargs: Iterable[Dict]):
+        """run task(**kwargs) for each kwargs on the pages executor, awaiting all
+
+        First exception in any task stops the executor and is raised here"""
+        self.executor.start()
+        for kwargs in tasks_kwargs:
+            if not self.executor.alive:
+                break
+            try:
+                self.executor.submit(task, raises=True, **kwargs)
+            except RuntimeError:
+                # executor died in between (a task failed)
+                break
+        self.await_executor()
+
+    def fetch_revisions(self, articles: Iterable[str]):
+        """record last revision ID of articles, queried by batches of titles
+
+        Only articles which title is known from discovery can be queried"""
+        logger.info("Querying revisions of articles")
+        titles = sorted(
+            (self.article_titles[article], article)
+            for article in articles
+            if article in self.article_titles
+        )
+        Global.api_executor.start()
+        while titles:
+            batch, titles = titles[:50], titles[50:]
+            Global.api_executor.submit(
+                self.list_revisions, articles=dict(batch), raises=True
+            )
+        self.await_api_executor(
+            lambda: f"> {Global.api_executor.qsize()} pending revisions queries"
+        )
+
+    def list_revisions(self, articles: Dict[str, str]):
+        """record last revision ID of articles, from a {title: article} batch"""
+        for query in self.api_site.query(
+            titles="|".join(articles),
+            prop="info",
+        ):
+            for page in query.get("pages"):
+                if page.get("ns") != 0 or "missing" in page:
+                    continue
+                article = articles.get(page.get("title"))
+                if article is None:
+                    continue
+                with self.discovery_lock:
+                    self.article_revisions[article] = page.get("lastrevid")
+
+            if self.conf.api_delay:
+                time.sleep(self.conf.api_delay)
+
+    def reuse_unchanged_articles(self, articles: Set[str]) -> Set[str]:
+        """copy unchanged articles from previous ZIM, returning the ones to scrape"""
+        previous = PreviousZim(self.conf.previous_zim)
+
+        unknown = articles - set(self.article_revisions)
+        if unknown:
+            self.fetch_revisions(unknown)
+
+        unchanged = {
+            article
+            for article in articles
+            if previous.is_unchanged(article, self.article_revisions.get(article))
+        }
+        logger.info(
+            f"Reusing {len(unchanged)} unchanged articles "
+            f"from {self.conf.previous_zim.name}"
+        )
+        self.run_on_executor(
+            self.reuse_article,
+            ({"previous": previous, "article": article} for article in unchanged),
+        )
+        self.nb_reused = len(unchanged)
+        return articles - unchanged
+
+    def reuse_article(self, previous: PreviousZim, article: str):
+        logger.debug(f">> Article:{article} (unchanged)")
+        for path in previous.copy(
+            article,
+            is_front=True,
+            relink=None if self.conf.full_mode else self.relink_reused_page,
+        ):
+            self.mark_reused(path)
+        self.mark_done("article", article)
+
+    def relink_reused_page(self, path: str, content: bytes) -> bytes:
+        """previous ZIM's page without links to pages not in this one (anymore)"""
+        soup = get_soup_of(content.decode("UTF-8"))
+        to_root = "./" + ("../" * path.count("/"))
+        self.rewriter.rewrite_links_for_excludes(soup, to_root)
+        self.rewriter.remove_empty_sections(soup, to_root)
+        return soup.decode().encode("UTF-8")
+
+    def mark_reused(self, path: str):
+        """prevent copied resource at path from being processed again"""
+        name = path.split("/", 1)[-1]
+        if path.startswith("images/"):
+            with self.imager.lock:
+                self.imager.handled.add(name.split("-", 1)[0])
+        elif path.startswith("videos/"):
+            with self.vidgrabber.lock:
+                self.vidgrabber.handled.add(name.split("-", 1)[0])
+        elif path.startswith("assets/") and path.endswith(".css"):
+            with self.resources_lock:
+                self.resources_digests.add(name[: -len(".css")])
+
+    def add_revisions(self):
+        """record revision IDs of articles in ZIM, for a later --previous-zim"""
+        revisions = {
+            article: revision
+            for article, revision in self.article_revisions.items()
+            if revision
+            and article in self.expected_articles
+            and to_url(f"/{article}") not in self.missing_articles
+        }
+        self.writer.add_item_for(
+            path=REVISIONS_PATH,
+            content=json.dumps(revisions),
+            mimetype="application/json",
+        )
 
     def scrape_articles(self):
-        logger.info("Scraping expected articles")
-        for index, article in enumerate(self.expected_articles, 1):
-            logger.debug(f"{index}/{len(self.expected_articles)}")
-            if not self.scrape_article(article):
-                self.record_missing_url(to_url(f"/{article}"))
-            if self.conf.delay:
-                time.sleep(self.conf.delay)
+        articles = self.expected_articles - self.completed_articles
+        if self.conf.previous_zim:
+            articles = self.reuse_unchanged_articles(articles)
+
+        logger.info(
+            f"Scraping {len(articles)} expected articles "
+            f"using {self.conf.nb_threads} worker(s)"
+        )
+        if self.conf.engine == "async":
+            # pages fetched on the event loop, parsed and rendered by workers
+            self.executor.start()
+            try:
+                Global.fetcher.fetch_pages(
+                    (f"/{article}" for article in articles),
+                    callback=self.process_fetched_article,
+                    executor=self.executor,
+                )
+            finally:
+                self.await_executor()
+            return
+
+        self.run_on_executor(
+            self.scrape_expected_article,
+            (
+                {"article": article, "index": index, "total": len(articles)}
+                for index, article in enumerate(articles, 1)
+            ),
+        )
+
+    def scrape_expected_article(self, article: str, index: int, total: int):
+        logger.debug(f"{index}/{total}")
+        if not self.scrape_article(article):
+            self.record_missing_url(to_url(f"/{article}"))
+        self.mark_done("article", article)
+
+    def process_fetched_article(self, path: str, content: str, paths: List[str]):
+        """process an expected article's content fetched by the async engine"""
+        article = path[1:]
+        logger.info(f">> Article:{article}")
+        if content is None:
+            if not self.is_article_in_review(article):
+                self.record_missing_url(to_url(path))
+        else:
+            self.process_article(article, get_page_soup_of(content))
+        self.mark_done("article", article)
 
     def scrape_categories(self):
-        logger.info("Scraping expected category pages")
-        for category in self.expected_categories:
-            self.scrape_category(category)
-            if self.conf.delay:
-                time.sleep(self.conf.delay)
+        logger.info(
+            f"Scraping expected category pages using {self.conf.nb_threads} worker(s)"
+        )
+        self.run_on_executor(
+            self.scrape_category,
+            (
+                {"category": category}
+                for category in self.expected_categories - self.completed_categories
+            ),
+        )
 
     def scrape_category(self, category: str):
         logger.info(f"> Category:{category}")
         nb_pages = self.scrape_category_page(category, page_num=1)
         if nb_pages > 1:
             for page_num in range(2, nb_pages + 1):
-                if self.conf.delay:
-                    time.sleep(self.conf.delay)
                 self.scrape_category_page(category, page_num=page_num)
+        self.mark_done("category", category)
 
     def scrape_category_page(self, category: str, page_num: int):
         category_url = f"/{self.metadata['category_prefix']}:{category}"
@@ -532,12 +1177,13 @@ class wikihow2zim(GlobalMixin):
             params = {"pg": page_num}
 
         try:
-            soup, paths = get_soup(category_url, **params)
+            soup, paths = get_page_soup(category_url, **params)
         except requests.exceptions.HTTPError as exc:
             # don't fail on missing Category (#46)
             if exc.response.status_code == 404:
                 logger.warning(">>> HTTP 404, skipping.")
                 self.missing_categories.add(category_url)
+                self.mark_done("missing_category", category_url)
                 return 0
             raise exc
 
@@ -548,15 +1194,7 @@ class wikihow2zim(GlobalMixin):
         # extract and clean main content
         content = soup.select("div#content_wrapper")[0]
 
-        black_list = (
-            "script",
-            "noscript > img",
-            "noscript:empty",
-            "#cat_wca",
-            ".cat-promo",
-        )
-        for selector in black_list:
-            _ = [elem.decompose() for elem in content.select(selector)]
+        remove_blacklisted(content, CATEGORY_BLACKLIST)
 
         # remove links to unexpected articles in category description (near top)
         for link in content.select("#cat_description a[href]"):
@@ -571,85 +1209,67 @@ class wikihow2zim(GlobalMixin):
         to_root = "./" + ("../" * path.count("/"))
 
         title = soup.find("title").string
-        page = self.env.get_template("category.html").render(
-            to_root=to_root,
+        # before rewriting: it updates links in place
+        breadcrumbs = get_footer_crumbs_from(soup)
+        page = self.render_page(
+            "category.html",
+            to_root,
             body_classes=" ".join(soup.find("body").attrs.get("class", [])),
-            content=self.rewriter.rewrite(content.decode_contents(), to_root=to_root),
+            content=self.rewriter.rewrite(content, to_root=to_root),
             page_linked_styles=self.get_style_urls(soup),
             viewport_classes=" ".join(
                 soup.find(attrs={"id": "mw-mf-viewport"}).attrs.get("class", [])
                 + ["wikihow-category"]
             ),
-            footer_links=self.metadata["footer_links"],
-            breadcrumbs=get_footer_crumbs_from(soup),
+            breadcrumbs=breadcrumbs,
             title=title,
-            **self.env_context,
         )
-        with self.lock:
-            self.creator.add_item_for(
-                path=path,
-                title=title,
-                content=page,
-                mimetype="text/html",
-                is_front=True,
-            )
+        self.writer.add_item_for(
+            path=path,
+            title=title,
+            content=page,
+            mimetype="text/html",
+            is_front=True,
+        )
 
         for redir_path in paths:
-            with self.lock:
-                self.creator.add_redirect(
-                    path=redir_path + (f"_pg={page_num}" if page_num > 1 else ""),
-                    target_path=path,
-                )
+            self.writer.add_redirect(
+                path=redir_path + (f"_pg={page_num}" if page_num > 1 else ""),
+                target_path=path,
+            )
 
         return nb_pages
 
     def scrape_article(self, article, remove_all_links=False):
+        """fetch and process article, returning whether it is not missing"""
         logger.info(f">> Article:{article}")
 
         try:
-            soup, _ = get_soup(f"/{article}")
+            soup, _ = get_page_soup(f"/{article}")
         except requests.exceptions.HTTPError as exc:
             if exc.response.status_code == 404:
-                if is_in_review(f"/{article}"):
-                    logger.warning(">>> HTTP 404 (review), skipping")
-                    return True
-                logger.warning(">>> HTTP 404, skipping.")
-                return False
+                return self.is_article_in_review(article)
             raise exc
 
+        self.process_article(article, soup, remove_all_links=remove_all_links)
+        return True
+
+    def is_article_in_review(self, article: str) -> bool:
+        """whether an HTTP 404 article is in review (and thus not missing)"""
+        if is_in_review(f"/{article}"):
+            logger.warning(">>> HTTP 404 (review), skipping")
+            return True
+        logger.warning(">>> HTTP 404, skipping.")
+        return False
+
+    def process_article(self, article, soup, remove_all_links=False):
+        """clean, rewrite and render article's soup, adding it to the ZIM"""
+
         # extract and clean main content
         title = soup.find("title").string
         content = soup.select("div#content_wrapper")[0]
 
-        black_list = (
-            "script",
-            ".pdf_link",
-            "#side_follow",
-            "#sidebar_share",
-            "#other_languages",
-            "#article_rating_mobile",
-            "#end_options",
-            ".section.tips",
-            ".section.bss_share_container",
-            ".wh_ad_inner, .wh_ad_active, [data-service=adsense], .wh_ad_spacing",
-            "noscript > img",
-            "noscript:empty",
-            # User success stories
-            "#userreviews_mobile",
-            # Q&A block
-            "#qa >:not(#qa_answered_questions_container)",
-            # Expert Q&A
-            ".qa_heading sticking",
-            "#qa_answered_questions_container #qa_aq_search_container, "
-            "#qa_answered_questions_container #qa_add_curated_question",
-            ".qa_answer_footer",
-            ".qa_no_answered",
-            "#qa_see_more_answered",
-            "#userreview_recipe_cta",
-            "#aboutthisarticle > div.page_stats.section_text",
-        )
-        for selector in black_list:
-            _ = [elem.decompose() for elem in content.select(selector)]
+        remove_blacklisted(content, ARTICLE_BLACKLIST)
 
         # Remove link of page of author
         for link in content.select(
@@ -665,32 +1285,125 @@ class wikihow2zim(GlobalMixin):
 
         # some articles include a `/`. ex: Système-Macintosh/Apple
         to_root = "./" + ("../" * article.count("/"))
-        page = self.env.get_template("article.html").render(
-            to_root=to_root,
+        # before rewriting: it updates links in place
+        breadcrumbs = get_footer_crumbs_from(soup)
+        page = self.render_page(
+            "article.html",
+            to_root,
             body_classes=" ".join(soup.find("body").attrs.get("class", [])),
-            content=self.rewriter.rewrite(content.decode_contents(), to_root=to_root),
+            content=self.rewriter.rewrite(content, to_root=to_root),
             page_linked_styles=self.get_style_urls(soup),
             viewport_classes=" ".join(
                 soup.find(attrs={"id": "mw-mf-viewport"}).attrs.get("class", [])
                 + ["wikihow-article"]
             ),
-            footer_links=self.metadata["footer_links"],
-            breadcrumbs=get_footer_crumbs_from(soup),
+            breadcrumbs=breadcrumbs,
             title=title,
-            **self.env_context,
         )
-        with self.lock:
-            self.creator.add_item_for(
-                path=article,
-                title=title,
-                content=page,
-                mimetype="text/html",
-                is_front=True,
-            )
-        return True
+        self.writer.add_item_for(
+            path=article,
+            title=title,
+            content=page,
+            mimetype="text/html",
+            is_front=True,
+        )
+
+    def mark_done(self, kind: str, name: str):
+        """record completion of a unit of work (in checkpoint, if any)"""
+        with self.progress_lock:
+            self.nb_done[kind] += 1
+        if Global.checkpoint:
+            # once its items, journaled by the ZIM writer, are
+            self.writer.submit(Global.checkpoint.mark_done, kind, name)
+
+    def get_progress(self) -> Dict:
+        """progress figures for --stats-filename"""
+        with self.progress_lock:
+            nb_done = dict(self.nb_done)
+        articles = {
+            "done": len(self.completed_articles) + nb_done.get("article", 0),
+            "total": len(self.expected_articles),
+            "missing": len(self.missing_articles),
+            "reused": self.nb_reused,
+        }
+        categories = {
+            "done": len(self.completed_categories) + nb_done.get("category", 0),
+            "total": len(self.expected_categories),
+            "missing": len(self.missing_categories),
+        }
+        return {
+            "done": articles["done"] + categories["done"],
+            "total": articles["total"] + categories["total"],
+            "articles": articles,
+            "categories": categories,
+            "images": {
+                "done": self.imager.nb_done,
+                "total": self.imager.nb_requested,
+                "duplicates": self.imager.nb_duplicates,
+            },
+            "videos": {
+                "done": self.vidgrabber.nb_done,
+                "total": self.vidgrabber.nb_requested,
+            },
+            "phases": self.phases.as_dict(),
+            "queues": {
+                "api": Global.api_executor.qsize(),
+                "pages": Global.executor.qsize(),
+                "css": Global.css_executor.qsize(),
+                "writer": self.writer.qsize(),
+                "images": Global.img_executor.qsize(),
+                "videos": Global.video_executor.qsize(),
+            },
+        }
+
+    def restore_checkpoint(self):
+        """replay checkpoint into ZIM and restore progress from it"""
+        logger.info(f"Resuming from checkpoint {self.conf.checkpoint}")
+        checkpoint = Global.checkpoint
+        # before ZIM writer starts: nothing else is adding to ZIM
+        paths = checkpoint.replay(self.creator)
+
+        # CSS and their resources are not fetched again
+        self.resources_digests.update(
+            pathlib.Path(path).stem
+            for path in paths
+            if path.startswith("assets/") and path.endswith(".css")
+        )
+
+        self.completed_articles = checkpoint.done("article")
+        self.completed_categories = checkpoint.done("category")
+        self.missing_articles.update(checkpoint.done("missing_article"))
+        self.missing_categories.update(checkpoint.done("missing_category"))
+
+        # media added before crash are skipped, pending ones requested again
+        for kind, grabber in (("image", self.imager), ("video", self.vidgrabber)):
+            pending, completed = checkpoint.requests(kind)
+            grabber.handled.update(get_digest(url) for url in completed)
+            grabber.nb_requested += len(completed)
+            grabber.nb_done += len(completed)
+            for url, path in pending:
+                grabber.defer(url, path=path)
+
+        logger.info(
+            f"Restored {len(paths)} ZIM entries, "
+            f"{len(self.completed_articles)} completed articles, "
+            f"{len(self.completed_categories)} completed categories"
+        )
+
+    def restore_discovery(self, discovery: Dict):
+        """expected lists from checkpoint's discovery results"""
+        self.expected_categories.update(discovery["categories"])
+        self.expected_articles.update(discovery["articles"])
+        self.article_revisions.update(discovery["revisions"])
+        self.article_titles.update(discovery.get("titles", {}))
+        logger.info(
+            f"Restored {len(self.expected_categories)} expected categories and "
+            f"{len(self.expected_articles)} expected articles from checkpoint"
+        )
 
     def record_missing_url(self, url):
         self.missing_articles.add(url)
+        self.mark_done("missing_article", url)
         threshold = int(len(self.expected_articles) * self.conf.missing_tolerance / 100)
 
         if len(self.missing_articles) >= threshold:
@@ -699,6 +1412,58 @@ class wikihow2zim(GlobalMixin):
                 f"({threshold} ~= {self.conf.missing_tolerance}% )"
             )
 
+    def video_tag_for(
+        self,
+        soup: bs4.BeautifulSoup,
+        path: str,
+        poster: str,
+        classes: str = "",
+        width: Optional[str] = None,
+        height: Optional[str] = None,
+        alt: Optional[str] = None,
+        preload: bool = False,
+        **flags: bool,
+    ) -> bs4.element.Tag:
+        """a new <video/> of soup playing in-ZIM path
+
+        Built directly rather than rendered then parsed. flags are boolean
+        attributes: controls, autoplay, muted, loop, playsinline"""
+        attrs = {
+            "class": " ".join(
+                filter(None, ["video-js vjs-default-skin wikihow2zim", classes])
+            )
+        }
+        for name, value in (
+            ("poster", poster),
+            ("width", width),
+            ("height", height),
+            ("alt", alt),
+            ("preload", "auto" if preload else None),
+        ):
+            if value:
+                attrs[name] = value
+        attrs.update({name: name for name, value in flags.items() if value})
+
+        video = soup.new_tag("video", attrs=attrs)
+        video.append("\n")
+        video.append(
+            soup.new_tag(
+                "source",
+                attrs={"src": path, "type": f"video/{self.conf.video_format}"},
+            )
+        )
+        video.append("\n")
+        return video
+
+    def render_page(self, template_name: str, to_root: str, **page) -> bytes:
+        """encoded page of template_name, from its (cached) PageShell"""
+        if template_name not in self.page_shells:
+            self.page_shells[template_name] = PageShell(
+                self.env.get_template(template_name),
+                {**self.env_context, "footer_links": self.metadata["footer_links"]},
+            )
+        return self.page_shells[template_name].render(to_root, **page)
+
     def handle_videos_for(self, soup: bs4.element.Tag):
         # youtube video blocks
         if self.conf.without_videos:
@@ -720,19 +1485,15 @@ class wikihow2zim(GlobalMixin):
                     Global.vidgrabber.youtube_poster_url(iframe.get("data-src"))
                 )
                 iframe.replace_with(
-                    get_soup_of(
-                        self.env.get_template("video.html").render(
-                            path=path,
-                            poster=poster,
-                            classes=["youtube"],
-                            video_format=self.conf.video_format,
-                            width=iframe.attrs.get("width", "728"),
-                            height=iframe.attrs.get("height", "428"),
-                            autoplay="autoplay" in iframe.attrs.get("allow", ""),
-                            controls=True,
-                            preload=False,
-                        ),
-                        unwrap=True,
+                    self.video_tag_for(
+                        soup,
+                        path=path,
+                        poster=poster,
+                        classes="youtube",
+                        width=iframe.attrs.get("width", "728"),
+                        height=iframe.attrs.get("height", "428"),
+                        autoplay="autoplay" in iframe.attrs.get("allow", ""),
+                        controls=True,
                     )
                 )
 
@@ -770,19 +1531,17 @@ class wikihow2zim(GlobalMixin):
 
             show_controls = video_summary and video in video_summary.select("video")
             video.replace_with(
-                get_soup_of(
-                    self.env.get_template("video.html").render(
-                        path=path,
-                        poster=poster_path,
-                        classes=" ".join(video.attrs.get("class")),
-                        video_format=self.conf.video_format,
-                        autoplay=True,
-                        muted="muted" in video.attrs,
-                        loop="loop" in video.attrs,
-                        playsinline="playsinline" in video.attrs,
-                        controls=show_controls,
-                        preload=True,
-                    )
+                self.video_tag_for(
+                    soup,
+                    path=path,
+                    poster=poster_path,
+                    classes=" ".join(video.attrs.get("class")),
+                    preload=True,
+                    autoplay=True,
+                    muted="muted" in video.attrs,
+                    loop="loop" in video.attrs,
+                    playsinline="playsinline" in video.attrs,
+                    controls=show_controls,
                 )
             )
 
@@ -809,22 +1568,19 @@ class wikihow2zim(GlobalMixin):
                 continue
 
             video.replace_with(
-                get_soup_of(
-                    self.env.get_template("video.html").render(
-                        path=path,
-                        poster=poster_path,
-                        classes=" ".join(video.attrs.get("class")),
-                        video_format=self.conf.video_format,
-                        autoplay=True,
-                        width=video.attrs.get("width", "342"),
-                        height=video.attrs.get("height", "184"),
-                        alt=video.attrs.get("alt"),
-                        muted="muted" in video.attrs,
-                        loop="loop" in video.attrs,
-                        playsinline="playsinline" in video.attrs,
-                        controls=False,
-                        preload=True,
-                    )
+                self.video_tag_for(
+                    soup,
+                    path=path,
+                    poster=poster_path,
+                    classes=" ".join(video.attrs.get("class")),
+                    width=video.attrs.get("width", "342"),
+                    height=video.attrs.get("height", "184"),
+                    alt=video.attrs.get("alt"),
+                    preload=True,
+                    autoplay=True,
+                    muted="muted" in video.attrs,
+                    loop="loop" in video.attrs,
+                    playsinline="playsinline" in video.attrs,
                 )
             )
 
@@ -860,15 +1616,13 @@ class wikihow2zim(GlobalMixin):
         if not re.findall(":", category_link):
             raise DomIntegrityError("has not category link")
 
-        category_req_url = normalize_ident(to_url(f"/Category:{category_id}"))
-        resp = self.session.get(category_req_url)
-        if resp.status_code != 200:
-            raise DomIntegrityError(f"Category link if not valid ({resp})")
-
         logger.debug("> checking Category Page")
 
         # Category page is mostly a grid listing articles in the Category
-        soup, _ = get_soup(f"/Category:{category_id}")
+        try:
+            soup, _ = get_soup(f"/Category:{category_id}")
+        except requests.exceptions.HTTPError as exc:
+            raise DomIntegrityError(f"Category link if not valid ({exc.response})")
         if not soup.select("#cat_all > div.cat_grid"):
             raise DomIntegrityError("Article list not found in #cat_grid")
 
@@ -910,9 +1664,11 @@ class wikihow2zim(GlobalMixin):
         )
 
         if not self.conf.skip_dom_check:
-            self.check_dom_integrity()
+            with self.phases.phase("dom_check"):
+                self.check_dom_integrity()
 
-        Global.metadata = self.get_online_metadata()
+        with self.phases.phase("metadata"):
+            Global.metadata = self.get_online_metadata()
         logger.debug(
             f"homepage_name: {self.metadata['homepage_name']}\n"
             f"category_prefix: {self.metadata['category_prefix']}\n"
@@ -929,6 +1685,7 @@ class wikihow2zim(GlobalMixin):
         try:
             self.api_site = Site(
                 url=f"{to_url('/api.php')}",
+                session=self.session,
                 retry_after_conn=10,  # nb seconds to wait on ConnError
                 pre_request_delay=self.conf.api_delay,  # nb seconds to wait before each
             )
@@ -941,12 +1698,39 @@ class wikihow2zim(GlobalMixin):
             return 1
 
         logger.debug("Starting Zim creation")
-        Global.setup()
-        self.creator.start()
+        with self.phases.phase("setup"):
+            Global.setup()
+            self.creator.start()
+            if self.conf.resume:
+                self.restore_checkpoint()
+            self.writer.start()
+
+        progress = (
+            ProgressWriter(self.conf.stats_filename, get_progress=self.get_progress)
+            if self.conf.stats_filename
+            else None
+        )
+        if progress:
+            progress.start()
+
+        exporter = (
+            MetricsExporter(
+                port=self.conf.metrics_port,
+                textfile=self.conf.metrics_textfile,
+                host=self.conf.metrics_host,
+            )
+            if self.conf.metrics_port or self.conf.metrics_textfile
+            else None
+        )
+        if exporter:
+            exporter.start()
 
         try:
-            self.add_illustrations()
-            self.add_assets()
+            with self.phases.phase("illustrations"):
+                self.add_illustrations()
+            with self.phases.phase("assets"):
+                Global.css_executor.start()
+                self.add_assets()
             self.env_context.update(
                 {
                     "dir": self.metadata["dir"],
@@ -956,73 +1740,104 @@ class wikihow2zim(GlobalMixin):
                     "homepage_name": self.metadata["homepage_name"],
                 }
             )
-            self.build_filters_lists()
-            if self.inclusion_list:
-                for title in self.inclusion_list:
-                    if title.startswith("Category:"):
-                        self.expected_categories.add(self.cleaned_category_title(title))
-                    else:
-                        self.expected_articles.add(title)
-                logger.info(
-                    f"Nb expected articles: {len(self.expected_articles)}"
-                    f"\nExpected categories {self.expected_categories}"
-                )
-            else:
-                if not self.conf.categories:
-                    self.build_categories_list()
-
-                self.build_expected_categories()
-                self.build_expected_articles()
+            with self.phases.phase("discovery"):
+                self.build_expected_lists()
 
             # start adding ZIM pages
-            self.add_homepage()
+            with self.phases.phase("homepage"):
+                self.add_homepage()
 
             if not self.conf.skip_footer_links:
-                self.scrape_footer_articles()
+                with self.phases.phase("footer"):
+                    self.scrape_footer_articles()
 
             if self.conf.single_article:
-                self.scrape_article(self.conf.single_article)
+                with self.phases.phase("articles"):
+                    self.scrape_article(self.conf.single_article)
             else:
-                self.scrape_articles()
-                self.scrape_categories()
+                if progress:
+                    # discovery and homepage aren't representative of pages pace
+                    progress.reset_baseline()
+                with self.phases.phase("articles"):
+                    self.scrape_articles()
+                with self.phases.phase("categories"):
+                    self.scrape_categories()
+                    self.add_revisions()
 
             logger.info(
                 f"Stats: {len(self.expected_categories)} categories, "
                 f"{len(self.expected_articles)} articles, "
                 f"{len(self.missing_categories)} missing categories, "
                 f"{len(self.missing_articles)} missing articles, "
+                f"{self.nb_reused} reused articles, "
                 f"{self.imager.nb_requested} images, "
+                f"{self.imager.nb_duplicates} duplicate images, "
                 f"{self.vidgrabber.nb_requested} videos"
             )
+            logger.info("Awaiting CSS resources")
+            with self.phases.phase("css"):
+                # imported stylesheets submit their own resources
+                Global.css_executor.await_tasks()
+                Global.css_executor.shutdown()
+            if self.failed_resources:
+                logger.info(f"{len(self.failed_resources)} CSS resources failed")
+
             logger.info("Awaiting images")
-            Global.img_executor.shutdown()
+            with self.phases.phase("images"):
+                Global.img_executor.shutdown()
+                self.imager.shutdown()
 
             logger.info("Awaiting videos")
-            Global.video_executor.shutdown()
+            with self.phases.phase("videos"):
+                Global.video_executor.shutdown()
+
+            # raises deferred failures of adding to ZIM
+            logger.info("Awaiting ZIM writer")
+            self.writer.stop()
 
         except Exception as exc:
             # request Creator not to create a ZIM file on finish
             self.creator.can_finish = False
+            # not leaving it inside libzim while exiting
+            self.writer.abort()
+            try:
+                self.writer.stop()
+            except Exception:
+                pass
             if isinstance(exc, KeyboardInterrupt):
                 logger.error("KeyboardInterrupt, exiting.")
             else:
                 logger.error(f"Interrupting process due to error: {exc}")
                 logger.exception(exc)
+            Global.executor.shutdown(wait=False)
+            Global.css_executor.shutdown(wait=False)
             self.imager.abort()
             Global.img_executor.shutdown(wait=False)
             self.vidgrabber.abort()
             Global.video_executor.shutdown(wait=False)
+            if Global.checkpoint:
+                logger.info(
+                    "Scrape can be resumed using "
+                    f"--checkpoint {self.conf.checkpoint} --resume"
+                )
             return 1
         else:
             logger.info("Finishing ZIM file")
             # we need to release libzim's resources.
             # currently does nothing but crash if can_finish=False but that's awaiting
             # impl. at libkiwix level
-            with self.lock:
+            with self.phases.phase("finish"):
                 self.creator.finish()
             logger.info(
                 f"Finished Zim {self.creator.filename.name} "
                 f"in {self.creator.filename.parent}"
             )
+            if Global.checkpoint:
+                Global.checkpoint.remove()
         finally:
+            self.phases.log_summary()
+            if progress:
+                progress.stop()
+            if exporter:
+                exporter.stop()
             self.cleanup()
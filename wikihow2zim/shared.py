@@ -5,14 +5,13 @@
 
 import datetime
 import logging
-import threading
 import time
 
-from zimscraperlib.download import get_session
 from zimscraperlib.logging import getLogger as lib_getLogger
-from zimscraperlib.zim.creator import Creator
 
-from .constants import DEFAULT_HOMEPAGE, NAME
+from .constants import DEFAULT_HOMEPAGE, HTTP_MEMO_SIZE, NAME
+from .metrics import PAUSES
+from .ratelimit import RateLimiter, get_session
 
 
 class Global:
@@ -26,14 +25,20 @@ class Global:
     )
     conf = None
 
-    session = get_session(max_retries=10)
+    # all outbound HTTP requests are subject to per-host budgets
+    limiter = RateLimiter()
+    session = get_session(limiter=limiter, max_retries=10)
+    http_cache = None
+    checkpoint = None
 
     metadata = {}
 
     creator = None
     imager = None
+    fetcher = None
     rewriter = None
-    lock = threading.Lock()
+    # only thread calling creator, producers submit to it
+    writer = None
 
     exclusion_articles = set()
     exclusion_categories = set()
@@ -59,6 +64,7 @@ class Global:
         if Global.paused_until:
             return
         Global.logger.warning("PAUSING requests for 15min")
+        PAUSES.inc()
         Global.paused_until = datetime.datetime.now() + datetime.timedelta(minutes=15)
 
     @staticmethod
@@ -79,25 +85,43 @@ class Global:
 
         # block current thread (every seconds to allow interrupts)
         try:
-            for _ in range(until):
+            for _ in range(int(until)):
                 time.sleep(1)
         except TypeError:
             # should paused_until be set to None already
             return
 
+    @staticmethod
+    def setup_http():
+        """configure rate limiter's budgets and HTTP cache from conf"""
+        Global.limiter.configure(
+            default=(Global.conf.rate_limit, Global.conf.bandwidth_limit),
+            per_host=Global.conf.host_budgets,
+        )
+
+        from .httpcache import HttpCache
+
+        Global.http_cache = HttpCache(
+            directory=Global.conf.http_cache,
+            max_size=Global.conf.http_cache_size * 2**20,
+            memo_size=HTTP_MEMO_SIZE,
+        )
+
     @staticmethod
     def setup():
         # order matters are there are references between them
 
         # images handled on a different queue.
         # mostly network I/O to retrieve and/or upload image.
-        # if not in S3 bucket, convert/optimize webp image
+        # if not in S3 bucket, convert/optimize webp image (in Imager's processes,
+        # enough workers to keep them all busy)
         # svg images, stored but not optimized
         from .executor import Executor
+        from .utils import get_nb_cpus
 
         Global.img_executor = Executor(
             queue_size=20,
-            nb_workers=10,
+            nb_workers=max(10, get_nb_cpus()),
             prefix="IMG-T-",
         )
 
@@ -113,6 +137,36 @@ class Global:
             prefix="VID-T-",
         )
 
+        # resources (images, fonts) of CSS files, fetched concurrently
+        # from page workers. Only network I/O
+        Global.css_executor = Executor(
+            queue_size=0,
+            nb_workers=10,
+            prefix="CSS-T-",
+        )
+
+        # API queries for categories and articles discovery.
+        # workers submit new queries (subcategories) to their own queue
+        Global.api_executor = Executor(
+            queue_size=0,
+            nb_workers=Global.conf.nb_api_threads,
+            prefix="API-T-",
+        )
+
+        # article and category pages are fetched, rewritten and rendered
+        # concurrently. Mostly network I/O with some CPU-bound parsing.
+        Global.executor = Executor(
+            queue_size=Global.conf.nb_threads * 2,
+            nb_workers=Global.conf.nb_threads,
+            prefix="PAGE-T-",
+        )
+
+        # async engine fetches pages and API queries on an event loop
+        if Global.conf.engine == "async":
+            from .fetcher import AsyncFetcher
+
+            Global.fetcher = AsyncFetcher(concurrency=Global.conf.concurrency)
+
         from .imager import Imager
 
         Global.imager = Imager()
@@ -125,7 +179,16 @@ class Global:
 
         Global.rewriter = Rewriter()
 
-        Global.creator = Creator(
+        # everything added to ZIM is journaled with --checkpoint
+        from .checkpoint import Checkpoint, JournaledCreator
+
+        if Global.conf.checkpoint:
+            Global.checkpoint = Checkpoint(
+                Global.conf.checkpoint, resume=Global.conf.resume
+            )
+
+        Global.creator = JournaledCreator(
+            checkpoint=Global.checkpoint,
             filename=Global.conf.output_dir.joinpath(Global.conf.fname),
             main_path=DEFAULT_HOMEPAGE,
             favicon_path="illustration",
@@ -140,6 +203,10 @@ class Global:
             date=datetime.date.today(),
         ).config_verbose(True)
 
+        from .writer import ZimWriter
+
+        Global.writer = ZimWriter(Global.creator)
+
 
 class GlobalMixin:
     @property
@@ -155,8 +222,8 @@ class GlobalMixin:
         return Global.creator
 
     @property
-    def lock(self):
-        return Global.lock
+    def writer(self):
+        return Global.writer
 
     @property
     def imager(self):
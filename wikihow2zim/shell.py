@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+from typing import Callable, Dict, List, Tuple
+
+import jinja2
+
+# blocks of base.html depending on the page, all others only on the run
+PAGE_BLOCKS = (
+    "title",
+    "page_styles",
+    "body_classes",
+    "viewport_classes",
+    "content",
+    "breadcrumbs",
+)
+# stands for a page block in the pre-rendered shell (can't be in templates)
+MARKER = "\x00"
+
+
+class PageShell:
+    """A page template pre-rendered once per to_root, but for its PAGE_BLOCKS
+
+    The static parts, using the run's context (footer links, styles, etc.),
+    are rendered and encoded once. Rendering a page then only renders its
+    page blocks and joins them with the static parts, as UTF-8 bytes."""
+
+    def __init__(self, template: jinja2.Template, context: Dict):
+        self.template = template
+        self.context = context
+        # to_root: (static parts, page blocks names in order, blocks functions)
+        # concurrent pages may build the same shell twice: identical, harmless
+        self.shells: Dict[str, Tuple[List[bytes], List[str], Dict]] = {}
+
+    def shell_for(self, to_root: str) -> Tuple[List[bytes], List[str], Dict]:
+        shell = self.shells.get(to_root)
+        if shell is None:
+            shell = self.shells[to_root] = self.build(to_root)
+        return shell
+
+    def build(self, to_root: str) -> Tuple[List[bytes], List[str], Dict]:
+        """template rendered with markers in place of the page blocks"""
+        context = self.template.new_context({**self.context, "to_root": to_root})
+        for name in PAGE_BLOCKS:
+            # first of a block's functions is the rendered one: the marker.
+            # others are the template's own, (also) filled-in while rendering
+            context.blocks.setdefault(name, []).insert(0, self.marker_for(name))
+        parts = "".join(self.template.root_render_func(context)).split(MARKER)
+        return (
+            [part.encode("utf-8") for part in parts[0::2]],
+            parts[1::2],
+            {name: context.blocks[name][1:] for name in PAGE_BLOCKS},
+        )
+
+    @staticmethod
+    def marker_for(name: str) -> Callable:
+        def render_marker(context: jinja2.runtime.Context):
+            yield f"{MARKER}{name}{MARKER}"
+
+        return render_marker
+
+    def render(self, to_root: str, **page) -> bytes:
+        """encoded page, rendered from page variables (title, content, etc.)"""
+        statics, names, blocks = self.shell_for(to_root)
+        context = self.template.new_context(
+            {**self.context, "to_root": to_root, **page}
+        )
+        # as they'd be after rendering the whole template (for super())
+        context.blocks.update({name: list(funcs) for name, funcs in blocks.items()})
+        parts = [statics[0]]
+        for name, static in zip(names, statics[1:]):
+            parts.append("".join(blocks[name][0](context)).encode("utf-8"))
+            parts.append(static)
+        return b"".join(parts)
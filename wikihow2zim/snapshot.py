@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+import pathlib
+import sqlite3
+import threading
+from typing import Dict, Optional, Set, Tuple
+
+from .shared import logger
+
+
+class DiscoverySnapshot:
+    """SQLite-persisted result of categories and articles discovery
+
+    Stores the category tree (category -> parents, empty string for root ones),
+    the articles membership (article -> categories) and their MediaWiki titles
+    along with the timestamp at which discovery started and a signature of the inputs
+    (language, root categories, exclusions) it was made with."""
+
+    def __init__(self, fpath: pathlib.Path):
+        self.fpath = fpath
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(fpath), check_same_thread=False)
+        with self.conn:
+            self.conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE IF NOT EXISTS categories (
+                    name TEXT, parent TEXT, PRIMARY KEY (name, parent));
+                CREATE TABLE IF NOT EXISTS articles (
+                    name TEXT, category TEXT, PRIMARY KEY (name, category));
+                CREATE TABLE IF NOT EXISTS titles (
+                    name TEXT PRIMARY KEY, title TEXT);
+                """
+            )
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def timestamp_for(self, signature: str) -> Optional[str]:
+        """timestamp of snapshot if it was made with same signature"""
+        if self.get_meta("signature") != signature:
+            return None
+        return self.get_meta("timestamp")
+
+    def read(
+        self,
+    ) -> Tuple[Dict[str, Set[str]], Dict[str, Set[str]], Dict[str, str]]:
+        """(category_parents, article_categories, article_titles) mappings"""
+        category_parents, article_categories = {}, {}
+        with self.lock:
+            for name, parent in self.conn.execute(
+                "SELECT name, parent FROM categories"
+            ):
+                category_parents.setdefault(name, set()).add(parent)
+            for name, category in self.conn.execute(
+                "SELECT name, category FROM articles"
+            ):
+                article_categories.setdefault(name, set()).add(category)
+            article_titles = dict(
+                self.conn.execute("SELECT name, title FROM titles").fetchall()
+            )
+        return category_parents, article_categories, article_titles
+
+    def save(
+        self,
+        signature: str,
+        timestamp: str,
+        category_parents: Dict[str, Set[str]],
+        article_categories: Dict[str, Set[str]],
+        article_titles: Dict[str, str],
+    ):
+        """replace snapshot with those mappings, made at timestamp"""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM categories")
+            self.conn.execute("DELETE FROM articles")
+            self.conn.execute("DELETE FROM titles")
+            self.conn.executemany(
+                "INSERT INTO categories VALUES (?, ?)",
+                (
+                    (name, parent)
+                    for name, parents in category_parents.items()
+                    for parent in parents
+                ),
+            )
+            self.conn.executemany(
+                "INSERT INTO articles VALUES (?, ?)",
+                (
+                    (name, category)
+                    for name, categories in article_categories.items()
+                    for category in categories
+                ),
+            )
+            self.conn.executemany(
+                "INSERT INTO titles VALUES (?, ?)",
+                (
+                    (name, title)
+                    for name, title in article_titles.items()
+                    if name in article_categories
+                ),
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                (("signature", signature), ("timestamp", timestamp)),
+            )
+        logger.info(
+            f"Saved discovery snapshot to {self.fpath}: "
+            f"{len(category_parents)} categories, {len(article_categories)} articles"
+        )
+
+    def close(self):
+        self.conn.close()
@@ -5,6 +5,7 @@
 import collections
 import io
 import logging
+import os
 import re
 import urllib.parse
 import zlib
@@ -12,17 +13,38 @@ from typing import Iterable, List, Tuple, Union
 
 import backoff
 import bs4
-import cssbeautifier
 import requests.exceptions
 from kiwixstorage import KiwixStorage
 from pif import get_public_ip
 from tld import get_fld
 from zimscraperlib.download import stream_file
 
+from .htmlbackend import LxmlSoup, parse_regions
+from .httpcache import CacheEntry, HttpCache
 from .shared import Global, logger
 
 nlink = collections.namedtuple("Link", ("path", "name", "title"))
 
+# CSS tokens parse_css() cares about, in a single pass. Comments and strings are
+# matched so that url( inside them are left alone
+CSS_TOKEN_RE = re.compile(
+    r"""
+    (?P<comment>/\*.*?(?:\*/|$))
+    |(?P<url>\burl\(\s*(?:
+        "(?P<dq_url>(?:[^"\\\n]|\\.)*)"
+        |'(?P<sq_url>(?:[^'\\\n]|\\.)*)'
+        |(?P<url_value>(?:[^)"'\s\\]|\\.)*)
+    )\s*\))
+    |(?P<string>"(?P<dq>(?:[^"\\\n]|\\.)*)"|'(?P<sq>(?:[^'\\\n]|\\.)*)')
+    |(?P<image_set>\b(?:-webkit-)?image-set\()
+    |(?P<import>@import\b)
+    |(?P<open>\()
+    |(?P<close>\))
+    |(?P<end>[;{}])
+    """,
+    re.VERBOSE | re.IGNORECASE | re.DOTALL,
+)
+
 
 def to_path(url: str) -> str:
     """Path-part of an URL, without leading slash"""
@@ -90,10 +112,21 @@ def fetch(path: str, failsafe: bool = False, **params) -> str:
 
     actual_paths is amn ordered list of paths that were traversed to get to content.
     Without redirection, it should be a single path, equal to request
-    Final, target path is always last"""
+    Final, target path is always last
+
+    Responses are cached (see HttpCache)"""
+
+    url = get_url(path, **params)
+    entry = Global.http_cache.get(url)
+    if entry:
+        return entry.text, list(entry.paths)
+    entry = Global.http_cache.load(url)
 
     Global.await_pause()
-    resp = Global.session.get(get_url(path, **params), params=params)
+    resp = Global.session.get(url, params=params, headers=HttpCache.validators(entry))
+    if resp.status_code == 304 and entry:
+        Global.http_cache.revalidated(url, entry)
+        return entry.text, list(entry.paths)
     if resp.status_code == 429:
         Global.pause()
     elif not failsafe:
@@ -104,13 +137,42 @@ def fetch(path: str, failsafe: bool = False, **params) -> str:
     # we thus need to use redirection target (which lost param) with params
     if params and resp.history:
         return fetch(only_path_of(resp.url), failsafe=failsafe, **params)
-    return resp.text, [
-        no_leading_slash(only_path_of(r.url)) for r in resp.history + [resp]
-    ]
+    paths = [no_leading_slash(only_path_of(r.url)) for r in resp.history + [resp]]
+    if resp.status_code == 200:
+        Global.http_cache.store(url, entry_for(resp, resp.text.encode("UTF-8"), paths))
+    return resp.text, paths
+
+
+def entry_for(resp, content: bytes, paths: List[str]) -> CacheEntry:
+    """HTTP cache entry for a response"""
+    return CacheEntry(
+        content=content,
+        paths=paths,
+        etag=resp.headers.get("ETag"),
+        last_modified=resp.headers.get("Last-Modified"),
+    )
+
+
+def fetch_bytes(url: str) -> bytes:
+    """content of an URL, using the HTTP cache (see HttpCache)"""
+    entry = Global.http_cache.get(url)
+    if entry:
+        return entry.content
+    entry = Global.http_cache.load(url)
+
+    resp = Global.session.get(url, headers=HttpCache.validators(entry))
+    if resp.status_code == 304 and entry:
+        Global.http_cache.revalidated(url, entry)
+        return entry.content
+    resp.raise_for_status()
+    Global.http_cache.store(url, entry_for(resp, resp.content, [only_path_of(url)]))
+    return resp.content
 
 
 def get_soup_of(text: str, unwrap: bool = False):
-    """an lxml soup of an HTML string"""
+    """a soup of an HTML string, from the --html-backend"""
+    if Global.conf.html_backend == "lxml":
+        return LxmlSoup.parse(text, unwrap=unwrap)
     soup = bs4.BeautifulSoup(text, "lxml")
     if unwrap:
         for elem in ("body", "html"):
@@ -141,7 +203,7 @@ def get_footer_links_from(soup: bs4.element.Tag) -> List[Tuple[str, str, str]]:
     """list of namedtuple(path, name, title) of footer links"""
     links = []
 
-    fld = get_fld(Global.conf.main_url.geturl())
+    fld = get_fld_or_host(Global.conf.main_url.geturl())
 
     # Skip some links with no offline value
     for link in soup.select("#footer_links ul li a"):
@@ -158,7 +220,7 @@ def get_footer_links_from(soup: bs4.element.Tag) -> List[Tuple[str, str, str]]:
             url = urllib.parse.urlparse(to_url(link.attrs["href"]))
 
             # skip external URLs (if any)
-            if get_fld(url.geturl()) != fld:
+            if get_fld_or_host(url.geturl()) != fld:
                 continue
             path = normalize_ident(url.path)[1:]
 
@@ -166,12 +228,35 @@ def get_footer_links_from(soup: bs4.element.Tag) -> List[Tuple[str, str, str]]:
     return links
 
 
+def get_fld_or_host(url: str) -> str:
+    """first-level domain of url, or its host if it has none (IP, localhost)"""
+    return get_fld(url, fail_silently=True) or urllib.parse.urlparse(url).netloc
+
+
+def get_page_soup_of(text: str):
+    """a soup of an article or category page, only its regions with --partial-parsing
+
+    Regions (see htmlbackend.REGION_NAMES) are kept in empty copies (shells)
+    of <html/>, <body/> and #mw-mf-viewport, for their attributes"""
+    if not Global.conf.partial_parsing:
+        return get_soup_of(text)
+    if Global.conf.html_backend == "lxml":
+        return LxmlSoup.parse_regions(text)
+    return parse_regions(text)
+
+
 def get_soup(path: str, **params) -> bs4.BeautifulSoup:
     """an lxml soup of a path on source website"""
     content, paths = fetch(path, **params)
     return get_soup_of(content), paths
 
 
+def get_page_soup(path: str, **params) -> bs4.BeautifulSoup:
+    """a soup of an article or category page on source website"""
+    content, paths = fetch(path, **params)
+    return get_page_soup_of(content), paths
+
+
 def is_in_review(path: str) -> bool:
     return '"wgIsRestricted":true' in fetch(path, failsafe=True)[0]
 
@@ -202,11 +287,8 @@ def fix_pagination_links(soup: bs4.element.Tag):
 
 
 def get_categorylisting_url():
-    return normalize_ident(
-        urllib.parse.urlparse(
-            Global.session.get(to_url("/Special:CategoryListing")).url
-        ).path
-    )[1:]
+    # last of the traversed paths is the redirect target
+    return fetch("/Special:CategoryListing")[1][-1]
 
 
 def get_youtube_id_from(url: str) -> str:
@@ -246,44 +328,58 @@ def parse_css(style: str) -> Tuple[str, List[Tuple[str, str]]]:
 
     reads a CSS string and returns it transformed
     with url() replaced by offlinable path.
+    So are @import "…" and image-set("…") strings. CSS is otherwise unchanged.
+    Stylesheets (imported or .css) are at the path add_css() stores them.
 
     resources list is list of tuples, each containing the URL to get data from
     and the path to store it at.
     ex: ("http://goto.img/hello.png", "img/hello.png")"""
 
-    output = ""
+    output = []
     resources = []
-
-    def write(line):
-        nonlocal output
-        output += line + "\n"
-
-    pattern = "url("
-    for line in cssbeautifier.beautify(style).split("\n"):
-        if pattern not in line:
-            write(line)
-            continue
-
-        start = line.index(pattern) + len(pattern)
-        end = line.index(")")
-
-        # check whether it's quoted or not
-        if line[start] in ("'", '"'):
-            start += 1
-            end -= 1
-
-        url = line[start:end]
-
-        if url.startswith("data:"):
-            write(line)
-            continue
-
-        path = f"assets/{get_digest(url)}"
+    # whether strings are URLs: after an @import, directly within image-set()
+    in_import = False
+    parens = [""]
+
+    def rewritten(url: str, stylesheet: bool) -> str:
+        if not url or url.startswith(("data:", "#")):
+            return url
+        if stylesheet or urllib.parse.urlparse(url).path.endswith(".css"):
+            path = f"assets/{get_digest(to_url(url))}.css"
+        else:
+            path = f"assets/{get_digest(url)}"
         resources.append((url, path))
         # resources are added on same level (assets/xxx) as css itself
-        write(line[0:start] + "../" + path + line[end:])
+        return f"../{path}"
 
-    return output, resources
+    position = 0
+    for match in CSS_TOKEN_RE.finditer(style):
+        kind = match.lastgroup
+        if kind == "url" or (
+            kind == "string" and (in_import or parens[-1] == "image-set")
+        ):
+            # replace the url (only) in the token
+            group = next(
+                name
+                for name in ("dq_url", "sq_url", "url_value", "dq", "sq")
+                if match.group(name) is not None
+            )
+            start, end = match.span(group)
+            output.append(style[position:start])
+            output.append(rewritten(match.group(group), stylesheet=in_import))
+            position = end
+            in_import = False
+        elif kind == "import":
+            in_import = True
+        elif kind == "end":
+            in_import = False
+        elif kind in ("image_set", "open"):
+            parens.append("image-set" if kind == "image_set" else "(")
+        elif kind == "close" and len(parens) > 1:
+            parens.pop()
+
+    output.append(style[position:])
+    return "".join(output), resources
 
 
 def first(*args: Iterable[object]) -> object:
@@ -378,3 +474,12 @@ def setup_s3_and_check_credentials(s3_url_with_credentials):
         logger.error(f"  Public IP: {get_public_ip()}")
         raise ValueError("Unable to connect to Optimization Cache. Check its URL.")
     return s3_storage
+
+
+def get_nb_cpus() -> int:
+    """number of CPUs this process can run on (container limits applied)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        # not available on macOS
+        return os.cpu_count() or 1
@@ -5,6 +5,7 @@
 import io
 import pathlib
 import re
+import threading
 import urllib.parse
 from typing import Optional, Union
 
@@ -15,6 +16,7 @@ from zimscraperlib.video.encoding import reencode
 from zimscraperlib.video.presets import VideoWebmHigh, VideoWebmLow
 
 from .constants import VIDEOS_ENCODER_VERSION
+from .metrics import VIDEO_DOWNLOAD, VIDEO_ENCODE
 from .shared import Global
 from .utils import (
     get_digest,
@@ -32,6 +34,8 @@ class VideoGrabber:
         self.aborted = False
         # list of source URLs that we've processed and added to ZIM
         self.handled = set()
+        # defer() is called from all page workers
+        self.lock = threading.Lock()
         self.nb_requested = 0
         self.nb_done = 0
 
@@ -53,7 +57,7 @@ class VideoGrabber:
 
     def get_url(self, url: str) -> urllib.parse.ParseResult:
         """normalized URL from requested one"""
-        is_youtube = get_fld(url) == "youtube.com"
+        is_youtube = get_fld(url, fail_silently=True) == "youtube.com"
         if is_youtube:
             url = normalize_youtube_url(url)
         return urllib.parse.urlparse(url), is_youtube
@@ -88,7 +92,7 @@ class VideoGrabber:
             "y2z_videos_dir": self.videos_dir,
             "nocheckcertificate": True,
         }
-        with youtube_dl.YoutubeDL(options) as ydl:
+        with youtube_dl.YoutubeDL(options) as ydl, VIDEO_DOWNLOAD.time():
             ydl.download([url])
 
         # find downloaded videos from youtube-dl output dir
@@ -119,13 +123,14 @@ class VideoGrabber:
 
         # reencode if format is different or quality must be reduced
         dst_path = src_path.with_name(f"{src_path.stem}-2.{Global.conf.video_format}")
-        reencode(
-            src_path,
-            dst_path,
-            preset.to_ffmpeg_args(),
-            delete_src=False,
-            failsafe=False,
-        )
+        with VIDEO_ENCODE.time():
+            reencode(
+                src_path,
+                dst_path,
+                preset.to_ffmpeg_args(),
+                delete_src=False,
+                failsafe=False,
+            )
 
         return dst_path
 
@@ -160,13 +165,17 @@ class VideoGrabber:
         path = self.get_path_for(url) if path is None else path
 
         # skip processing if we already processed it or have it in pipe
-        if digest in self.handled:
-            logger.debug(f"URL `{url.geturl()}` already processed.")
-            return path
+        with self.lock:
+            if digest in self.handled:
+                logger.debug(f"URL `{url.geturl()}` already processed.")
+                return path
+
+            # record that we are processing this one
+            self.handled.add(digest)
+            self.nb_requested += 1
 
-        # record that we are processing this one
-        self.handled.add(digest)
-        self.nb_requested += 1
+        if Global.checkpoint:
+            Global.checkpoint.record_request("video", url.geturl(), path)
 
         Global.video_executor.submit(
             self.process_video,
@@ -190,14 +199,13 @@ class VideoGrabber:
 
         # just download, optimize and add to ZIM if not using S3
         if not Global.conf.s3_url:
-            with Global.lock:
-                Global.creator.add_item_for(
-                    path=path,
-                    fpath=self.get_video_fpath(url.geturl(), is_youtube),
-                    delete_fpath=True,
-                    mimetype="video/webm",
-                    callback=self.once_done,
-                )
+            Global.writer.add_item_for(
+                path=path,
+                fpath=self.get_video_fpath(url.geturl(), is_youtube),
+                delete_fpath=True,
+                mimetype="video/webm",
+                callback=self.once_done,
+            )
             return path
 
         # we are using S3 cache
@@ -226,13 +234,12 @@ class VideoGrabber:
             logger.exception(exc)
             download_failed = True
         else:
-            with Global.lock:
-                Global.creator.add_item_for(
-                    path=path,
-                    content=fileobj.getvalue(),
-                    mimetype="video/webm",
-                    callback=self.once_done,
-                )
+            Global.writer.add_item_for(
+                path=path,
+                content=fileobj.getvalue(),
+                mimetype="video/webm",
+                callback=self.once_done,
+            )
             return path
 
         # we're using S3 but don't have it or failed to download
@@ -243,14 +250,13 @@ class VideoGrabber:
             logger.exception(exc)
             return path
 
-        with Global.lock:
-            Global.creator.add_item_for(
-                path=path,
-                fpath=fpath,
-                delete_fpath=True,
-                mimetype="video/webm",
-                callback=self.once_done,
-            )
+        Global.writer.add_item_for(
+            path=path,
+            fpath=fpath,
+            delete_fpath=True,
+            mimetype="video/webm",
+            callback=self.once_done,
+        )
 
         # only upload it if we didn't have it in cache
         if not download_failed:
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+import queue
+import threading
+from typing import Callable, Optional
+
+from zimscraperlib.zim.creator import Creator
+
+from .metrics import CREATOR_WAIT, WRITER_QUEUE
+from .shared import logger
+
+
+class ZimWriter(threading.Thread):
+    """Single thread adding items to the ZIM Creator, fed by a bounded queue
+
+    Producers (page, CSS, image and video workers) hand over ready-to-add items
+    and only wait for room in the queue, which is a metric: never for another
+    producer's download or encoding.
+    Calls are made in submission order, so a producer can queue (checkpoint)
+    calls that must happen after its items are added.
+
+    First failure is raised to producers on their next call and by stop()"""
+
+    def __init__(self, creator: Creator, queue_size: int = 100):
+        super().__init__(name="ZIM-W", daemon=True)
+        self.creator = creator
+        self.queue = queue.Queue(queue_size)
+        self.exception: Optional[Exception] = None
+        self.aborted = False
+        WRITER_QUEUE.set_function(lambda: (({}, self.queue.qsize()),))
+
+    def qsize(self) -> int:
+        return self.queue.qsize()
+
+    def submit(self, func: Callable, *args, **kwargs):
+        """call func(*args, **kwargs) on the writer thread, after previous calls"""
+        if self.exception:
+            raise RuntimeError("ZIM writer failed") from self.exception
+        if self.aborted:
+            raise RuntimeError("ZIM writer aborted")
+        with CREATOR_WAIT.time():
+            self.queue.put((func, args, kwargs))
+
+    def add_item_for(self, *args, **kwargs):
+        self.submit(self.creator.add_item_for, *args, **kwargs)
+
+    def add_item(self, item):
+        self.submit(self.creator.add_item, item)
+
+    def add_redirect(self, *args, **kwargs):
+        self.submit(self.creator.add_redirect, *args, **kwargs)
+
+    def add_illustration(self, size: int, content: bytes):
+        self.submit(self.creator.add_illustration, size, content)
+
+    def run(self):
+        while True:
+            task = self.queue.get()
+            if task is None:
+                self.queue.task_done()
+                break
+            func, args, kwargs = task
+            try:
+                # still consuming once failed or aborted: producers don't block
+                if not self.exception and not self.aborted:
+                    func(*args, **kwargs)
+            except Exception as exc:
+                logger.error(f"Error adding to ZIM with {func} and {kwargs.keys()}")
+                logger.exception(exc)
+                self.exception = exc
+            finally:
+                self.queue.task_done()
+
+    def abort(self):
+        """discard pending calls and refuse new ones"""
+        self.aborted = True
+
+    def stop(self):
+        """await completion of all submitted calls, raising first failure if any"""
+        self.queue.put(None)
+        self.join()
+        if self.exception:
+            raise self.exception